@@ -3,17 +3,59 @@ Flask Backend API for Airbnb Dashboard
 Provides REST endpoints for dashboard data
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, has_request_context, jsonify, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from functools import wraps
+import hmac
 import os
 import sys
+import time
+
+import pandas as pd
 
 # Add backend directory to path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from data_processor import AirbnbDataProcessor
+from partitions import DEFAULT_CITY, PartitionedProcessor, format_sources, load_partitions, parse_sources
+from dataset_manager import DatasetManager, VersionConflict
+from result_cache import ResultCache
+from buckets import BUCKETINGS
+from date_index import MAX_REVIEW_PERIODS, REVIEW_INTERVALS
+from query import DEFAULT_QUERY_LIMIT, MAX_QUERY_LIMIT, QueryTooLarge, parse_query
+from derived_columns import DERIVED_COLUMNS
+from compute_pool import ComputePool, PoolSaturated
+from response_format import JSON_MIMETYPE, encode_columns, negotiate
+from http_cache import COMPRESSIBLE_MIMETYPES, choose_encoding, compress, make_etag, normalized_query
+from metrics import METRICS, ROW_BUCKETS, SIZE_BUCKETS, phase, profile_report, start_profiler
+from spatial_index import CLUSTER_MAX_ZOOM, parse_bbox
+
+
+
+def route_label():
+    """URL rule of the current request, used as the metrics label"""
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def parse_flag(value):
+    """Query-string boolean ('1', 'true', 'yes')"""
+    return (value or '').lower() in ('1', 'true', 'yes')
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that records serialization time per route"""
+    
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        body = super().dumps(obj, **kwargs)
+        if has_request_context():
+            METRICS.observe('airbnb_stage_duration_seconds', time.perf_counter() - start,
+                            endpoint=route_label(), stage='serialize')
+        return body
+
 
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 
 # Configure CORS - allow requests from frontend
 cors_origins = os.getenv('CORS_ORIGINS', '*')
@@ -21,145 +63,483 @@ if cors_origins and cors_origins != '*':
     cors_origins = [origin.strip() for origin in cors_origins.split(',')]
 else:
     cors_origins = '*'
-CORS(app, origins=cors_origins, supports_credentials=True)
+CORS(app, origins=cors_origins, supports_credentials=True, expose_headers=['X-Total-Count', 'ETag'])
 
 # Initialize data processor
-DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'Airbnb_Open_Data.csv')
-processor = AirbnbDataProcessor(DATA_PATH)
-
-# Load and process data on startup
-print("Loading data...")
-processor.load_data()
-print("Cleaning data...")
-processor.clean_data()
-print("Creating calculated fields...")
-processor.create_calculated_fields()
-if processor.df_clean is not None:
-    print(f"Data loaded: {len(processor.df_clean)} listings")
-else:
-    print("Error: Data loading failed")
+DATA_PATH = os.getenv('DATA_PATH') or os.path.join(os.path.dirname(__file__), 'data', 'Airbnb_Open_Data.csv')
+# Partitions as 'city=path,city=path'; defaults to DATA_PATH as the only city
+DATA_SOURCE = os.getenv('CITY_DATA') or DATA_PATH
+LOAD_WORKERS = int(os.getenv('LOAD_WORKERS', 0)) or None  # processes loading partitions (default: CPU count)
+USE_SNAPSHOT = os.getenv('USE_SNAPSHOT', 'true').lower() != 'false'
+INGEST_CHUNKSIZE = int(os.getenv('INGEST_CHUNKSIZE', 0))  # 0 = read the CSV in one go
+
+# Cache of computed endpoint results, keyed on endpoint + filters + params
+result_cache = ResultCache(
+    max_entries=int(os.getenv('RESULT_CACHE_SIZE', 256)),
+    ttl=float(os.getenv('RESULT_CACHE_TTL', 0))
+)
+
+# Aggregations run here, off the request threads; identical in-flight
+# requests share one computation
+compute_pool = ComputePool(
+    max_workers=int(os.getenv('COMPUTE_WORKERS', 4)),
+    max_pending=int(os.getenv('COMPUTE_MAX_PENDING', 64))
+)
+COMPUTE_TIMEOUT = float(os.getenv('COMPUTE_TIMEOUT', 60))
+
+# Seconds browsers and CDNs may reuse a response before revalidating its ETag (0 = always revalidate)
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 60))
+# Smallest body compressed with gzip/brotli
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+# Compressed bodies of ETagged responses, keyed on (ETag, encoding)
+compressed_cache = ResultCache(max_entries=int(os.getenv('COMPRESSED_CACHE_SIZE', 64)))
+
+# Allow ?profile=true to return a cProfile breakdown instead of the result
+ENABLE_PROFILING = os.getenv('ENABLE_PROFILING', 'false').lower() == 'true'
+
+
+def build_dataset(source):
+    """Load every partition of source ('city=path,...' or one CSV) with indexes built"""
+    sources = parse_sources(source)
+    processor = PartitionedProcessor(load_partitions(sources, USE_SNAPSHOT, INGEST_CHUNKSIZE, LOAD_WORKERS))
+    print("Building indexes...")
+    with phase('build_indexes'):
+        processor.build_indexes()
+    print(f"Derived columns computed: {', '.join(processor.derived_columns()) or 'none'}")
+    print(f"Data loaded: {processor.row_count()} listings in {len(sources)} partition(s)")
+    return processor
+
+
+def dataset_swapped(version):
+    """Drop results computed from the previous version and update the gauges"""
+    result_cache.invalidate()
+    compressed_cache.invalidate()
+    METRICS.set('airbnb_dataset_version', version.version)
+    METRICS.set('airbnb_dataset_rows', version.processor.row_count())
+
+
+# Versioned reference to the live dataset; swapping it clears the result cache
+datasets = DatasetManager(build_dataset, on_swap=dataset_swapped)
+
+# Load and process data on startup (from the preprocessed snapshot when fresh).
+# Not when a partition loading worker re-imports this file as its main module (python app.py)
+if __name__ != '__mp_main__':
+    try:
+        datasets.swap(build_dataset(DATA_SOURCE), DATA_SOURCE)
+    except Exception as e:
+        print(f"Error: Data loading failed ({e})")
+
+
+@app.before_request
+def pin_dataset():
+    """Serve the whole request from the dataset version that is live now"""
+    g.dataset = datasets.acquire()
+
+
+@app.before_request
+def start_request():
+    """Start the request timer (and the profiler when asked for)"""
+    g.request_start = time.perf_counter()
+    if ENABLE_PROFILING and parse_flag(request.args.get('profile')):
+        g.profiler = start_profiler()
+
+
+@app.before_request
+def check_city():
+    """Reject queries for cities that are not loaded"""
+    if request.method == 'GET' and request.args.get('city') and g.dataset is not None:
+        try:
+            g.dataset.processor.select_cities(request.args['city'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+
+@app.after_request
+def record_request(response):
+    """Record latency, status and payload size; swap in the profile if one ran"""
+    route = route_label()
+    elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+    status = str(response.status_code)
+    METRICS.observe('airbnb_request_duration_seconds', elapsed, route=route, method=request.method, status=status)
+    METRICS.inc('airbnb_requests_total', route=route, method=request.method, status=status)
+    if not response.is_streamed:
+        METRICS.observe('airbnb_response_bytes', response.content_length or 0, buckets=SIZE_BUCKETS, route=route)
+    if response.status_code >= 500:
+        error = (response.get_json(silent=True) or {}).get('error') if response.is_json else None
+        print(f"{request.method} {request.full_path} failed with {status}: {error}")
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        return jsonify({
+            'route': route,
+            'status': response.status_code,
+            'response_bytes': None if response.is_streamed else response.content_length,
+            'elapsed_ms': round(elapsed * 1000, 3),
+            'profile': profile_report(profiler, sort=request.args.get('profile_sort', 'cumulative')),
+        })
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Compress large bodies with the encoding the client prefers (runs before record_request)"""
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None or response.content_length < COMPRESS_MIN_BYTES:
+        return response
+    body = response.get_data()
+    etag, _ = response.get_etag()
+    found, compressed = compressed_cache.get((etag, encoding)) if etag else (False, None)
+    if not found:
+        with METRICS.timer('airbnb_stage_duration_seconds', endpoint=route_label(), stage='compress'):
+            compressed = compress(body, encoding)
+        if etag:
+            compressed_cache.set((etag, encoding), compressed)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    METRICS.inc('airbnb_compression_saved_bytes_total', len(body) - len(compressed),
+                route=route_label(), encoding=encoding)
+    return response
+
+
+@app.teardown_request
+def release_dataset(exc):
+    datasets.release(g.pop('dataset', None))
+
+
+def current_processor():
+    """Processor of the dataset version pinned to this request"""
+    if g.dataset is None:
+        raise ValueError("Data not available. Process data first.")
+    return g.dataset.processor
+
+
+def require_admin(view):
+    """Only allow requests carrying the ADMIN_TOKEN in X-Admin-Token"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        admin_token = os.getenv('ADMIN_TOKEN')
+        supplied = request.headers.get('X-Admin-Token', '')
+        if not admin_token or not hmac.compare_digest(supplied, admin_token):
+            return jsonify({'error': 'Forbidden'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def negotiates_format(view):
+    """Mark a route whose body format depends on the Accept header"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = app.make_response(view(*args, **kwargs))
+        response.vary.add('Accept')
+        return response
+    return wrapper
+
+
+def http_cached(view=None, *, daily=False):
+    """Give the route's responses an ETag and Cache-Control; a matching If-None-Match gets a 304 without computing
+    
+    The ETag covers the data served, the path, the query string and the negotiated
+    format. daily adds today's date, for results relative to it.
+    """
+    if view is None:
+        return lambda view: http_cached(view, daily=daily)
+    
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if g.dataset is None or g.get('profiler') is not None:
+            return view(*args, **kwargs)
+        mimetype = negotiate(request.accept_mimetypes)
+        etag = make_etag(g.dataset.processor.data_tag, request.path, normalized_query(request.args),
+                         mimetype, daily and pd.Timestamp.now().strftime('%Y-%m-%d'))
+        if request.if_none_match.contains_weak(etag):
+            METRICS.inc('airbnb_not_modified_total', route=route_label())
+            response = app.response_class(status=304)
+            # Same Vary as the 200 would carry (compress_response skips bodiless responses)
+            if mimetype in COMPRESSIBLE_MIMETYPES:
+                response.vary.add('Accept-Encoding')
+        else:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        if HTTP_CACHE_MAX_AGE > 0:
+            response.cache_control.public = True
+            response.cache_control.max_age = HTTP_CACHE_MAX_AGE
+        else:
+            response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
+def columnar_response(columns, mimetype):
+    """Response carrying {field: list} in a binary format picked by negotiate()"""
+    start = time.perf_counter()
+    body = encode_columns(columns, mimetype)
+    METRICS.observe('airbnb_stage_duration_seconds', time.perf_counter() - start,
+                    endpoint=route_label(), stage='serialize')
+    return Response(body, mimetype=mimetype)
+
+
+def submit_cached(endpoint, filters, compute, target=None, **params):
+    """Future for (compute(filtered processor), seconds spent computing it; 0 on a cache hit)
+
+    The future is a cache hit, a joined in-flight run or a new one. The
+    duration is measured inside the pool task, so it does not include time
+    spent queued or waiting on other futures.
+    """
+    processor = current_processor()
+    params['dataset_version'] = g.dataset.version
+    key = result_cache.make_key(endpoint, processor.parse_filters(filters), params)
+    profiling = g.get('profiler') is not None
+    if not profiling:
+        found, value = result_cache.get(key)
+        if found:
+            return compute_pool.done((value, 0.0))
+    
+    def run():
+        start = time.perf_counter()
+        with METRICS.timer('airbnb_stage_duration_seconds', endpoint=endpoint, stage='filter'):
+            filtered = target or (processor.apply_filters(filters) if filters else processor)
+        METRICS.observe('airbnb_filtered_rows', filtered.row_count(), buckets=ROW_BUCKETS, endpoint=endpoint)
+        with METRICS.timer('airbnb_stage_duration_seconds', endpoint=endpoint, stage='aggregate'):
+            value = compute(filtered)
+        result_cache.set(key, value)
+        return value, time.perf_counter() - start
+    
+    if profiling:
+        # Compute on the request thread, bypassing the cache, so the profiler sees the work
+        return compute_pool.done(run())
+    return compute_pool.submit(key, run)
+
+
+def cached_result(endpoint, filters, compute, target=None, **params):
+    """Return compute(filtered processor), served from the result cache"""
+    value, _ = submit_cached(endpoint, filters, compute, target, **params).result(COMPUTE_TIMEOUT)
+    return value
+
+
+# Query parameters of /api/dashboard that are not filters
+DASHBOARD_PARAMS = ['panels', 'bins', 'exact', 'map_limit', 'hosts_limit', 'neighbourhoods_limit']
+DEFAULT_DASHBOARD_PANELS = [
+    'summary', 'price-distribution', 'price-trends', 'room-types', 'neighbourhoods',
+    'top-hosts', 'cancellation-policies', 'price-categories', 'availability-trends'
+]
+
+
+def dashboard_panels(args):
+    """Panel name -> (compute, cache params), mirroring the single-panel endpoints"""
+    bins = int(args.get('bins', 30))
+    exact = parse_flag(args.get('exact'))
+    map_limit = int(args.get('map_limit', 5000))
+    hosts_limit = int(args.get('hosts_limit', 10))
+    neighbourhoods_limit = int(args.get('neighbourhoods_limit', 15))
+    return {
+        'summary': (lambda p: p.get_summary_stats(exact), {'exact': exact}),
+        'price-distribution': (lambda p: p.get_price_distribution(bins, exact), {'bins': bins, 'exact': exact}),
+        'price-trends': (lambda p: p.get_price_trends_by_construction_year(), {}),
+        'room-types': (lambda p: p.get_room_type_comparison(), {}),
+        'map-data': (lambda p: p.get_map_data(map_limit), {'limit': map_limit, 'format': 'records'}),
+        'top-hosts': (lambda p: p.get_top_hosts(hosts_limit), {'limit': hosts_limit}),
+        'neighbourhoods': (lambda p: p.get_neighbourhood_analysis(neighbourhoods_limit),
+                           {'limit': neighbourhoods_limit}),
+        'cancellation-policies': (lambda p: p.get_cancellation_policy_distribution(), {}),
+        'price-categories': (lambda p: p.get_price_by_category(), {}),
+        'availability-trends': (lambda p: p.get_availability_trends(), {}),
+    }
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    record_count = len(processor.df_clean) if processor.df_clean is not None else 0
+    processor = g.dataset.processor if g.dataset is not None else None
+    record_count = processor.row_count() if processor is not None else 0
     return jsonify({
         'status': 'ok',
         'message': 'Airbnb Dashboard API is running',
-        'records': record_count
+        'records': record_count,
+        'cities': processor.cities() if processor is not None else [],
+        'dataset': datasets.status(),
+        'result_cache': result_cache.stats(),
+        'compute_pool': compute_pool.stats()
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics for this process"""
+    for source, stats in (('result_cache', result_cache.stats()), ('compute_pool', compute_pool.stats())):
+        for name, value in stats.items():
+            if isinstance(value, (int, float)):
+                METRICS.describe(f'airbnb_{source}_{name}', 'gauge', f"{source} {name} (see /api/health)")
+                METRICS.set(f'airbnb_{source}_{name}', value)
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/summary', methods=['GET'])
+@http_cached
 def get_summary():
     """Get summary statistics / KPIs"""
     try:
-        # Apply filters if provided
+        exact = parse_flag(request.args.get('exact'))
         filters = request.args.to_dict()
-        if filters:
-            filtered_processor = processor.apply_filters(filters)
-            summary = filtered_processor.get_summary_stats()
-        else:
-            summary = processor.get_summary_stats()
-        
+        filters.pop('exact', None)
+        summary = cached_result('summary', filters, lambda p: p.get_summary_stats(exact), exact=exact)
         return jsonify(summary)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/price-distribution', methods=['GET'])
+@http_cached
 def get_price_distribution():
     """Get price distribution data for histogram"""
     try:
         bins = int(request.args.get('bins', 30))
+        exact = parse_flag(request.args.get('exact'))
         filters = request.args.to_dict()
         filters.pop('bins', None)
+        filters.pop('exact', None)
         
-        if filters:
-            filtered_processor = processor.apply_filters(filters)
-            data = filtered_processor.get_price_distribution(bins)
-        else:
-            data = processor.get_price_distribution(bins)
-        
+        data = cached_result('price-distribution', filters, lambda p: p.get_price_distribution(bins, exact),
+                             bins=bins, exact=exact)
         return jsonify(data)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/price-trends', methods=['GET'])
+@http_cached
 def get_price_trends():
     """Get price trends over time (by construction year)"""
     try:
         filters = request.args.to_dict()
         
-        if filters:
-            filtered_processor = processor.apply_filters(filters)
-            data = filtered_processor.get_price_trends_by_construction_year()
-        else:
-            data = processor.get_price_trends_by_construction_year()
-        
+        data = cached_result('price-trends', filters, lambda p: p.get_price_trends_by_construction_year())
         return jsonify(data)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/room-types', methods=['GET'])
+@http_cached
 def get_room_types():
     """Get room type comparison data"""
     try:
         filters = request.args.to_dict()
         
-        if filters:
-            filtered_processor = processor.apply_filters(filters)
-            data = filtered_processor.get_room_type_comparison()
-        else:
-            data = processor.get_room_type_comparison()
-        
+        data = cached_result('room-types', filters, lambda p: p.get_room_type_comparison())
         return jsonify(data)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/map-data', methods=['GET'])
+@negotiates_format
+@http_cached
 def get_map_data():
     """Get location data for map visualization"""
     try:
         limit = int(request.args.get('limit', 5000))
+        orient = request.args.get('format', 'records')
+        stream = parse_flag(request.args.get('stream'))
+        mimetype = negotiate(request.accept_mimetypes)
         filters = request.args.to_dict()
-        filters.pop('limit', None)
+        for param in ('limit', 'format', 'stream', 'bbox', 'zoom'):
+            filters.pop(param, None)
         
-        if filters:
-            filtered_processor = processor.apply_filters(filters)
-            data = filtered_processor.get_map_data(limit)
-        else:
-            data = processor.get_map_data(limit)
+        # Viewport query: listings in view, or clusters when zoomed out
+        if request.args.get('bbox'):
+            try:
+                bbox = parse_bbox(request.args['bbox'])
+                zoom = int(request.args.get('zoom', CLUSTER_MAX_ZOOM))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            data = cached_result('map-view', filters, lambda p: p.get_map_view(bbox, zoom, limit),
+                                 bbox=bbox, zoom=zoom, limit=limit)
+            return jsonify(data)
+        
+        if orient not in ('records', 'columns'):
+            return jsonify({'error': "format must be 'records' or 'columns'"}), 400
+        
+        if mimetype != JSON_MIMETYPE:
+            # Binary formats are always columnar, and small enough not to stream
+            columns = cached_result('map-data', filters, lambda p: p.get_map_data(limit, 'columns'),
+                                    limit=limit, format='columns')
+            return columnar_response(columns, mimetype)
         
+        if stream and orient == 'records':
+            # Stream a JSON array chunk by chunk instead of building it in memory
+            processor = current_processor()
+            filtered = processor.apply_filters(filters) if filters else processor
+            
+            def generate():
+                yield '['
+                first = True
+                for chunk in filtered.iter_map_data(limit):
+                    if chunk:
+                        body = app.json.dumps(chunk)[1:-1]
+                        yield body if first else ',' + body
+                        first = False
+                yield ']'
+            
+            return Response(stream_with_context(generate()), mimetype='application/json')
+        
+        data = cached_result('map-data', filters, lambda p: p.get_map_data(limit, orient),
+                             limit=limit, format=orient)
         return jsonify(data)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/top-hosts', methods=['GET'])
+@negotiates_format
+@http_cached
 def get_top_hosts():
     """Get top hosts by listing count"""
     try:
         limit = int(request.args.get('limit', 10))
+        if limit < 0:
+            return jsonify({'error': "limit must not be negative"}), 400
+        offset = max(int(request.args.get('offset', 0)), 0)
         filters = request.args.to_dict()
         filters.pop('limit', None)
+        filters.pop('offset', None)
         
-        if filters:
-            filtered_processor = processor.apply_filters(filters)
-            data = filtered_processor.get_top_hosts(limit)
-        else:
-            data = processor.get_top_hosts(limit)
+        mimetype = negotiate(request.accept_mimetypes)
+        orient = 'records' if mimetype == JSON_MIMETYPE else 'columns'
         
-        return jsonify(data)
+        page = cached_result('top-hosts', filters, lambda p: p.get_top_hosts_page(limit, offset, orient),
+                             limit=limit, offset=offset, orient=orient)
+        # Body stays a list (or columns); the total lets clients page on with offset
+        if orient == 'columns':
+            response = columnar_response(page['hosts'], mimetype)
+        else:
+            response = jsonify(page['hosts'])
+        response.headers['X-Total-Count'] = str(page['total_hosts'])
+        return response
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/neighbourhoods', methods=['GET'])
+@http_cached
 def get_neighbourhoods():
     """Get neighbourhood analysis"""
     try:
@@ -167,74 +547,286 @@ def get_neighbourhoods():
         filters = request.args.to_dict()
         filters.pop('limit', None)
         
-        if filters:
-            filtered_processor = processor.apply_filters(filters)
-            data = filtered_processor.get_neighbourhood_analysis(limit)
-        else:
-            data = processor.get_neighbourhood_analysis(limit)
-        
+        data = cached_result('neighbourhoods', filters, lambda p: p.get_neighbourhood_analysis(limit), limit=limit)
         return jsonify(data)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/cancellation-policies', methods=['GET'])
+@http_cached
 def get_cancellation_policies():
     """Get cancellation policy distribution"""
     try:
         filters = request.args.to_dict()
         
-        if filters:
-            filtered_processor = processor.apply_filters(filters)
-            data = filtered_processor.get_cancellation_policy_distribution()
-        else:
-            data = processor.get_cancellation_policy_distribution()
-        
+        data = cached_result('cancellation-policies', filters, lambda p: p.get_cancellation_policy_distribution())
         return jsonify(data)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/price-categories', methods=['GET'])
+@http_cached
 def get_price_categories():
     """Get price distribution by category"""
     try:
         filters = request.args.to_dict()
         
-        if filters:
-            filtered_processor = processor.apply_filters(filters)
-            data = filtered_processor.get_price_by_category()
-        else:
-            data = processor.get_price_by_category()
-        
+        data = cached_result('price-categories', filters, lambda p: p.get_price_by_category())
         return jsonify(data)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/availability-trends', methods=['GET'])
+@http_cached
 def get_availability_trends():
     """Get availability trends"""
     try:
         filters = request.args.to_dict()
         
-        if filters:
-            filtered_processor = processor.apply_filters(filters)
-            data = filtered_processor.get_availability_trends()
-        else:
-            data = processor.get_availability_trends()
+        data = cached_result('availability-trends', filters, lambda p: p.get_availability_trends())
+        return jsonify(data)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/category-breakdown', methods=['GET'])
+@http_cached
+def get_category_breakdown():
+    """Get listing count and average price per bucket of a derived category"""
+    try:
+        by = request.args.get('by', 'price_category')
+        if by not in BUCKETINGS:
+            return jsonify({'error': f"by must be one of: {', '.join(BUCKETINGS)}"}), 400
+        filters = request.args.to_dict()
+        filters.pop('by', None)
         
+        data = cached_result('category-breakdown', filters, lambda p: p.get_category_breakdown(by), by=by)
         return jsonify(data)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/review-activity', methods=['GET'])
+@http_cached(daily=True)
+def get_review_activity():
+    """Get listings per week or month of last review, and how many were recently active"""
+    try:
+        interval = request.args.get('interval', 'month')
+        if interval not in REVIEW_INTERVALS:
+            return jsonify({'error': f"interval must be one of: {', '.join(REVIEW_INTERVALS)}"}), 400
+        try:
+            start, end = (pd.Timestamp(request.args[param]).normalize() if request.args.get(param) else None
+                          for param in ('start', 'end'))
+        except ValueError as e:
+            return jsonify({'error': f"Invalid date: {e}"}), 400
+        if start is not None and end is not None:
+            if start > end:
+                return jsonify({'error': 'start must not be after end'}), 400
+            periods = len(pd.period_range(start, end, freq=REVIEW_INTERVALS[interval]))
+            if periods > MAX_REVIEW_PERIODS:
+                return jsonify({'error': f"Too many periods ({periods}); use a larger interval or shorter range"}), 400
+        filters = request.args.to_dict()
+        for param in ('interval', 'start', 'end'):
+            filters.pop(param, None)
+        
+        # Recent activity is relative to today, so results are cached per day
+        as_of = pd.Timestamp.now().normalize()
+        data = cached_result('review-activity', filters,
+                             lambda p: p.get_review_activity(interval, start, end, as_of),
+                             interval=interval, start=start and start.isoformat(), end=end and end.isoformat(),
+                             as_of=as_of.isoformat())
+        return jsonify(data)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/query', methods=['GET'])
+@negotiates_format
+@http_cached
+def get_query():
+    """Group listings by any dimensions and compute metrics per group"""
+    try:
+        try:
+            query = parse_query(request.args.get('dimensions', ''), request.args.get('metrics', 'count'))
+            limit = int(request.args.get('limit', DEFAULT_QUERY_LIMIT))
+            offset = max(int(request.args.get('offset', 0)), 0)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not 0 < limit <= MAX_QUERY_LIMIT:
+            return jsonify({'error': f"limit must be between 1 and {MAX_QUERY_LIMIT}"}), 400
+        sort = request.args.get('sort') or None
+        fields = [*query.dimensions, *(metric.name for metric in query.metrics)]
+        if sort and sort.lstrip('-') not in fields:
+            return jsonify({'error': f"sort must be one of: {', '.join(fields)} (prefix - for descending)"}), 400
+        filters = request.args.to_dict()
+        for param in ('dimensions', 'metrics', 'sort', 'limit', 'offset'):
+            filters.pop(param, None)
+        
+        mimetype = negotiate(request.accept_mimetypes)
+        orient = 'records' if mimetype == JSON_MIMETYPE else 'columns'
+        
+        page = cached_result('query', filters, lambda p: p.get_query_page(query, sort, limit, offset, orient),
+                             dimensions=tuple(query.dimensions), metrics=tuple(query.metrics),
+                             sort=sort, limit=limit, offset=offset, orient=orient)
+        # Body stays a list (or columns); the total lets clients page on with offset
+        if orient == 'columns':
+            response = columnar_response(page['rows'], mimetype)
+        else:
+            response = jsonify(page['rows'])
+        response.headers['X-Total-Count'] = str(page['total_groups'])
+        return response
+    except QueryTooLarge as e:
+        return jsonify({'error': str(e)}), 400
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/dashboard', methods=['GET'])
+@http_cached
+def get_dashboard():
+    """Get several panels for one filter set in a single response"""
+    try:
+        panels = dashboard_panels(request.args)
+        requested = [name.strip() for name in request.args.get('panels', '').split(',') if name.strip()]
+        requested = requested or DEFAULT_DASHBOARD_PANELS
+        unknown = [name for name in requested if name not in panels]
+        if unknown:
+            return jsonify({'error': f"Unknown panels: {', '.join(unknown)}"}), 400
+        
+        filters = request.args.to_dict()
+        for param in DASHBOARD_PARAMS:
+            filters.pop(param, None)
+        
+        # Filter once; every panel shares the same row selection
+        start = time.perf_counter()
+        processor = current_processor()
+        filtered = processor.apply_filters(filters) if filters else processor
+        timings = {'filter': round((time.perf_counter() - start) * 1000, 3)}
+        
+        # Compute the panels concurrently in the pool; each panel's time is measured in its own task
+        futures = {}
+        for name in requested:
+            compute, params = panels[name]
+            futures[name] = submit_cached(name, filters, compute, target=filtered, **params)
+        data = {}
+        for name in requested:
+            data[name], elapsed = futures[name].result(COMPUTE_TIMEOUT)
+            timings[name] = round(elapsed * 1000, 3)
+        
+        return jsonify({'panels': data, 'timings_ms': timings})
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/memory', methods=['GET'])
+def get_memory():
+    """Get memory usage of the loaded dataset"""
+    try:
+        return jsonify(current_processor().memory_report())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/admin/delta', methods=['POST'])
+@require_admin
+def apply_delta():
+    """Upsert/delete listings from a delta CSV without a full reload"""
+    try:
+        # Delta CSV either uploaded as 'file' or read from a server-side 'path'
+        if 'file' in request.files:
+            delta = pd.read_csv(request.files['file'])
+        else:
+            path = (request.get_json(silent=True) or {}).get('path') or request.args.get('path')
+            if not path:
+                return jsonify({'error': "Upload a 'file' or give a 'path'"}), 400
+            delta = pd.read_csv(path)
+        
+        # Build the updated processor on the side, then swap it in; requests
+        # already running keep the version they started with
+        city = (request.get_json(silent=True) or {}).get('city') or request.args.get('city')
+        updated, stats = current_processor().apply_delta(delta, city)
+        version = datasets.swap(updated, expected_version=g.dataset.version)
+        stats['version'] = version.version
+        return jsonify(stats)
+    except VersionConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except (ValueError, KeyError, OSError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/admin/evict-columns', methods=['POST'])
+@require_admin
+def evict_columns():
+    """Free derived columns (all computed ones unless columns= names some); they are recomputed on next use"""
+    try:
+        body = request.get_json(silent=True) or {}
+        columns = body.get('columns') or request.args.get('columns')
+        if isinstance(columns, str):
+            columns = [column.strip() for column in columns.split(',') if column.strip()]
+        unknown = [column for column in columns or [] if column not in DERIVED_COLUMNS]
+        if unknown:
+            return jsonify({'error': f"Unknown derived column: {', '.join(unknown)}"}), 400
+        # Values are unchanged, so cached results and the dataset version stay valid
+        processor = current_processor()
+        evicted = processor.evict_columns(columns)
+        return jsonify({'evicted': evicted, 'derived_columns': processor.derived_columns()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/admin/reload', methods=['POST'])
+@require_admin
+def reload_dataset():
+    """Rebuild the dataset in the background and swap it in when ready"""
+    body = request.get_json(silent=True) or {}
+    path = body.get('path') or request.args.get('path')
+    city = body.get('city') or request.args.get('city')
+    source = None
+    if path:
+        # New paths replace (or add) those cities; the other partitions reload from their current paths
+        sources = parse_sources(path, default_city=city or DEFAULT_CITY)
+        missing = [csv_path for csv_path in sources.values() if not os.path.exists(csv_path)]
+        if missing:
+            return jsonify({'error': f"No such file: {', '.join(missing)}"}), 400
+        current = datasets.current()
+        if current is not None:
+            sources = {**parse_sources(current.source), **sources}
+        source = format_sources(sources)
+    if not datasets.reload_async(source):
+        return jsonify({'error': 'A reload is already running', 'dataset': datasets.status()}), 409
+    return jsonify({'started': True, 'dataset': datasets.status()}), 202
+
+
 @app.route('/api/filter-options', methods=['GET'])
+@http_cached
 def get_filter_options():
     """Get available filter options"""
     try:
-        options = processor.get_filter_options()
+        options = cached_result('filter-options', {}, lambda p: p.get_filter_options())
         return jsonify(options)
+    except (PoolSaturated, TimeoutError) as e:
+        return jsonify({'error': str(e) or 'Computation timed out'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -243,7 +835,7 @@ if __name__ == '__main__':
     print("\n" + "="*50)
     print("🚀 Airbnb Dashboard API Server")
     print("="*50)
-    record_count = len(processor.df_clean) if processor.df_clean is not None else 0
+    record_count = datasets.status().get('records', 0)
     print(f"📊 Loaded {record_count} listings")
     print("🌐 Server running on http://localhost:5000")
     print("="*50 + "\n")
@@ -0,0 +1,80 @@
+"""
+Ingestion Memory Benchmark
+Reports wall time and peak RSS of the classic load/clean/compact pipeline
+versus the chunked streaming loader. Each mode runs in a fresh process so
+peak RSS is not shared between them.
+
+Usage:
+    python benchmarks/ingest_memory.py [csv_path] [--chunksize N]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CSV_PATH = os.path.join(BACKEND_DIR, 'data', 'Airbnb_Open_Data.csv')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_mode(mode, csv_path, chunksize):
+    """Run one ingestion mode in this process and return its measurements"""
+    sys.path.insert(0, BACKEND_DIR)
+    from data_processor import AirbnbDataProcessor
+
+    baseline = peak_rss_mb()
+    processor = AirbnbDataProcessor(csv_path)
+    start = time.perf_counter()
+    if mode == 'classic':
+        processor.load_data()
+        processor.clean_data()
+    else:
+        processor.load_streaming(chunksize=chunksize)
+    # Both end compacted, as in snapshot.build_processor
+    processor.compact()
+    elapsed = time.perf_counter() - start
+    return {
+        'mode': mode,
+        'rows': len(processor.df_clean),
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'baseline_rss_mb': round(baseline, 1),
+        'df_clean_mb': round(processor.df_clean.memory_usage(deep=True).sum() / 1024 ** 2, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare peak memory of the ingestion paths")
+    parser.add_argument('csv_path', nargs='?', default=DEFAULT_CSV_PATH)
+    parser.add_argument('--chunksize', type=int, default=50000)
+    parser.add_argument('--mode', choices=['classic', 'streaming'], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.csv_path, args.chunksize)))
+        return
+
+    for mode in ('classic', 'streaming'):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), args.csv_path,
+             '--chunksize', str(args.chunksize), '--mode', mode],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:>10}: {result['rows']} rows in {result['seconds']}s, "
+              f"peak RSS {result['peak_rss_mb']} MB (baseline {result['baseline_rss_mb']} MB, "
+              f"df_clean {result['df_clean_mb']} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Legacy Per-Row Cleaning
+The row-at-a-time implementations the cleaning pipeline used before it was
+vectorized (Series.apply with a Python function per value). Kept only as a
+reference: the tests check the vectorized columns against them and the
+suite's vectorize group times both.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+def clean_price(price_str):
+    """Clean price string to float"""
+    if pd.isna(price_str):
+        return np.nan
+    if isinstance(price_str, (int, float)):
+        return float(price_str)
+    # Remove $ and commas, strip whitespace
+    cleaned = str(price_str).replace('$', '').replace(',', '').strip()
+    try:
+        return float(cleaned)
+    except:
+        return np.nan
+
+
+def categorize_rating(rating):
+    if pd.isna(rating):
+        return 'No Rating'
+    elif rating >= 4.5:
+        return 'Excellent (4.5+)'
+    elif rating >= 4.0:
+        return 'Good (4.0-4.5)'
+    elif rating >= 3.0:
+        return 'Fair (3.0-4.0)'
+    else:
+        return 'Poor (<3.0)'
+
+
+def categorize_price(price):
+    if price < 100:
+        return 'Budget (<$100)'
+    elif price < 200:
+        return 'Mid-range ($100-$200)'
+    elif price < 500:
+        return 'Premium ($200-$500)'
+    else:
+        return 'Luxury ($500+)'
+
+
+def categorize_review_freq(freq):
+    if pd.isna(freq) or freq == 0:
+        return 'No Reviews'
+    elif freq < 0.5:
+        return 'Low (<0.5/month)'
+    elif freq < 1.5:
+        return 'Medium (0.5-1.5/month)'
+    else:
+        return 'High (>1.5/month)'
+
+
+def categorize_host_activity(listings_count):
+    if listings_count == 1:
+        return 'Single Listing'
+    elif listings_count <= 3:
+        return 'Small Host (2-3)'
+    elif listings_count <= 10:
+        return 'Medium Host (4-10)'
+    else:
+        return 'Large Host (10+)'
+
+
+# Derived column -> (cleaned column it is computed from, per-row function)
+LEGACY_CATEGORIES = {
+    'rating_category': ('review_rate_clean', categorize_rating),
+    'price_category': ('price_clean', categorize_price),
+    'review_frequency_category': ('reviews_per_month_clean', categorize_review_freq),
+    'host_activity_level': ('calculated_host_listings_clean', categorize_host_activity),
+}
+
+
+def legacy_category(df, name):
+    """Derived category column name computed row by row"""
+    column, categorize = LEGACY_CATEGORIES[name]
+    return df[column].apply(categorize)
+
+
+def legacy_listing_age(df):
+    """Years since construction (missing outside 0-100), row by row"""
+    age = datetime.now().year - df['construction_year_clean']
+    return age.apply(lambda x: x if 0 <= x <= 100 else np.nan)
+
+
+def legacy_days_since_review(df, current_date):
+    """Days between current_date and the last review, row by row"""
+    return df['last_review_date'].apply(lambda x: (current_date - x).days if pd.notna(x) else None)
@@ -0,0 +1,173 @@
+"""
+Multi-Worker Serving Memory Benchmark
+Starts gunicorn (gunicorn.conf.py) with an increasing number of workers,
+drives a mix of API requests at it, then reports the memory of the whole
+process tree. RSS counts shared pages once per process; PSS splits them
+between the processes sharing them, so its total is what the machine really
+spends. With preload_app the total PSS should grow far slower than the
+worker count. Linux only (reads /proc).
+
+Usage:
+    python benchmarks/serve_memory.py [--workers 1,2,4,8] [--requests 400] [--no-preload]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Requests cycled through by the load generator
+ENDPOINTS = [
+    '/api/summary',
+    '/api/summary?room_type=Entire%20home/apt',
+    '/api/price-distribution?bins=40',
+    '/api/room-types?borough=Manhattan',
+    '/api/neighbourhoods',
+    '/api/top-hosts?limit=20',
+    '/api/map-data?limit=2000',
+    '/api/map-data?bbox=-74.02,40.70,-73.93,40.80&zoom=13',
+    '/api/availability-trends?price_min=100&price_max=400',
+    '/api/dashboard?borough=Brooklyn',
+]
+
+
+def children(pid):
+    """Pids whose parent is pid"""
+    result = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; fields resume after ')'
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            result.append(int(entry))
+    return result
+
+
+def process_memory_mb(pid):
+    """RSS, PSS and private (unshared) memory of one process in MB"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[0].endswith(':'):
+                values[parts[0][:-1]] = int(parts[1])
+    private = values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+    return {
+        'rss': values.get('Rss', 0) / 1024,
+        'pss': values.get('Pss', 0) / 1024,
+        'private': private / 1024,
+    }
+
+
+def wait_ready(base_url, proc, timeout):
+    """Poll /api/health until the server answers"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/health', timeout=5) as response:
+                if json.load(response).get('records'):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("gunicorn did not become ready in time")
+
+
+def fetch(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def run(workers, port, n_requests, concurrency, preload, startup_timeout):
+    """Serve with this many workers, load it, and measure the process tree"""
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port), HOST='127.0.0.1',
+               GUNICORN_PRELOAD='true' if preload else 'false')
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_ready(base_url, proc, startup_timeout)
+        # Without preload every worker loads the dataset itself; wait for all of them
+        while len(children(proc.pid)) < workers:
+            time.sleep(0.2)
+
+        urls = [base_url + ENDPOINTS[i % len(ENDPOINTS)] for i in range(n_requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(fetch, urls))
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for status, _ in results if status != 200)
+        latencies = sorted(seconds for _, seconds in results)
+
+        pids = [proc.pid] + children(proc.pid)
+        memory = [process_memory_mb(pid) for pid in pids]
+        return {
+            'workers': workers,
+            'preload': preload,
+            'requests': n_requests,
+            'failed': failed,
+            'requests_per_second': round(n_requests / elapsed, 1),
+            'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+            'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+            'processes': len(pids),
+            'total_rss_mb': round(sum(m['rss'] for m in memory), 1),
+            'total_pss_mb': round(sum(m['pss'] for m in memory), 1),
+            'total_private_mb': round(sum(m['private'] for m in memory), 1),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure memory of multi-worker serving under load")
+    parser.add_argument('--workers', default='1,2,4', help="comma-separated worker counts")
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--no-preload', action='store_true', help="load the dataset in every worker")
+    parser.add_argument('--startup-timeout', type=float, default=300)
+    parser.add_argument('--json', action='store_true', help="print raw results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for workers in (int(n) for n in args.workers.split(',')):
+        result = run(workers, args.port, args.requests, args.concurrency,
+                     not args.no_preload, args.startup_timeout)
+        results.append(result)
+        if not args.json:
+            base = results[0]
+            growth = result['total_pss_mb'] / base['total_pss_mb'] if base['total_pss_mb'] else 0
+            print(f"{workers:>3} workers: PSS {result['total_pss_mb']:>8} MB "
+                  f"(x{growth:.2f} vs {base['workers']} worker), RSS {result['total_rss_mb']:>8} MB, "
+                  f"private {result['total_private_mb']:>8} MB, "
+                  f"{result['requests_per_second']} req/s, p95 {result['p95_ms']} ms, "
+                  f"{result['failed']} failed")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,462 @@
+"""
+Benchmark Suite
+Times the loading pipeline, every AirbnbDataProcessor query method and the
+API endpoints (through Flask's test client) on synthetic datasets of the
+Airbnb_Open_Data.csv schema. Results are written as JSON and can be compared
+against a stored baseline to catch regressions.
+
+Usage:
+    python benchmarks/suite.py --rows 10k,100k --output results.json
+    python benchmarks/suite.py --rows 100k --baseline baseline.json [--threshold 0.25]
+    python benchmarks/suite.py --rows 1M --only startup,processor
+    python benchmarks/suite.py --rows 100k --only encode
+    python benchmarks/suite.py --rows 100k --only http
+    python benchmarks/suite.py --rows 100k --only vectorize
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import numpy as np
+import pandas as pd
+
+from data_processor import AirbnbDataProcessor
+from query import parse_query
+from synthetic_data import ensure_csv, format_rows, parse_rows
+
+GROUPS = ['startup', 'processor', 'api', 'encode', 'http', 'vectorize']
+
+# Filter sets every query method is timed with: the cube path, and the row path
+FILTER_CASES = {
+    'all': {},
+    'categorical': {'borough': 'Brooklyn', 'room_type': 'Private room'},
+    'range': {'price_min': '200', 'price_max': '800', 'min_reviews': '10'},
+}
+
+# Viewports for get_map_view: all of NYC zoomed out (clusters) and a few blocks (rows)
+CITY_BBOX = (-74.25, 40.5, -73.7, 40.91)
+BLOCK_BBOX = (-73.99, 40.72, -73.97, 40.74)
+
+QUERY_METHODS = {
+    'get_summary_stats': lambda p: p.get_summary_stats(),
+    'get_summary_stats_exact': lambda p: p.get_summary_stats(exact=True),
+    'get_price_distribution': lambda p: p.get_price_distribution(30),
+    'get_price_distribution_exact': lambda p: p.get_price_distribution(30, exact=True),
+    'get_price_trends_by_construction_year': lambda p: p.get_price_trends_by_construction_year(),
+    'get_room_type_comparison': lambda p: p.get_room_type_comparison(),
+    'get_map_data': lambda p: p.get_map_data(5000),
+    'get_map_data[columns]': lambda p: p.get_map_data(5000, 'columns'),
+    'get_map_view[clusters]': lambda p: p.get_map_view(CITY_BBOX, 11, 5000),
+    'get_map_view[rows]': lambda p: p.get_map_view(BLOCK_BBOX, 16, 5000),
+    'get_top_hosts': lambda p: p.get_top_hosts(10),
+    'get_neighbourhood_analysis': lambda p: p.get_neighbourhood_analysis(15),
+    'get_cancellation_policy_distribution': lambda p: p.get_cancellation_policy_distribution(),
+    'get_price_by_category': lambda p: p.get_price_by_category(),
+    'get_availability_trends': lambda p: p.get_availability_trends(),
+    'get_review_activity[week]': lambda p: p.get_review_activity('week'),
+    'get_query_page[borough,room_type]': lambda p: p.get_query_page(
+        parse_query('borough,room_type', 'count,mean:price,median:price,p90:rating')),
+}
+
+API_REQUESTS = [
+    '/api/summary',
+    '/api/summary?borough=Manhattan&room_type=Entire%20home/apt',
+    '/api/summary?price_min=200&price_max=800',
+    '/api/price-distribution?bins=40',
+    '/api/price-distribution?bins=40&exact=true',
+    '/api/price-trends',
+    '/api/room-types?borough=Brooklyn',
+    '/api/map-data?limit=5000',
+    '/api/map-data?limit=5000&format=columns',
+    '/api/map-data?bbox=-74.25,40.5,-73.7,40.91&zoom=11',
+    '/api/top-hosts?limit=10',
+    '/api/neighbourhoods?min_reviews=10',
+    '/api/cancellation-policies',
+    '/api/price-categories',
+    '/api/availability-trends?price_min=100&price_max=400',
+    '/api/review-activity?interval=week&borough=Brooklyn',
+    '/api/query?dimensions=neighbourhood,price_category&metrics=count,median:price&sort=-count&price_min=100',
+    '/api/filter-options',
+    '/api/dashboard',
+    '/api/dashboard?borough=Queens&price_min=150',
+]
+
+
+# Columnar payloads timed by the encode group, in each response format
+ENCODE_PAYLOADS = {
+    'map-data[5000]': lambda p: p.get_map_data(5000, 'columns'),
+    'top-hosts[1000]': lambda p: p.get_top_hosts_page(1000, orient='columns')['hosts'],
+}
+
+# Requests timed by the http group: uncompressed, gzip, brotli and revalidated with If-None-Match
+HTTP_REQUESTS = [
+    '/api/map-data?limit=5000',
+    '/api/top-hosts?limit=1000',
+    '/api/dashboard',
+    '/api/query?dimensions=neighbourhood,room_type&metrics=count,mean:price,median:price',
+]
+
+# Response formats: JSON records (the default), JSON columns (format=columns) and binary mimetypes
+ENCODE_FORMATS = {
+    'json': None,
+    'json-columns': None,
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def summarize(times):
+    """Timing summary (milliseconds) of a list of durations in seconds"""
+    times_ms = sorted(t * 1000 for t in times)
+    return {
+        'repeats': len(times_ms),
+        'min_ms': round(times_ms[0], 4),
+        'median_ms': round(statistics.median(times_ms), 4),
+        'mean_ms': round(statistics.fmean(times_ms), 4),
+        'p95_ms': round(times_ms[min(int(len(times_ms) * 0.95), len(times_ms) - 1)], 4),
+    }
+
+
+def measure(fn, repeats, budget, setup=None, warmup=1):
+    """Time fn over up to repeats runs, stopping early (after 3) once budget seconds are spent"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    times = []
+    deadline = time.perf_counter() + budget
+    while len(times) < repeats and (len(times) < 3 or time.perf_counter() < deadline):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return summarize(times)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the pipeline's progress prints"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_startup(csv_path, repeats, chunksize):
+    """Each loading phase, timed along full pipeline runs"""
+    from snapshot import read_snapshot, write_snapshot
+
+    phases = {}
+
+    def record(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        phases.setdefault(name, []).append(time.perf_counter() - start)
+        return result
+
+    processor = None
+    with quiet(), tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, 'snapshot.feather')
+        for _ in range(repeats):
+            processor = AirbnbDataProcessor(csv_path)
+            record('load_data', processor.load_data)
+            record('clean_data', processor.clean_data)
+            record('compact', processor.compact)
+            record('build_indexes', processor.build_indexes)
+            streaming = AirbnbDataProcessor(csv_path)
+            record('load_streaming', lambda: streaming.load_streaming(chunksize=chunksize))
+            record('write_snapshot', lambda: write_snapshot(processor.df_clean, snapshot))
+            record('read_snapshot', lambda: read_snapshot(snapshot))
+    return {name: summarize(times) for name, times in phases.items()}, processor
+
+
+def bench_processor(processor, repeats, budget):
+    """apply_filters and every query method under each filter case"""
+    results = {}
+    for case, filters in FILTER_CASES.items():
+        if filters:
+            results[f'apply_filters[{case}]'] = measure(lambda: processor.apply_filters(filters), repeats, budget)
+            results[f'apply_filters+materialize[{case}]'] = measure(
+                lambda: processor.apply_filters(filters).df_clean, repeats, budget)
+        for name, method in QUERY_METHODS.items():
+            if filters:
+                fn = lambda: method(processor.apply_filters(filters))
+            else:
+                fn = lambda: method(processor)
+            results[f'{name}[{case}]'] = measure(fn, repeats, budget)
+    results['get_filter_options'] = measure(processor.get_filter_options, repeats, budget)
+    return results
+
+
+def load_app(csv_path):
+    """Import app.py serving csv_path (swapping the dataset if already imported)"""
+    os.environ.setdefault('DATA_PATH', csv_path)
+    with quiet():
+        import app as app_module
+        current = app_module.datasets.current()
+        if current is None or current.source != csv_path:
+            app_module.datasets.swap(app_module.build_dataset(csv_path), csv_path)
+    return app_module
+
+
+def bench_api(csv_path, repeats, budget):
+    """Cold (result cache cleared) and warm latency of each request via the test client"""
+    app_module = load_app(csv_path)
+    client = app_module.app.test_client()
+    results = {}
+    for url in API_REQUESTS:
+        def call():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+            return response
+
+        size = len(call().get_data())
+        for mode, setup in (('cold', app_module.result_cache.invalidate), ('warm', None)):
+            result = measure(call, repeats, budget, setup=setup)
+            result['requests_per_second'] = round(1000 / result['median_ms'], 1) if result['median_ms'] else None
+            result['response_bytes'] = size
+            results[f"{url[len('/api/'):]}[{mode}]"] = result
+    return results
+
+
+def bench_encode(processor, repeats, budget):
+    """Encode time and size of each payload per response format (JSON records include building the dicts)"""
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+    from data_processor import columns_to_records
+    from response_format import encoders
+
+    dumps = DefaultJSONProvider(Flask(__name__)).dumps
+    available = encoders()
+    results = {}
+    for payload, build in ENCODE_PAYLOADS.items():
+        columns = build(processor)
+        for name, mimetype in ENCODE_FORMATS.items():
+            if name == 'json':
+                encode = lambda: dumps(columns_to_records(columns)).encode()
+            elif name == 'json-columns':
+                encode = lambda: dumps(columns).encode()
+            elif mimetype in available:
+                encode = lambda: available[mimetype](columns)
+            else:
+                print(f"Skipping {payload}[{name}]: library not installed")
+                continue
+            result = measure(encode, repeats, budget)
+            result['response_bytes'] = len(encode())
+            results[f'{payload}[{name}]'] = result
+    return results
+
+
+def bench_http(csv_path, repeats, budget):
+    """Latency and body size of warm requests per content encoding, and of 304 revalidations"""
+    from http_cache import encodings
+
+    app_module = load_app(csv_path)
+    client = app_module.app.test_client()
+    results = {}
+    for url in HTTP_REQUESTS:
+        etag = client.get(url).headers['ETag']
+        modes = {'identity': ({}, None)}
+        for encoding in encodings():
+            # Cold compresses every time; cached serves the body compressed for this ETag earlier
+            modes[f'{encoding}-cold'] = ({'Accept-Encoding': encoding}, app_module.compressed_cache.invalidate)
+            modes[f'{encoding}-cached'] = ({'Accept-Encoding': encoding}, None)
+        modes['not-modified'] = ({'If-None-Match': etag, 'Accept-Encoding': 'gzip'}, None)
+        for mode, (headers, setup) in modes.items():
+            call = lambda: client.get(url, headers=headers)
+            result = measure(call, repeats, budget, setup=setup)
+            result['response_bytes'] = len(call().get_data())
+            results[f"{url[len('/api/'):]}[{mode}]"] = result
+    return results
+
+
+def bench_vectorize(csv_path, repeats, budget):
+    """Each vectorized cleaning step next to the legacy per-row apply it replaced, with the speedup"""
+    import derived_columns
+    import legacy_apply
+
+    raw = pd.read_csv(csv_path, low_memory=False)
+    processor = AirbnbDataProcessor(csv_path)
+    with quiet():
+        df = processor.clean_frame(raw.copy())
+    now = pd.Timestamp.now()
+    steps = {
+        'price': (lambda: raw['price'].apply(legacy_apply.clean_price),
+                  lambda: processor.clean_price_series(raw['price'])),
+        'service_fee': (lambda: raw['service fee'].apply(legacy_apply.clean_price),
+                        lambda: processor.clean_price_series(raw['service fee'])),
+        'listing_age': (lambda: legacy_apply.legacy_listing_age(df),
+                        lambda: derived_columns.listing_age(df)),
+        'days_since_review': (lambda: legacy_apply.legacy_days_since_review(df, now),
+                              lambda: derived_columns.days_since_review(df)),
+    }
+    for name in legacy_apply.LEGACY_CATEGORIES:
+        steps[name] = (lambda name=name: legacy_apply.legacy_category(df, name),
+                       lambda name=name: derived_columns.category_column(df, name))
+    results = {}
+    for name, (legacy, vectorized) in steps.items():
+        results[f'{name}[apply]'] = measure(legacy, repeats, budget)
+        result = measure(vectorized, repeats, budget)
+        result['speedup'] = round(results[f'{name}[apply]']['median_ms'] / result['median_ms'], 1)
+        results[f'{name}[vectorized]'] = result
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Versions and machine details stored with the results"""
+    try:
+        import pyarrow
+        pyarrow_version = pyarrow.__version__
+    except ImportError:
+        pyarrow_version = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'pyarrow': pyarrow_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold, noise_ms):
+    """Per-benchmark comparison of median times against the baseline"""
+    rows = []
+    for name in sorted(set(results) | set(baseline)):
+        current, base = results.get(name), baseline.get(name)
+        if current is None or base is None:
+            rows.append((name, base and base['median_ms'], current and current['median_ms'], None,
+                         'new' if base is None else 'missing'))
+            continue
+        ratio = current['median_ms'] / base['median_ms'] if base['median_ms'] else float('inf')
+        delta = current['median_ms'] - base['median_ms']
+        if ratio > 1 + threshold and delta > noise_ms:
+            status = 'REGRESSED'
+        elif ratio < 1 / (1 + threshold) and -delta > noise_ms:
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append((name, base['median_ms'], current['median_ms'], ratio, status))
+    return rows
+
+
+def print_results(results):
+    width = max(len(name) for name in results)
+    for name, result in results.items():
+        line = f"{name:<{width}}  median {result['median_ms']:>10.3f} ms  p95 {result['p95_ms']:>10.3f} ms"
+        if result.get('requests_per_second'):
+            line += f"  {result['requests_per_second']:>9.1f} req/s"
+        elif result.get('speedup'):
+            line += f"  x{result['speedup']:>8.1f} faster"
+        elif result.get('response_bytes'):
+            line += f"  {result['response_bytes']:>11,} bytes"
+        print(line)
+
+
+def print_comparison(rows):
+    width = max(len(row[0]) for row in rows)
+    for name, base, current, ratio, status in rows:
+        if ratio is None:
+            print(f"{name:<{width}}  {status}")
+        else:
+            print(f"{name:<{width}}  {base:>10.3f} -> {current:>10.3f} ms  x{ratio:5.2f}  {status}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the data processor and API")
+    parser.add_argument('--rows', default='10k,100k', help="comma-separated sizes, e.g. 10k,100k,1M,10M")
+    parser.add_argument('--only', default=','.join(GROUPS), help=f"comma-separated groups: {', '.join(GROUPS)}")
+    parser.add_argument('--repeats', type=int, default=20, help="max timed runs per benchmark")
+    parser.add_argument('--budget', type=float, default=3.0, help="seconds per benchmark before stopping early")
+    parser.add_argument('--startup-repeats', type=int, default=3)
+    parser.add_argument('--chunksize', type=int, default=50000, help="chunk size for load_streaming")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARKS_DIR, '.data'),
+                        help="where generated CSVs are cached")
+    parser.add_argument('--output', help="write results JSON here")
+    parser.add_argument('--baseline', help="compare against this results JSON")
+    parser.add_argument('--threshold', type=float, default=0.25, help="relative slowdown counted as a regression")
+    parser.add_argument('--noise-ms', type=float, default=0.5, help="ignore differences smaller than this")
+    args = parser.parse_args(argv)
+
+    groups = [group.strip() for group in args.only.split(',') if group.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for rows in (parse_rows(value) for value in args.rows.split(',')):
+        label = format_rows(rows)
+        csv_path = ensure_csv(args.data_dir, rows, args.seed)
+        print(f"== {label} rows ==")
+        processor = None
+        if 'startup' in groups:
+            startup, processor = bench_startup(csv_path, args.startup_repeats, args.chunksize)
+            results.update({f'{label}/startup/{name}': value for name, value in startup.items()})
+        if processor is None and ('processor' in groups or 'encode' in groups):
+            from snapshot import build_processor
+            with quiet():
+                processor = build_processor(csv_path)
+                processor.build_indexes()
+        if 'processor' in groups:
+            results.update({f'{label}/processor/{name}': value
+                            for name, value in bench_processor(processor, args.repeats, args.budget).items()})
+        if 'api' in groups:
+            results.update({f'{label}/api/{name}': value
+                            for name, value in bench_api(csv_path, args.repeats, args.budget).items()})
+        if 'encode' in groups:
+            results.update({f'{label}/encode/{name}': value
+                            for name, value in bench_encode(processor, args.repeats, args.budget).items()})
+        if 'http' in groups:
+            results.update({f'{label}/http/{name}': value
+                            for name, value in bench_http(csv_path, args.repeats, args.budget).items()})
+        if 'vectorize' in groups:
+            results.update({f'{label}/vectorize/{name}': value
+                            for name, value in bench_vectorize(csv_path, args.repeats, args.budget).items()})
+
+    print_results(results)
+    report = {'environment': environment(), 'settings': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline['results'], args.threshold, args.noise_ms)
+        print(f"\nComparison with {args.baseline} ({baseline['environment'].get('git_revision')}):")
+        print_comparison(rows)
+        regressions = [row for row in rows if row[4] == 'REGRESSED']
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Synthetic Airbnb Dataset Generator
+Writes a CSV with the same columns and messiness as Airbnb_Open_Data.csv
+(price strings like "$1,105 ", missing values, out-of-range nights and
+availability) at any size. Output is deterministic for a given seed and is
+written in chunks, so 10M rows do not need to fit in memory.
+
+Usage:
+    python benchmarks/synthetic_data.py 100k data/synthetic-100k.csv [--seed 0]
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+BOROUGHS = ['Manhattan', 'Brooklyn', 'Queens', 'Bronx', 'Staten Island']
+ROOM_TYPES = ['Entire home/apt', 'Private room', 'Shared room', 'Hotel room']
+POLICIES = ['flexible', 'moderate', 'strict']
+HOST_NAMES = ['Michael', 'David', 'John', 'Alex', 'Sarah', 'Maria', 'Daniel', 'Anna', 'Jessica', 'Chris']
+NEIGHBOURHOODS = [f'Neighbourhood {i}' for i in range(220)]
+
+# Rows generated per chunk
+CHUNK_ROWS = 250000
+
+
+def parse_rows(value):
+    """'10k', '1M', '2500' -> number of rows"""
+    value = str(value).strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+def format_rows(n):
+    """Inverse of parse_rows for labels: 100000 -> '100k'"""
+    if n >= 1000000 and n % 1000000 == 0:
+        return f'{n // 1000000}M'
+    if n >= 1000 and n % 1000 == 0:
+        return f'{n // 1000}k'
+    return str(n)
+
+
+def money(values):
+    """Format whole dollars the way the source CSV does ('$1,105 ')"""
+    return pd.Series(values).map('${:,} '.format)
+
+
+def generate_chunk(start, n, total, seed=0):
+    """Rows start..start+n of a dataset of total rows"""
+    rng = np.random.default_rng([seed, start])
+
+    def with_missing(values, fraction=0.02):
+        values = pd.Series(values, dtype=object)
+        values[rng.random(n) < fraction] = np.nan
+        return values
+
+    price = rng.integers(50, 1200, n)
+    last_review = pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 2900, n), unit='D')
+    # Most hosts have a handful of listings; one in a thousand owns ~100
+    big_hosts = max(total // 1000, 10)
+    host_ids = np.where(rng.random(n) < 0.1, rng.integers(0, big_hosts, n), rng.integers(0, max(total // 3, 1), n))
+    return pd.DataFrame({
+        'id': np.arange(1000000 + start, 1000000 + start + n),
+        'NAME': with_missing([f'Listing {i}' for i in range(start, start + n)], 0.003),
+        'host id': host_ids * 7919 + 10000000,
+        'host_identity_verified': with_missing(rng.choice(['verified', 'unconfirmed'], n), 0.003),
+        'host name': with_missing(np.asarray(HOST_NAMES)[host_ids % len(HOST_NAMES)], 0.004),
+        'neighbourhood group': with_missing(rng.choice(BOROUGHS, n, p=[0.42, 0.41, 0.13, 0.03, 0.01]), 0.003),
+        'neighbourhood': with_missing(rng.choice(NEIGHBOURHOODS, n), 0.002),
+        'lat': with_missing(np.round(40.5 + rng.random(n) * 0.41, 5), 0.001),
+        'long': with_missing(np.round(-74.25 + rng.random(n) * 0.55, 5), 0.001),
+        'country': with_missing(np.full(n, 'United States'), 0.005),
+        'country code': with_missing(np.full(n, 'US'), 0.001),
+        'instant_bookable': with_missing(rng.choice(['TRUE', 'FALSE'], n), 0.001),
+        'cancellation_policy': with_missing(rng.choice(POLICIES, n), 0.001),
+        'room type': rng.choice(ROOM_TYPES, n, p=[0.52, 0.45, 0.02, 0.01]),
+        'Construction year': with_missing(rng.integers(2003, 2023, n), 0.002),
+        'price': with_missing(money(price), 0.002),
+        'service fee': with_missing(money((price * 0.2).astype(int)), 0.003),
+        'minimum nights': with_missing(rng.integers(-10, 60, n), 0.004),
+        'number of reviews': with_missing(rng.integers(0, 600, n), 0.002),
+        'last review': with_missing(last_review.strftime('%m/%d/%Y'), 0.15),
+        'reviews per month': with_missing(np.round(rng.random(n) * 5, 2), 0.15),
+        'review rate number': with_missing(rng.integers(1, 6, n), 0.003),
+        'calculated host listings count': with_missing(rng.integers(1, 40, n), 0.003),
+        'availability 365': with_missing(rng.integers(-10, 420, n), 0.004),
+        'house_rules': with_missing(np.full(n, 'No smoking. No parties.'), 0.5),
+        'license': np.full(n, np.nan),
+    })
+
+
+def write_csv(path, rows, seed=0):
+    """Write a synthetic CSV of rows listings to path (atomically)"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    for start in range(0, rows, CHUNK_ROWS):
+        chunk = generate_chunk(start, min(CHUNK_ROWS, rows - start), rows, seed)
+        chunk.to_csv(tmp_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    if rows == 0:
+        generate_chunk(0, 0, 0, seed).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def ensure_csv(directory, rows, seed=0):
+    """Path of the synthetic CSV for rows/seed, generating it if missing"""
+    path = os.path.join(directory, f'synthetic-{format_rows(rows)}-seed{seed}.csv')
+    if not os.path.exists(path):
+        print(f"Generating {format_rows(rows)} rows -> {path}")
+        write_csv(path, rows, seed)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Airbnb_Open_Data.csv")
+    parser.add_argument('rows', help="number of rows, e.g. 10k, 100k, 1M, 10M")
+    parser.add_argument('output')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write_csv(args.output, parse_rows(args.rows), args.seed)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Bucket Codes for Derived Categories
+Each bucketing of the dataset (availability bins, price, rating and review
+frequency categories, host activity levels) is computed once as an integer
+code array. Breakdowns by these categories are pivot queries over the codes
+(see query.py) and never write to the shared frame.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Availability buckets used by get_availability_trends
+AVAILABILITY_BINS = [0, 30, 90, 180, 270, 365]
+AVAILABILITY_LABELS = ['0-30 days', '31-90 days', '91-180 days', '181-270 days', '271-365 days']
+
+# Labels of the derived category columns, in display order
+PRICE_CATEGORIES = ['Budget (<$100)', 'Mid-range ($100-$200)', 'Premium ($200-$500)', 'Luxury ($500+)']
+RATING_CATEGORIES = ['No Rating', 'Excellent (4.5+)', 'Good (4.0-4.5)', 'Fair (3.0-4.0)', 'Poor (<3.0)']
+REVIEW_FREQUENCY_CATEGORIES = ['No Reviews', 'Low (<0.5/month)', 'Medium (0.5-1.5/month)', 'High (>1.5/month)']
+HOST_ACTIVITY_LEVELS = ['Single Listing', 'Small Host (2-3)', 'Medium Host (4-10)', 'Large Host (10+)']
+
+# Bucketing name -> ordered labels; names other than 'availability' are also derived columns
+BUCKETINGS = {
+    'availability': AVAILABILITY_LABELS,
+    'price_category': PRICE_CATEGORIES,
+    'rating_category': RATING_CATEGORIES,
+    'review_frequency_category': REVIEW_FREQUENCY_CATEGORIES,
+    'host_activity_level': HOST_ACTIVITY_LEVELS,
+}
+
+
+def availability_codes(availability):
+    """Availability bin of each value (-1 when missing or outside 0-365)"""
+    codes = pd.cut(availability, bins=AVAILABILITY_BINS, labels=False, include_lowest=True)
+    return np.nan_to_num(np.asarray(codes, dtype=float), nan=-1).astype(np.int8)
+
+
+def rating_codes(rating):
+    """Rating category of each review rate (no rating, then from excellent down to poor)"""
+    return np.select([rating.isna(), rating >= 4.5, rating >= 4.0, rating >= 3.0], [0, 1, 2, 3],
+                     default=4).astype(np.int8)
+
+
+def price_codes(price):
+    """Price category of each price"""
+    return np.select([price < 100, price < 200, price < 500], [0, 1, 2], default=3).astype(np.int8)
+
+
+def review_frequency_codes(freq):
+    """Review frequency category of each reviews-per-month value"""
+    return np.select([freq.isna() | (freq == 0), freq < 0.5, freq < 1.5], [0, 1, 2], default=3).astype(np.int8)
+
+
+def host_activity_codes(listings_count):
+    """Host activity level of each host listings count"""
+    return np.select([listings_count == 1, listings_count <= 3, listings_count <= 10], [0, 1, 2],
+                     default=3).astype(np.int8)
+
+
+# Bucketing name -> (cleaned column it is computed from, code function)
+BUCKET_SOURCES = {
+    'availability': ('availability_365_clean', availability_codes),
+    'price_category': ('price_clean', price_codes),
+    'rating_category': ('review_rate_clean', rating_codes),
+    'review_frequency_category': ('reviews_per_month_clean', review_frequency_codes),
+    'host_activity_level': ('calculated_host_listings_clean', host_activity_codes),
+}
+
+
+def bucket_codes(df, name):
+    """Code of each row in bucketing name (-1 when it has no bucket), from its source column"""
+    column, codes = BUCKET_SOURCES[name]
+    return codes(df[column])
@@ -0,0 +1,66 @@
+"""
+Compute Pool for Endpoint Aggregations
+Bounded thread pool that runs aggregations off the request threads. Identical
+requests in flight at the same time share one computation instead of each
+running it.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class PoolSaturated(Exception):
+    """Raised when too many computations are already queued"""
+
+
+class ComputePool:
+    def __init__(self, max_workers=4, max_pending=64):
+        """Run at most max_workers computations at once, queueing up to max_pending"""
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='compute')
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+
+    @staticmethod
+    def done(value):
+        """An already completed Future holding value (e.g. a cache hit)"""
+        future = Future()
+        future.set_result(value)
+        return future
+
+    def submit(self, key, compute):
+        """Future for compute(), joining the one already in flight for key"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                return future
+            if len(self._in_flight) >= self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated("Server busy, try again shortly")
+            future = self._executor.submit(compute)
+            self._in_flight[key] = future
+            self.submitted += 1
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return future
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def stats(self):
+        """Counters for the health endpoint"""
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'in_flight': len(self._in_flight),
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'rejected': self.rejected,
+            }
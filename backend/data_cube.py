@@ -0,0 +1,166 @@
+"""
+Data Cube for the Airbnb Dataset
+Per-cell aggregates over every combination of the categorical filter
+dimensions, so purely categorical requests roll up cells instead of rows
+"""
+
+import itertools
+import math
+
+import numpy as np
+import pandas as pd
+
+from filter_index import CATEGORICAL_FILTERS
+from partials import PARTIAL_MEASURES
+from sketch import PRICE_SKETCH
+
+
+# Measures with count/sum/min/max per cell
+CUBE_MEASURES = PARTIAL_MEASURES
+
+
+def integral(values):
+    """Whether values are whole numbers small enough that their sum is exact in any order"""
+    return np.abs(values).sum() < 2 ** 53 and np.array_equal(values, np.floor(values))
+
+
+def cell_sums(cells, values, n_cells):
+    """Sum of values per cell, and the remainder each sum was rounded by
+
+    math.fsum over the sums and remainders of any cells gives the correctly
+    rounded total of their values, whatever cells are rolled up.
+    """
+    if integral(values):
+        return np.bincount(cells, weights=values, minlength=n_cells), np.zeros(n_cells)
+    order = np.argsort(cells, kind='stable')
+    bounds = np.searchsorted(cells[order], np.arange(n_cells + 1))
+    values = values[order]
+    sums, remainders = np.zeros(n_cells), np.zeros(n_cells)
+    for cell in np.flatnonzero(np.diff(bounds)):
+        part = values[bounds[cell]:bounds[cell + 1]]
+        sums[cell] = math.fsum(part)
+        remainders[cell] = math.fsum(itertools.chain(part, [-sums[cell]]))
+    return sums, remainders
+
+
+def cell_stats(cells, values, n_cells):
+    """Non-null count, sum (with its rounding remainder), min and max of values per cell"""
+    valid = ~np.isnan(values)
+    cells, values = cells[valid], values[valid]
+    minimum = np.full(n_cells, np.nan)
+    maximum = np.full(n_cells, np.nan)
+    if len(values):
+        extremes = pd.Series(values).groupby(cells).agg(['min', 'max'])
+        minimum[extremes.index] = extremes['min'].to_numpy()
+        maximum[extremes.index] = extremes['max'].to_numpy()
+    sums, remainders = cell_sums(cells, values, n_cells)
+    return {
+        'count': np.bincount(cells, minlength=n_cells),
+        'sum': sums,
+        'remainder': remainders,
+        'min': minimum,
+        'max': maximum,
+    }
+
+
+def sparse_pairs(cells, keys, n_keys):
+    """Distinct (cell, key) pairs with their row counts, as (cells, keys, counts)"""
+    valid = keys >= 0
+    pairs, counts = np.unique(cells[valid].astype(np.int64) * n_keys + keys[valid], return_counts=True)
+    return pairs // n_keys, pairs % n_keys, counts
+
+
+class DataCube:
+    def __init__(self, df):
+        """Aggregate df into one cell per combination of dimension values"""
+        self.dimensions = list(CATEGORICAL_FILTERS)
+        self.labels = {}
+        self.lookup = {}
+        codes = []
+        for param in self.dimensions:
+            dim_codes, uniques = pd.factorize(df[CATEGORICAL_FILTERS[param]], sort=True, use_na_sentinel=False)
+            codes.append(dim_codes)
+            self.labels[param] = uniques
+            self.lookup[param] = {value: i for i, value in enumerate(uniques)}
+        self.shape = tuple(max(len(self.labels[param]), 1) for param in self.dimensions)
+        self.n_cells = int(np.prod(self.shape))
+        cells = np.ravel_multi_index(codes, self.shape) if len(df) else np.empty(0, dtype=np.intp)
+        self.cell_codes = dict(zip(self.dimensions, np.unravel_index(np.arange(self.n_cells), self.shape)))
+
+        self.count = np.bincount(cells, minlength=self.n_cells)
+        self.stats = {
+            name: cell_stats(cells, df[column].to_numpy(dtype=float), self.n_cells)
+            for name, column in CUBE_MEASURES.items()
+        }
+
+        # Price quantile sketch per cell (for medians, percentiles and histograms)
+        self.sketch_cells, self.sketch_keys, self.sketch_counts = sparse_pairs(
+            cells, PRICE_SKETCH.buckets(df['price_clean']), PRICE_SKETCH.size)
+
+        # Distinct hosts per cell, for host counts
+        host_codes, self.host_ids = pd.factorize(df['host id'])
+        verified = (df['host_verified'] == 'verified').to_numpy()
+        self.n_hosts = int(host_codes.max()) + 1 if len(host_codes) else 0
+        self.host_cells, self.host_keys, _ = sparse_pairs(cells, host_codes, max(self.n_hosts, 1))
+        self.verified_cells, self.verified_keys, _ = sparse_pairs(
+            cells[verified], host_codes[verified], max(self.n_hosts, 1))
+
+    def select(self, categorical):
+        """CubeSlice for an {param: value} filter set"""
+        mask = np.ones(self.n_cells, dtype=bool)
+        for param, value in categorical.items():
+            code = self.lookup[param].get(value)
+            if code is None:
+                mask[:] = False
+                break
+            mask &= self.cell_codes[param] == code
+        return CubeSlice(self, mask)
+
+
+class CubeSlice:
+    def __init__(self, cube, mask):
+        """Cells of cube selected by a boolean mask"""
+        self.cube = cube
+        self.mask = mask
+
+    def total(self, measure, field='sum'):
+        stats = self.cube.stats[measure]
+        if field == 'sum':
+            # Correctly rounded, so its mean rounds like a sum over the same rows (except near ties)
+            return np.float64(math.fsum(itertools.chain(stats['sum'][self.mask], stats['remainder'][self.mask])))
+        return stats[field][self.mask].sum()
+
+    def price_sketch(self):
+        """Merged price sketch of the selected cells"""
+        cube = self.cube
+        selected = self.mask[cube.sketch_cells]
+        return np.bincount(cube.sketch_keys[selected], weights=cube.sketch_counts[selected],
+                           minlength=PRICE_SKETCH.size)
+    
+    def hosts(self, cells, keys):
+        """Distinct host ids among the (cell, host) pairs of the selected cells"""
+        selected = self.mask[cells]
+        present = np.bincount(keys[selected], minlength=self.cube.n_hosts)
+        return np.asarray(self.cube.host_ids)[np.flatnonzero(present)]
+
+    def summary_partial(self):
+        """Partial of get_summary_stats (see partials.summary_partial) from the selected cells"""
+        cube = self.cube
+        return {
+            'count': int(cube.count[self.mask].sum()),
+            'measures': {name: (self.total(name), int(self.total(name, 'count'))) for name in CUBE_MEASURES},
+            'prices': None,
+            'price_sketch': self.price_sketch(),
+            'host_ids': self.hosts(cube.host_cells, cube.host_keys),
+            'verified_host_ids': self.hosts(cube.verified_cells, cube.verified_keys),
+        }
+
+    def price_partial(self):
+        """Price count, exact min and max, and merged sketch of the selected cells"""
+        prices = self.cube.stats['price']
+        return {
+            'count': int(prices['count'][self.mask].sum()),
+            'min': np.nanmin(prices['min'][self.mask], initial=np.inf),
+            'max': np.nanmax(prices['max'][self.mask], initial=-np.inf),
+            'price_sketch': self.price_sketch(),
+        }
@@ -3,11 +3,156 @@ Data Processor for Airbnb Dataset
 Handles data cleaning, preparation, and calculated fields
 """
 
+import hashlib
 import pandas as pd
 import numpy as np
-from datetime import datetime
 import re
 
+from derived_columns import (DATE_RELATIVE_COLUMNS, DERIVE_LOCK, DERIVED_COLUMNS, materialize,
+                             materialized_columns, without_columns)
+from filter_index import FilterIndex
+from data_cube import DataCube
+from date_index import DateIndex, period_bounds, review_activity_response, review_range
+from host_index import HostIndex
+from partials import PARTIAL_MEASURES, near_ties, summary_from_partials, summary_partial
+from query import (BOROUGH_QUERY, CONSTRUCTION_YEAR_QUERY, DEFAULT_QUERY_LIMIT, POLICY_QUERY, ROOM_TYPE_QUERY,
+                   QueryIndex, breakdown_records, category_query, cube_answers, cube_partial, neighbourhood_records,
+                   policy_records, price_trend_columns, query_frame, query_page, room_type_records)
+from sketch import PRICE_SKETCH, histogram_response
+from spatial_index import SpatialIndex, CLUSTER_MAX_ZOOM
+
+
+# Raw columns still read after cleaning; the others are dropped by compact()
+RAW_COLUMNS_USED = ['id', 'NAME', 'host id', 'host name']
+
+# Numeric columns that are never averaged or summed by an endpoint, so they
+# can be downcast (when lossless) without changing any response
+DOWNCAST_COLUMNS = [
+    'id', 'host id', 'construction_year_clean', 'minimum_nights_clean',
+    'calculated_host_listings_clean', 'reviews_per_month_clean', 'service_fee_clean',
+]
+
+# Object columns with at most this ratio of distinct values become categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+# Raw columns read by the pipeline or the API, with explicit dtypes for streaming loads
+# (ids are read as floats, since a blank id in any chunk would fail an int64 read)
+RAW_DTYPES = {
+    'id': 'float64',
+    'NAME': 'object',
+    'host id': 'float64',
+    'host_identity_verified': 'object',
+    'host name': 'object',
+    'neighbourhood group': 'object',
+    'neighbourhood': 'object',
+    'lat': 'float64',
+    'long': 'float64',
+    'instant_bookable': 'object',
+    'cancellation_policy': 'object',
+    'room type': 'object',
+    'Construction year': 'float64',
+    'price': 'object',
+    'service fee': 'object',
+    'minimum nights': 'float64',
+    'number of reviews': 'float64',
+    'last review': 'object',
+    'reviews per month': 'float64',
+    'review rate number': 'float64',
+    'calculated host listings count': 'float64',
+    'availability 365': 'float64',
+}
+
+# Id columns read_csv infers as int64 unless one is blank
+ID_COLUMNS = ['id', 'host id']
+
+# Raw columns nothing reads (skipped by streaming loads, dropped by compact())
+UNREAD_RAW_COLUMNS = ['country', 'country code', 'house_rules', 'license']
+
+
+# Delta files: source columns plus this column ('delete' removes the id, anything else upserts)
+DELTA_ACTION_COLUMN = 'action'
+
+
+def align_dtypes(existing, new):
+    """Cast new rows to existing's dtypes (widening existing columns when needed)"""
+    existing = existing.copy(deep=False)
+    new = new.copy()
+    for column in existing.columns:
+        current, incoming = existing[column], new[column]
+        if isinstance(current.dtype, pd.CategoricalDtype):
+            categories = current.cat.categories.union(pd.Index(incoming.dropna().unique()))
+            existing[column] = current.cat.set_categories(categories)
+            new[column] = pd.Categorical(incoming, categories=categories)
+        elif pd.api.types.is_numeric_dtype(current) and current.dtype != incoming.dtype:
+            try:
+                cast = incoming.astype(current.dtype)
+                exact = cast.astype(incoming.dtype).equals(incoming)
+            except (ValueError, TypeError):
+                exact = False
+            if exact:
+                new[column] = cast
+            else:
+                wider = np.result_type(current.dtype, incoming.dtype)
+                existing[column] = current.astype(wider)
+                new[column] = incoming.astype(wider)
+    return existing, new
+
+
+def compact_frame(df):
+    """df without unused raw columns, with low-cardinality text as categoricals and numerics downcast"""
+    raw_columns = [column for column in [*RAW_DTYPES, *UNREAD_RAW_COLUMNS]
+                   if column in df.columns and column not in RAW_COLUMNS_USED]
+    df = df.drop(columns=raw_columns)
+    
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == object and len(values) and values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+            df[column] = values.astype('category')
+        elif column in DOWNCAST_COLUMNS and pd.api.types.is_numeric_dtype(values):
+            kind = 'integer' if pd.api.types.is_integer_dtype(values) else 'float'
+            downcast = pd.to_numeric(values, downcast=kind)
+            if downcast.dtype != values.dtype and downcast.astype(values.dtype).equals(values):
+                df[column] = downcast
+    return df
+
+
+def concat_compacted(parts):
+    """Concatenate compacted chunks, keeping a column categorical if any chunk made it one"""
+    for column in parts[0].columns if parts else []:
+        if any(isinstance(part[column].dtype, pd.CategoricalDtype) for part in parts):
+            # Same (sorted) categories in every chunk, so concat keeps the categorical
+            categories = pd.Index([])
+            for part in parts:
+                values = part[column]
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    categories = categories.union(values.cat.categories)
+                else:
+                    categories = categories.union(pd.Index(values.dropna().unique()))
+            dtype = pd.CategoricalDtype(categories)
+            for part in parts:
+                part[column] = part[column].astype(dtype)
+    return pd.concat(parts)
+
+
+def integer_ids(df):
+    """df with ID_COLUMNS as int64 where none is blank, like read_csv infers them for a whole file"""
+    for column in ID_COLUMNS:
+        if column in df.columns and df[column].notna().all():
+            df[column] = df[column].astype(np.int64)
+    return df
+
+
+def delta_tag(tag, delta):
+    """Data tag after applying delta to the data tagged tag"""
+    digest = hashlib.sha256(f"{tag}:{','.join(map(str, delta.columns))}:".encode())
+    digest.update(pd.util.hash_pandas_object(delta, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def columns_to_records(columns):
+    """Turn {field: list} into a list of per-row dicts"""
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
 
 class AirbnbDataProcessor:
     def __init__(self, csv_path):
@@ -15,12 +160,166 @@ class AirbnbDataProcessor:
         self.csv_path = csv_path
         self.df: pd.DataFrame | None = None
         self.df_clean: pd.DataFrame | None = None
-        
+        # Hash of the data loaded (see snapshot.load_processor), updated by apply_delta
+        self.data_tag = None
+        
+    @property
+    def df_clean(self):
+        """Cleaned data; filtered views materialize their rows on first access"""
+        if self._df_clean is None and self._base is not None:
+            self._df_clean = self._base.take(self.selection)
+        return self._df_clean
+    
+    @df_clean.setter
+    def df_clean(self, df):
+        self._df_clean = df
+        self._base = None
+        self.selection = None
+        # Processor a filtered view was made from (its frame is _base, or df_clean when nothing was filtered)
+        self._parent = None
+        self._filter_index = None
+        self._cube = None
+        self._spatial_index = None
+        self._host_index = None
+        self._query_index = None
+        self._date_index = None
+        # Categorical filters answerable from the cube ({} = all rows, None = scan rows)
+        self.cube_filters = {} if df is not None else None
+    
+    @property
+    def filter_index(self):
+        """Row indexes used by apply_filters, built on first use"""
+        if self._filter_index is None:
+            self._filter_index = FilterIndex(self.df_clean)
+        return self._filter_index
+    
+    @property
+    def cube(self):
+        """Per-category aggregates, built on first use"""
+        if self._cube is None:
+            self._cube = DataCube(self.require(*PARTIAL_MEASURES.values()))
+        return self._cube
+    
+    @property
+    def spatial_index(self):
+        """Grid index over listing coordinates, built on first use"""
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(self._base if self._base is not None else self.df_clean)
+        return self._spatial_index
+    
+    @property
+    def host_index(self):
+        """Per-host aggregates for top-host queries, built on first use"""
+        if self._host_index is None:
+            self._host_index = HostIndex(self._base if self._base is not None else self.df_clean)
+        return self._host_index
+    
+    @property
+    def query_index(self):
+        """Dimension codes and measure values for pivot queries, built on first use"""
+        if self._query_index is None:
+            self._query_index = QueryIndex(self.require_base(*PARTIAL_MEASURES.values()))
+        return self._query_index
+    
+    @property
+    def date_index(self):
+        """Reviewed listings sorted by last review date, built on first use"""
+        if self._date_index is None:
+            self._date_index = DateIndex(self._base if self._base is not None else self.df_clean)
+        return self._date_index
+    
+    def build_indexes(self):
+        """Build the filter index, data cube and spatial, host, query and date indexes up front"""
+        return (self.filter_index, self.cube, self.spatial_index, self.host_index, self.query_index,
+                self.date_index)
+    
+    def require(self, *columns):
+        """df_clean with the derived columns among columns computed (on first use, then kept)"""
+        if self._df_clean is None and self._base is not None:
+            self.require_base(*columns)
+        elif self._parent is not None and self.selection is None:
+            # A view of all the parent's rows shares the parent's frame
+            self._df_clean = self._parent.require(*columns)
+            return self._df_clean
+        if self.df_clean is None:
+            raise ValueError("Data not available. Process data first.")
+        # Swap in a frame with the columns, like evict_columns; readers keep the frame they hold
+        with DERIVE_LOCK:
+            self._df_clean = materialize(self._df_clean, columns)
+            return self._df_clean
+    
+    def require_base(self, *columns):
+        """Frame this processor's rows are selected from (df_clean unless a view) with columns computed"""
+        if self._base is None:
+            return self.require(*columns)
+        # Derive on the parent's frame, so the parent and its other views reuse the column
+        self._base = self._parent.require(*columns)
+        return self._base
+    
+    def column(self, column):
+        """One column of this processor's rows, without materializing a filtered view's other columns"""
+        if self._df_clean is None and self._base is not None:
+            return self.require_base(column)[column].take(self.selection)
+        return self.require(column)[column]
+    
+    def derived_columns(self):
+        """Derived columns computed so far"""
+        if self.df_clean is None:
+            return []
+        return materialized_columns(self._base if self._base is not None else self.df_clean)
+    
+    def evict_columns(self, columns=None):
+        """Drop derived columns (all computed ones by default); they are recomputed on next use"""
+        if self.df_clean is None:
+            raise ValueError("Data not available. Process data first.")
+        columns = DERIVED_COLUMNS if columns is None else columns
+        evicted = [column for column in self.derived_columns() if column in columns]
+        if evicted:
+            # Views already holding the current frame keep their columns; indexes are unaffected
+            with DERIVE_LOCK:
+                self._df_clean = without_columns(self._df_clean, evicted)
+        return evicted
+    
+    def cube_slice(self):
+        """Cube cells covering this processor's rows, or None if rows must be scanned"""
+        if self.cube_filters is None:
+            return None
+        return self.cube.select(self.cube_filters)
+    
+    def row_count(self):
+        """Rows in this (possibly filtered) view, without materializing it"""
+        if self.selection is not None:
+            return len(self.selection)
+        return len(self.df_clean) if self.df_clean is not None else 0
+    
     def load_data(self):
         """Load CSV data"""
         self.df = pd.read_csv(self.csv_path)
         return self.df
     
+    def load_streaming(self, chunksize=50000, keep_raw=False):
+        """Load and clean chunk by chunk with bounded memory
+        
+        Only the columns in RAW_DTYPES are read, and each cleaned chunk is
+        compacted before it is kept. The raw frame is not kept unless
+        keep_raw is set, so peak memory stays close to the size of the final
+        df_clean plus one raw chunk instead of three copies of the raw table.
+        """
+        reader = pd.read_csv(self.csv_path, usecols=lambda column: column in RAW_DTYPES,
+                             dtype=RAW_DTYPES, chunksize=chunksize)
+        raw_chunks = []
+        parts = []
+        for chunk in reader:
+            if keep_raw:
+                raw_chunks.append(chunk)
+            # Compact each chunk before keeping it, so the raw text columns never pile up
+            parts.append(compact_frame(self.clean_frame(chunk)))
+        
+        # Whether the ids are integers depends on the whole file, as for load_data()
+        self.df = integer_ids(pd.concat(raw_chunks)) if keep_raw else None
+        self.df_clean = integer_ids(concat_compacted(parts))
+        return self.df_clean
+    
     def clean_price(self, price_str):
         """Clean price string to float"""
         if pd.isna(price_str):
@@ -34,15 +333,33 @@ class AirbnbDataProcessor:
         except:
             return np.nan
     
+    def clean_price_series(self, prices):
+        """Vectorized clean_price over a whole column"""
+        if pd.api.types.is_numeric_dtype(prices):
+            return prices.astype(float)
+        # Price strings repeat heavily, so only clean each distinct value once
+        codes, uniques = pd.factorize(prices)
+        cleaned = (pd.Series(uniques, dtype=object).astype(str)
+                   .str.replace('$', '', regex=False)
+                   .str.replace(',', '', regex=False)
+                   .str.strip())
+        # Missing values get code -1, which picks up the trailing NaN
+        values = np.append(pd.to_numeric(cleaned, errors='coerce').to_numpy(dtype=float), np.nan)
+        return pd.Series(values[codes], index=prices.index)
+    
     def clean_data(self):
         """Clean and prepare the dataset"""
         if self.df is None:
             raise ValueError("Data not loaded. Call load_data() first.")
-        df = self.df.copy()
-        
+        df = self.clean_frame(self.df.copy())
+        self.df_clean = df
+        return df
+    
+    def clean_frame(self, df):
+        """Clean one frame of raw rows (the whole file or a chunk)"""
         # 1. Clean price and service fee columns
-        df['price_clean'] = df['price'].apply(self.clean_price)
-        df['service_fee_clean'] = df['service fee'].apply(self.clean_price)
+        df['price_clean'] = self.clean_price_series(df['price'])
+        df['service_fee_clean'] = self.clean_price_series(df['service fee'])
         
         # 2. Filter out invalid records
         df = df[df['price_clean'].notna()]  # Remove listings without price
@@ -82,328 +399,365 @@ class AirbnbDataProcessor:
         # 10. Clean instant bookable
         df['instant_bookable_clean'] = df['instant_bookable'].map({True: 'Yes', False: 'No', 'TRUE': 'Yes', 'FALSE': 'No'}).fillna('No')
         
-        self.df_clean = df
         return df
     
     def create_calculated_fields(self):
-        """Create calculated fields for analysis"""
+        """Compute every derived column now (they are otherwise computed on first use)"""
         if self.df_clean is None:
             raise ValueError("Data not cleaned. Call clean_data() first.")
-        df = self.df_clean.copy()
-        
-        # 1. Price per night (already cleaned)
-        df['price_per_night'] = df['price_clean']
-        
-        # 2. Total price (price + service fee)
-        df['total_price'] = df['price_clean'] + df['service_fee_clean'].fillna(0)
-        
-        # 3. Occupancy rate (based on availability)
-        df['occupancy_rate'] = ((365 - df['availability_365_clean']) / 365 * 100).round(2)
-        
-        # 4. Review rate category
-        def categorize_rating(rating):
-            if pd.isna(rating):
-                return 'No Rating'
-            elif rating >= 4.5:
-                return 'Excellent (4.5+)'
-            elif rating >= 4.0:
-                return 'Good (4.0-4.5)'
-            elif rating >= 3.0:
-                return 'Fair (3.0-4.0)'
-            else:
-                return 'Poor (<3.0)'
-        
-        df['rating_category'] = df['review_rate_clean'].apply(categorize_rating)
-        
-        # 5. Price category
-        def categorize_price(price):
-            if price < 100:
-                return 'Budget (<$100)'
-            elif price < 200:
-                return 'Mid-range ($100-$200)'
-            elif price < 500:
-                return 'Premium ($200-$500)'
-            else:
-                return 'Luxury ($500+)'
-        
-        df['price_category'] = df['price_clean'].apply(categorize_price)
-        
-        # 6. Listing age (years since construction)
-        current_year = datetime.now().year
-        df['listing_age'] = current_year - df['construction_year_clean']
-        df['listing_age'] = df['listing_age'].apply(lambda x: x if 0 <= x <= 100 else np.nan)
-        
-        # 7. Review frequency category
-        def categorize_review_freq(freq):
-            if pd.isna(freq) or freq == 0:
-                return 'No Reviews'
-            elif freq < 0.5:
-                return 'Low (<0.5/month)'
-            elif freq < 1.5:
-                return 'Medium (0.5-1.5/month)'
-            else:
-                return 'High (>1.5/month)'
-        
-        df['review_frequency_category'] = df['reviews_per_month_clean'].apply(categorize_review_freq)
-        
-        # 8. Host activity level
-        def categorize_host_activity(listings_count):
-            if listings_count == 1:
-                return 'Single Listing'
-            elif listings_count <= 3:
-                return 'Small Host (2-3)'
-            elif listings_count <= 10:
-                return 'Medium Host (4-10)'
-            else:
-                return 'Large Host (10+)'
-        
-        df['host_activity_level'] = df['calculated_host_listings_clean'].apply(categorize_host_activity)
-        
-        # 9. Has reviews flag
-        df['has_reviews'] = df['number_of_reviews_clean'] > 0
-        
-        # 10. Recent activity (reviewed in last year)
-        current_date = pd.Timestamp.now()
-        df['days_since_review'] = (df['last_review_date'].apply(lambda x: (current_date - x).days if pd.notna(x) else None))
-        df['recently_active'] = df['days_since_review'] < 365
-        
+        return self.require(*DERIVED_COLUMNS)
+    
+    def compact(self):
+        """Shrink df_clean: drop unused raw columns, use categoricals, downcast numerics"""
+        if self.df_clean is None:
+            raise ValueError("Data not available. Process data first.")
+        df = compact_frame(self.df_clean)
         self.df_clean = df
         return df
     
-    def get_summary_stats(self):
-        """Get summary statistics for KPIs"""
+    def memory_report(self):
+        """Memory used by df_clean, per column and in total"""
         if self.df_clean is None:
             raise ValueError("Data not available. Process data first.")
-        df = self.df_clean
-        
+        usage = self.df_clean.memory_usage(deep=True, index=False)
+        columns = [
+            {'column': column, 'dtype': str(self.df_clean[column].dtype), 'bytes': int(usage[column])}
+            for column in self.df_clean.columns
+        ]
         return {
-            'total_listings': int(len(df)),
-            'average_price': float(round(df['price_clean'].mean(), 2)),
-            'median_price': float(df['price_clean'].median()),
-            'total_reviews': int(df['number_of_reviews_clean'].sum()),
-            'average_rating': float(round(df['review_rate_clean'].mean(), 2)),
-            'average_availability': float(round(df['availability_365_clean'].mean(), 2)),
-            'average_occupancy_rate': float(round(df['occupancy_rate'].mean(), 2)),
-            'total_hosts': int(df['host id'].nunique()),
-            'verified_hosts': int(df[df['host_verified'] == 'verified']['host id'].nunique()),
+            'rows': int(len(self.df_clean)),
+            'total_bytes': int(usage.sum()),
+            'index_bytes': int(self.df_clean.index.memory_usage()),
+            'columns': sorted(columns, key=lambda item: item['bytes'], reverse=True),
+            'derived_columns': self.derived_columns(),
         }
     
-    def get_price_distribution(self, bins=30):
-        """Get price distribution for histogram"""
+    def update_review_recency(self):
+        """Drop the derived columns relative to today's date, so they are recomputed on next use"""
         if self.df_clean is None:
             raise ValueError("Data not available. Process data first.")
-        df = self.df_clean
-        hist, edges = np.histogram(df['price_clean'].dropna(), bins=bins)
-        
-        return {
-            'bins': [f"${int(edges[i])}-${int(edges[i+1])}" for i in range(len(edges)-1)],
-            'counts': hist.tolist(),
-            'bin_edges': edges.tolist()
-        }
+        return self.evict_columns(DATE_RELATIVE_COLUMNS)
     
-    def get_price_trends_by_construction_year(self):
-        """Get average price by construction year"""
+    def apply_delta(self, delta):
+        """Return a new processor with a delta of raw rows applied
+        
+        Rows are keyed by id. Rows whose DELTA_ACTION_COLUMN is 'delete' are
+        removed; all others replace (or add) the listing with that id. Only the
+        delta rows are cleaned, and get the derived columns computed so far. Indexes are built on the new
+        processor before it is returned, so callers can swap it in atomically:
+        the filter, spatial and date indexes already built here are updated
+        with the changed rows; the cube, host and query indexes are rebuilt.
+        """
         if self.df_clean is None:
             raise ValueError("Data not available. Process data first.")
-        df = self.df_clean
-        trends = df.groupby('construction_year_clean')['price_clean'].agg(['mean', 'count']).reset_index()
-        trends = trends[trends['count'] >= 3]  # Only years with 3+ listings
-        trends = trends.sort_values('construction_year_clean')
+        if 'id' not in delta.columns:
+            raise ValueError("Delta must have an 'id' column.")
         
-        return {
-            'years': trends['construction_year_clean'].astype(int).tolist(),
-            'avg_prices': trends['mean'].round(2).tolist(),
-            'counts': trends['count'].tolist()
+        if DELTA_ACTION_COLUMN in delta.columns:
+            actions = delta[DELTA_ACTION_COLUMN].fillna('upsert').astype(str).str.strip().str.lower()
+        else:
+            actions = pd.Series('upsert', index=delta.index)
+        deleted_ids = delta.loc[actions == 'delete', 'id']
+        upserts = (delta[actions != 'delete']
+                   .drop(columns=[DELTA_ACTION_COLUMN], errors='ignore')
+                   .drop_duplicates('id', keep='last'))
+        
+        # Clean and derive only the changed rows
+        if len(upserts):
+            fresh = materialize(self.clean_frame(upserts.copy()), self.derived_columns())
+        else:
+            fresh = self.df_clean.iloc[:0].copy()
+        
+        # Drop every touched id (updates that no longer pass cleaning disappear too)
+        df = self.df_clean
+        keep = ~df['id'].isin(pd.concat([deleted_ids, upserts['id']])).to_numpy()
+        kept = df[keep]
+        start = int(df.index.max()) + 1 if len(df) else 0
+        fresh.index = pd.RangeIndex(start, start + len(fresh))
+        kept, fresh = align_dtypes(kept, fresh.reindex(columns=kept.columns))
+        
+        updated = AirbnbDataProcessor(self.csv_path)
+        updated.df_clean = pd.concat([kept, fresh])
+        updated.data_tag = delta_tag(self.data_tag, delta)
+        if self._filter_index is not None:
+            updated._filter_index = self._filter_index.updated(keep, fresh)
+        if self._spatial_index is not None:
+            updated._spatial_index = self._spatial_index.updated(keep, fresh)
+        if self._date_index is not None:
+            updated._date_index = self._date_index.updated(keep, fresh)
+        updated.build_indexes()
+        
+        stats = {
+            'upserted': int(len(fresh)),
+            'deleted': int(len(df) - len(kept) - df['id'].isin(fresh['id']).sum()),
+            'rejected': int(len(upserts) - len(fresh)),
+            'records': int(len(updated.df_clean)),
         }
+        return updated, stats
     
-    def get_room_type_comparison(self):
-        """Get room type statistics"""
+    def get_summary_partial(self, exact=False):
+        """Mergeable pieces of get_summary_stats (from the cube unless exact)"""
+        cube = None if exact else self.cube_slice()
+        if cube is not None:
+            partial = cube.summary_partial()
+            # Rolled-up means at a .xx5 tie round the way the rows' own sum does
+            for name in near_ties(partial):
+                values = self.column(PARTIAL_MEASURES[name])
+                partial['measures'][name] = (values.sum(), int(values.count()))
+            return partial
+        return summary_partial(self.require(*PARTIAL_MEASURES.values()))
+    
+    def get_summary_stats(self, exact=False):
+        """Get summary statistics for KPIs (price quantiles from the cube's sketch unless rows are scanned)"""
+        return summary_from_partials([self.get_summary_partial(exact)])
+    
+    def get_price_partial(self, exact=False):
+        """Price count, min, max and sketch (None when rows are binned exactly)"""
+        cube = None if exact else self.cube_slice()
+        if cube is not None:
+            return cube.price_partial()
+        if self.df_clean is None:
+            raise ValueError("Data not available. Process data first.")
+        prices = self.df_clean['price_clean'].dropna()
+        return {'count': int(len(prices)), 'min': prices.min(), 'max': prices.max(), 'price_sketch': None}
+    
+    def get_price_counts(self, bins, low, high):
+        """Exact histogram counts of the prices over bins between low and high"""
         if self.df_clean is None:
             raise ValueError("Data not available. Process data first.")
+        return np.histogram(self.df_clean['price_clean'].dropna(), bins=bins, range=(low, high))[0]
+    
+    def get_price_distribution(self, bins=30, exact=False):
+        """Get price distribution for histogram (re-binned from cube sketches unless exact)"""
+        partial = self.get_price_partial(exact)
+        if partial['price_sketch'] is not None:
+            hist, edges = PRICE_SKETCH.histogram(partial['price_sketch'], bins, partial['min'], partial['max'])
+            return histogram_response(hist, edges)
         df = self.df_clean
-        room_stats = df.groupby('room_type_clean').agg({
-            'id': 'count',
-            'price_clean': 'mean',
-            'number_of_reviews_clean': 'sum',
-            'review_rate_clean': 'mean',
-            'availability_365_clean': 'mean'
-        }).reset_index()
-        
-        room_stats.columns = ['room_type', 'count', 'avg_price', 'total_reviews', 'avg_rating', 'avg_availability']
-        room_stats = room_stats.sort_values('count', ascending=False)
+        # Scanning rows anyway, so bin the exact prices
+        hist, edges = np.histogram(df['price_clean'].dropna(), bins=bins)
         
-        return room_stats.to_dict('records')
+        return histogram_response(hist, edges)
+    
+    def get_query_partial(self, query):
+        """Mergeable per-group totals of a pivot query (rolled up from the cube when possible)"""
+        if self._base is None and self.df_clean is None:
+            raise ValueError("Data not available. Process data first.")
+        cube = self.cube_slice()
+        if cube is not None and cube_answers(cube.cube, query):
+            return cube_partial(cube, query)
+        return self.query_index.partial(query, self.selection)
+    
+    def get_query_frame(self, query):
+        """Result of a pivot query: one row per group, sorted by the dimensions"""
+        return query_frame(self.get_query_partial(query), query)
+    
+    def get_query_page(self, query, sort=None, limit=DEFAULT_QUERY_LIMIT, offset=0, orient='records'):
+        """One page of a pivot query result, with the number of groups to page through"""
+        return query_page(self.get_query_frame(query), sort, limit, offset, orient)
+    
+    def get_price_trends_by_construction_year(self):
+        """Get average price by construction year"""
+        return price_trend_columns(self.get_query_frame(CONSTRUCTION_YEAR_QUERY))
+    
+    def get_room_type_comparison(self):
+        """Get room type statistics"""
+        return room_type_records(self.get_query_frame(ROOM_TYPE_QUERY))
     
-    def get_map_data(self, limit=5000):
-        """Get location data for map (limited for performance)"""
+    def get_map_sample(self, limit=5000):
+        """Rows shown on the map (sampled down to limit for performance)"""
         if self.df_clean is None:
             raise ValueError("Data not available. Process data first.")
         df = self.df_clean
         
         # Don't sample if already filtered to reasonable size
         if len(df) > limit:
-            df_sample = df.sample(n=min(limit, len(df)), random_state=42)
-        else:
-            df_sample = df
-        
-        # Ensure we have valid data
-        if len(df_sample) == 0:
-            return []
-        
-        map_data = df_sample[['id', 'NAME', 'lat_clean', 'long_clean', 'price_clean', 
-                                'room_type_clean', 'neighbourhood_group_clean', 
-                                'neighbourhood_clean', 'review_rate_clean']].copy()
-        map_data.columns = ['id', 'name', 'lat', 'lng', 'price', 'room_type', 
-                           'borough', 'neighbourhood', 'rating']
-        
-        # Convert to records and clean NaN values
-        records = []
-        for _, row in map_data.iterrows():
-            record = {
-                'id': int(row['id']),
-                'name': str(row['name']) if pd.notna(row['name']) else 'Unknown',
-                'lat': float(row['lat']),
-                'lng': float(row['lng']),
-                'price': float(row['price']),
-                'room_type': str(row['room_type']) if pd.notna(row['room_type']) else 'Unknown',
-                'borough': str(row['borough']) if pd.notna(row['borough']) else 'Unknown',
-                'neighbourhood': str(row['neighbourhood']) if pd.notna(row['neighbourhood']) else 'Unknown',
-                'rating': float(row['rating']) if pd.notna(row['rating']) else None
-            }
-            records.append(record)
+            return df.sample(n=min(limit, len(df)), random_state=42)
+        return df
+    
+    def get_map_columns(self, df_sample):
+        """Map fields as column lists, with NaN handled per column"""
+        def text(column):
+            values = df_sample[column].astype(object)
+            return values.where(values.notna(), 'Unknown').astype(str).tolist()
         
-        return records
+        rating = df_sample['review_rate_clean'].astype(object)
+        return {
+            'id': df_sample['id'].astype(np.int64).tolist(),
+            'name': text('NAME'),
+            'lat': df_sample['lat_clean'].astype(float).tolist(),
+            'lng': df_sample['long_clean'].astype(float).tolist(),
+            'price': df_sample['price_clean'].astype(float).tolist(),
+            'room_type': text('room_type_clean'),
+            'borough': text('neighbourhood_group_clean'),
+            'neighbourhood': text('neighbourhood_clean'),
+            'rating': rating.where(rating.notna(), None).tolist()
+        }
     
-    def get_top_hosts(self, limit=10):
-        """Get top hosts by listing count and average rating"""
-        if self.df_clean is None:
+    def get_map_data(self, limit=5000, orient='records'):
+        """Get location data for map (limited for performance)
+        
+        orient='columns' returns one list per field instead of one dict per listing.
+        """
+        columns = self.get_map_columns(self.get_map_sample(limit))
+        if orient == 'columns':
+            return columns
+        return columns_to_records(columns)
+    
+    def iter_map_data(self, limit=5000, chunk_size=1000):
+        """Yield map records in chunks, so large limits are never built at once"""
+        df_sample = self.get_map_sample(limit)
+        for start in range(0, len(df_sample), chunk_size):
+            yield columns_to_records(self.get_map_columns(df_sample.iloc[start:start + chunk_size]))
+    
+    def get_map_view(self, bbox, zoom=CLUSTER_MAX_ZOOM, limit=5000):
+        """Get listings inside bbox, or clusters when zoomed out and crowded
+        
+        bbox is (west, south, east, north). Below CLUSTER_MAX_ZOOM, views with
+        more than limit listings return cluster centroids with counts and
+        average price instead of individual points.
+        """
+        frame = self._base if self._base is not None else self.df_clean
+        if frame is None:
             raise ValueError("Data not available. Process data first.")
-        df = self.df_clean
-        
-        host_stats = df.groupby(['host id', 'host name']).agg({
-            'id': 'count',
-            'review_rate_clean': 'mean',
-            'price_clean': 'mean',
-            'number_of_reviews_clean': 'sum'
-        }).reset_index()
-        
-        host_stats.columns = ['host_id', 'host_name', 'listing_count', 'avg_rating', 'avg_price', 'total_reviews']
-        host_stats = host_stats.sort_values('listing_count', ascending=False).head(limit)
+        index = self.spatial_index
+        
+        # Unfiltered: answer from the pre-aggregated cluster tables
+        if self.selection is None and zoom < CLUSTER_MAX_ZOOM:
+            clusters = index.clusters(bbox, zoom)
+            total = sum(cluster['count'] for cluster in clusters)
+            if total > limit:
+                return {'type': 'clusters', 'total': total, 'clusters': clusters}
+        
+        rows = index.query(bbox)
+        if self.selection is not None:
+            positions = np.minimum(np.searchsorted(self.selection, rows), max(len(self.selection) - 1, 0))
+            rows = rows[self.selection[positions] == rows] if len(self.selection) else rows[:0]
+        
+        if zoom < CLUSTER_MAX_ZOOM and len(rows) > limit:
+            return {'type': 'clusters', 'total': int(len(rows)), 'clusters': index.cluster_rows(rows, zoom)}
+        
+        in_view = frame.take(rows)
+        if len(in_view) > limit:
+            in_view = in_view.sample(n=limit, random_state=42)
+        return {
+            'type': 'points',
+            'total': int(len(rows)),
+            'points': columns_to_records(self.get_map_columns(in_view))
+        }
+    
+    def get_host_partial(self):
+        """Per-host totals of the selected rows, for merging top hosts across partitions"""
+        if self._base is None and self.df_clean is None:
+            raise ValueError("Data not available. Process data first.")
+        return self.host_index.partial(self.selection)
+    
+    def get_top_hosts(self, limit=10, offset=0):
+        """Get top hosts by listing count and average rating"""
+        return self.get_top_hosts_page(limit, offset)['hosts']
+    
+    def get_top_hosts_page(self, limit=10, offset=0, orient='records'):
+        """One page of the host ranking, with the number of hosts to page through
         
-        return host_stats.to_dict('records')
+        orient='columns' returns the hosts as one list per field.
+        """
+        if self._base is None and self.df_clean is None:
+            raise ValueError("Data not available. Process data first.")
+        columns, total_hosts = self.host_index.top(self.selection, limit, offset)
+        hosts = columns if orient == 'columns' else columns_to_records(columns)
+        return {'hosts': hosts, 'total_hosts': total_hosts, 'limit': limit, 'offset': offset}
     
     def get_neighbourhood_analysis(self, limit=15):
         """Get neighbourhood statistics"""
-        if self.df_clean is None:
-            raise ValueError("Data not available. Process data first.")
-        df = self.df_clean
-        
-        neighbourhood_stats = df.groupby('neighbourhood_group_clean').agg({
-            'id': 'count',
-            'price_clean': 'mean',
-            'number_of_reviews_clean': 'sum',
-            'availability_365_clean': 'mean'
-        }).reset_index()
-        
-        neighbourhood_stats.columns = ['borough', 'listing_count', 'avg_price', 'total_reviews', 'avg_availability']
-        neighbourhood_stats = neighbourhood_stats.sort_values('listing_count', ascending=False).head(limit)
-        
-        return neighbourhood_stats.to_dict('records')
+        return neighbourhood_records(self.get_query_frame(BOROUGH_QUERY), limit)
     
     def get_cancellation_policy_distribution(self):
         """Get cancellation policy distribution"""
-        if self.df_clean is None:
-            raise ValueError("Data not available. Process data first.")
-        df = self.df_clean
-        
-        policy_dist = df.groupby('cancellation_policy_clean').agg({
-            'id': 'count',
-            'price_clean': 'mean'
-        }).reset_index()
-        
-        policy_dist.columns = ['policy', 'count', 'avg_price']
-        policy_dist = policy_dist.sort_values('count', ascending=False)
-        
-        return policy_dist.to_dict('records')
+        return policy_records(self.get_query_frame(POLICY_QUERY))
+    
+    def get_category_breakdown(self, bucketing):
+        """Listing count and average price per bucket of a derived category"""
+        return breakdown_records(self.get_query_frame(category_query(bucketing)))
     
     def get_price_by_category(self):
         """Get price distribution by category"""
-        if self.df_clean is None:
-            raise ValueError("Data not available. Process data first.")
-        df = self.df_clean
-        
-        price_cat = df['price_category'].value_counts().reset_index()
-        price_cat.columns = ['category', 'count']
-        
-        # Order categories logically
-        category_order = ['Budget (<$100)', 'Mid-range ($100-$200)', 'Premium ($200-$500)', 'Luxury ($500+)']
-        price_cat['category'] = pd.Categorical(price_cat['category'], categories=category_order, ordered=True)
-        price_cat = price_cat.sort_values('category')
-        
-        return price_cat.to_dict('records')
+        return [
+            {'category': row['bucket'], 'count': row['count']}
+            for row in self.get_category_breakdown('price_category')
+        ]
     
     def get_availability_trends(self):
         """Get availability statistics"""
-        if self.df_clean is None:
+        return [
+            {'availability_range': row['bucket'], 'count': row['count'], 'avg_price': row['avg_price']}
+            for row in self.get_category_breakdown('availability')
+        ]
+    
+    def get_review_span(self):
+        """(first, last) last review date of the selected rows, or None when none were reviewed"""
+        if self._base is None and self.df_clean is None:
             raise ValueError("Data not available. Process data first.")
-        df = self.df_clean
-        
-        # Create availability bins
-        bins = [0, 30, 90, 180, 270, 365]
-        labels = ['0-30 days', '31-90 days', '91-180 days', '181-270 days', '271-365 days']
-        
-        df['availability_bin'] = pd.cut(df['availability_365_clean'], bins=bins, labels=labels, include_lowest=True)
-        
-        availability_dist = df.groupby('availability_bin', observed=True).agg({
-            'id': 'count',
-            'price_clean': 'mean'
-        }).reset_index()
-        
-        availability_dist.columns = ['availability_range', 'count', 'avg_price']
-        
-        return availability_dist.to_dict('records')
+        return self.date_index.span(self.selection)
+    
+    def get_review_partial(self, interval, start, end, as_of):
+        """Listing count and price totals per period of last review, and the recently active count"""
+        if self._base is None and self.df_clean is None:
+            raise ValueError("Data not available. Process data first.")
+        periods, bounds = period_bounds(start, end, interval)
+        count, price_sum, price_count = self.date_index.totals(bounds, self.selection)
+        return {
+            'periods': periods,
+            'count': count,
+            'price_sum': price_sum,
+            'price_count': price_count,
+            'recently_active': self.date_index.recently_active(as_of, self.selection),
+        }
+    
+    def get_review_activity(self, interval='month', start=None, end=None, as_of=None):
+        """Listings per week or month of last review between start and end (default: all reviews)
+        
+        recently_active counts listings reviewed in the year before as_of (default: today).
+        """
+        as_of = pd.Timestamp(as_of or pd.Timestamp.now()).normalize()
+        start, end = review_range(start, end, [self.get_review_span()], as_of)
+        partial = self.get_review_partial(interval, start, end, as_of)
+        return review_activity_response(interval, start, end, [partial], as_of)
     
     def apply_filters(self, filters):
         """Apply filters to dataset"""
         if self.df_clean is None:
             raise ValueError("Data not available. Process data first.")
-        df = self.df_clean.copy()
-        
-        if filters.get('room_type') and filters['room_type'] not in ['all', '', None]:
-            df = df[df['room_type_clean'] == filters['room_type']]
-        
-        if filters.get('borough') and filters['borough'] not in ['all', '', None]:
-            df = df[df['neighbourhood_group_clean'] == filters['borough']]
-        
-        if filters.get('cancellation_policy') and filters['cancellation_policy'] not in ['all', '', None]:
-            df = df[df['cancellation_policy_clean'] == filters['cancellation_policy']]
-        
-        if filters.get('price_min') and filters['price_min'] not in ['', None]:
-            try:
-                df = df[df['price_clean'] >= float(filters['price_min'])]
-            except (ValueError, TypeError):
-                pass
+        selection = self.filter_index.select(filters)
+        categorical, ranges = self.filter_index.parse(filters)
         
-        if filters.get('price_max') and filters['price_max'] not in ['', None]:
-            try:
-                df = df[df['price_clean'] <= float(filters['price_max'])]
-            except (ValueError, TypeError):
-                pass
-        
-        if filters.get('min_reviews') and filters['min_reviews'] not in ['', None]:
-            try:
-                df = df[df['number_of_reviews_clean'] >= int(filters['min_reviews'])]
-            except (ValueError, TypeError):
-                pass
-        
-        if filters.get('instant_bookable') and filters['instant_bookable'] not in ['all', '', None]:
-            df = df[df['instant_bookable_clean'] == filters['instant_bookable']]
-        
-        # Create temporary processor with filtered data
+        # Create temporary processor over the selected rows; the frame
+        # itself is only sliced when an aggregation reads df_clean
         temp_processor = AirbnbDataProcessor(self.csv_path)
-        temp_processor.df_clean = df
+        if selection is None:
+            temp_processor.df_clean = self.df_clean
+            temp_processor._parent = self
+            temp_processor._spatial_index = self._spatial_index
+            temp_processor._host_index = self._host_index
+            temp_processor._query_index = self._query_index
+            temp_processor._date_index = self._date_index
+        else:
+            temp_processor._base = self.df_clean
+            temp_processor.selection = selection
+            temp_processor._parent = self
+            if self.selection is None:
+                temp_processor._spatial_index = self._spatial_index
+                temp_processor._host_index = self._host_index
+                temp_processor._query_index = self._query_index
+                temp_processor._date_index = self._date_index
         temp_processor.df = self.df  # Keep original data reference
         
+        # Purely categorical filters can be answered by rolling up cube cells
+        if self.cube_filters is not None and not ranges:
+            temp_processor._cube = self.cube
+            temp_processor.cube_filters = {**self.cube_filters, **categorical}
+        else:
+            temp_processor.cube_filters = None
+        
         return temp_processor
     
     def get_filter_options(self):
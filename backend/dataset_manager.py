@@ -0,0 +1,132 @@
+"""
+Dataset Manager
+Versioned, atomically swappable reference to the live AirbnbDataProcessor.
+Requests pin the version that was current when they started; a reload
+builds a fresh processor in a background thread and swaps it in, and a
+replaced version is released once its last reader finishes.
+"""
+
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+class VersionConflict(Exception):
+    """Raised when swapping against a version that is no longer current"""
+
+
+class DatasetVersion:
+    def __init__(self, processor, version, source):
+        """One immutable generation of the dataset"""
+        self.processor = processor
+        self.version = version
+        self.source = source
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+        self.readers = 0
+        self.retired = False
+
+    def info(self):
+        return {
+            'version': self.version,
+            'source': self.source,
+            'loaded_at': self.loaded_at,
+            'records': int(self.processor.row_count()) if self.processor is not None else 0,
+        }
+
+
+class DatasetManager:
+    def __init__(self, loader, on_swap=None):
+        """loader(source) builds a ready processor; on_swap(version) runs after each swap"""
+        self.loader = loader
+        self.on_swap = on_swap
+        self._lock = threading.Lock()
+        self._current = None
+        self._retired = []
+        self._next_version = 1
+        self._reload_thread = None
+        self.last_reload_error = None
+
+    def current(self):
+        """The live DatasetVersion (without pinning it)"""
+        return self._current
+
+    def swap(self, processor, source=None, expected_version=None):
+        """Make processor the live dataset; returns the new DatasetVersion"""
+        with self._lock:
+            previous = self._current
+            if expected_version is not None and (previous is None or previous.version != expected_version):
+                raise VersionConflict(f"Dataset changed (expected version {expected_version})")
+            current = DatasetVersion(processor, self._next_version, source or (previous and previous.source))
+            self._next_version += 1
+            self._current = current
+            if previous is not None:
+                previous.retired = True
+                if previous.readers:
+                    self._retired.append(previous)
+                else:
+                    previous.processor = None
+        if self.on_swap:
+            self.on_swap(current)
+        return current
+
+    def acquire(self):
+        """Pin the current version (for the duration of a request)"""
+        with self._lock:
+            pinned = self._current
+            if pinned is not None:
+                pinned.readers += 1
+            return pinned
+
+    def release(self, pinned):
+        """Unpin a version returned by acquire()"""
+        if pinned is None:
+            return
+        with self._lock:
+            pinned.readers -= 1
+            if pinned.retired and pinned.readers == 0:
+                # Last reader of a replaced version: let it be freed
+                pinned.processor = None
+                if pinned in self._retired:
+                    self._retired.remove(pinned)
+
+    @contextmanager
+    def pinned(self):
+        """Context manager form of acquire()/release()"""
+        version = self.acquire()
+        try:
+            yield version
+        finally:
+            self.release(version)
+
+    def reload_async(self, source=None):
+        """Start rebuilding the dataset in a background thread; False if one is running"""
+        with self._lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return False
+            source = source or (self._current and self._current.source)
+            self._reload_thread = threading.Thread(target=self._reload, args=(source,), daemon=True)
+            self._reload_thread.start()
+        return True
+
+    def _reload(self, source):
+        try:
+            processor = self.loader(source)
+            self.swap(processor, source)
+            self.last_reload_error = None
+        except Exception as e:
+            traceback.print_exc()
+            self.last_reload_error = str(e)
+
+    def status(self):
+        """Version info for the health endpoint"""
+        with self._lock:
+            current = self._current
+            reloading = self._reload_thread is not None and self._reload_thread.is_alive()
+            status = current.info() if current is not None else {'version': None}
+            status.update({
+                'reloading': reloading,
+                'retired_versions_in_use': len(self._retired),
+                'last_reload_error': self.last_reload_error,
+            })
+        return status
@@ -0,0 +1,146 @@
+"""
+Date Index for Review Activity
+Reviewed listings are sorted once by last review date, with prefix sums of
+their prices. A timeline is then one binary search per period boundary and
+a difference of prefix sums instead of a scan of every row; filtered views
+only read their own rows inside the requested range. Counts relative to
+today ("recently active") are answered the same way at query time.
+"""
+
+import numpy as np
+import pandas as pd
+
+from row_order import updated_order
+
+
+# Timeline interval -> pandas period frequency (weeks start on Monday)
+REVIEW_INTERVALS = {'week': 'W-SUN', 'month': 'M'}
+
+# Most periods one timeline may have
+MAX_REVIEW_PERIODS = 1000
+
+# Listings reviewed less than this many days ago are recently active
+RECENT_ACTIVITY_DAYS = 365
+
+
+def prefix_sum(values):
+    """Cumulative sums with a leading zero, so sum(values[i:j]) = prefix[j] - prefix[i]"""
+    return np.concatenate([[0], np.cumsum(values)])
+
+
+def period_bounds(start, end, interval):
+    """(period start dates, bounds) of the periods covering start..end, the bounds clipped to that range"""
+    periods = pd.period_range(start, end, freq=REVIEW_INTERVALS[interval])
+    if len(periods) > MAX_REVIEW_PERIODS:
+        raise ValueError(f"Too many periods ({len(periods)}); use a larger interval or shorter range")
+    edges = pd.DatetimeIndex([*periods.start_time, (periods[-1] + 1).start_time]).to_numpy()
+    low = start.to_datetime64()
+    high = (end + pd.Timedelta(days=1)).to_datetime64()  # end day included
+    return periods.start_time.strftime('%Y-%m-%d').tolist(), np.minimum(np.maximum(edges, low), high)
+
+
+def review_range(start, end, spans, as_of):
+    """start and end days of a timeline, defaulting to the first and last review in spans"""
+    spans = [span for span in spans if span is not None]
+    if start is None:
+        start = min(span[0] for span in spans) if spans else as_of
+    if end is None:
+        end = max(span[1] for span in spans) if spans else as_of
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    if start > end:
+        raise ValueError("start must not be after end")
+    return start, end
+
+
+def review_activity_response(interval, start, end, partials, as_of):
+    """get_review_activity output from the review partials of one or more row sets"""
+    count, price_sum, price_count = (sum(partial[field] for partial in partials)
+                                     for field in ('count', 'price_sum', 'price_count'))
+    avg_prices = np.divide(price_sum, price_count, out=np.full(len(count), np.nan), where=price_count > 0)
+    return {
+        'interval': interval,
+        'start': start.strftime('%Y-%m-%d'),
+        'end': end.strftime('%Y-%m-%d'),
+        'periods': partials[0]['periods'],
+        'counts': count.astype(np.int64).tolist(),
+        'avg_prices': [round(float(price), 2) if n else None for price, n in zip(avg_prices, price_count)],
+        'as_of': as_of.strftime('%Y-%m-%d'),
+        'recently_active': int(sum(partial['recently_active'] for partial in partials)),
+    }
+
+
+class DateIndex:
+    def __init__(self, df):
+        """Sort reviewed listings by last review date and prefix-sum their prices"""
+        self.size = len(df)
+        self.row_dates = df['last_review_date'].to_numpy(dtype='datetime64[ns]')
+        reviewed = np.flatnonzero(~np.isnat(self.row_dates))
+        # Row positions in review date order (listings never reviewed are left out)
+        self.order = reviewed[np.argsort(self.row_dates[reviewed], kind='stable')]
+        self.dates = self.row_dates[self.order]
+        self.row_price = df['price_clean'].to_numpy(dtype=float)
+        self.sum_prices()
+
+    def sum_prices(self):
+        """Prices in review date order and their prefix sums"""
+        self.price = self.row_price[self.order]
+        priced = ~np.isnan(self.price)
+        self.price_prefix = prefix_sum(np.where(priced, self.price, 0.0))
+        self.priced_prefix = prefix_sum(priced)
+
+    def updated(self, kept, fresh):
+        """Index of the rows where kept is set followed by the rows of fresh, updated from this one"""
+        index = DateIndex.__new__(DateIndex)
+        n_kept = int(np.count_nonzero(kept))
+        index.size = n_kept + len(fresh)
+        fresh_dates = fresh['last_review_date'].to_numpy(dtype='datetime64[ns]')
+        reviewed = np.flatnonzero(~np.isnat(fresh_dates))
+        index.row_dates = np.concatenate([self.row_dates[kept], fresh_dates])
+        index.order, index.dates = updated_order(self.order, self.dates, kept, fresh_dates[reviewed],
+                                                 n_kept + reviewed)
+        index.row_price = np.concatenate([self.row_price[kept], fresh['price_clean'].to_numpy(dtype=float)])
+        index.sum_prices()
+        return index
+
+    def members(self, rows):
+        """Mask over all rows that is set for rows"""
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def span(self, rows=None):
+        """(first, last) review date of rows (None = all rows), or None when none were reviewed"""
+        if rows is None:
+            dates = self.dates[[0, -1]] if len(self.dates) else self.dates
+        else:
+            dates = self.row_dates[rows]
+            dates = dates[~np.isnat(dates)]
+        if not len(dates):
+            return None
+        return pd.Timestamp(dates.min()), pd.Timestamp(dates.max())
+
+    def totals(self, bounds, rows=None):
+        """Listing count, price sum and priced count between consecutive bounds (rows None = all rows)"""
+        if rows is None:
+            cuts = np.searchsorted(self.dates, bounds)
+            return np.diff(cuts), np.diff(self.price_prefix[cuts]), np.diff(self.priced_prefix[cuts])
+        # Only the view's rows between the outer bounds are read
+        first, last = np.searchsorted(self.dates, bounds[[0, -1]])
+        selected = first + np.flatnonzero(self.members(rows)[self.order[first:last]])
+        price = self.price[selected]
+        priced = ~np.isnan(price)
+        cuts = np.searchsorted(self.dates[selected], bounds)
+        price_prefix = prefix_sum(np.where(priced, price, 0.0))
+        priced_prefix = prefix_sum(priced)
+        return np.diff(cuts), np.diff(price_prefix[cuts]), np.diff(priced_prefix[cuts])
+
+    def count_after(self, cutoff, rows=None):
+        """Listings of rows (None = all rows) last reviewed after cutoff"""
+        first = np.searchsorted(self.dates, np.datetime64(cutoff, 'ns'), side='right')
+        if rows is None:
+            return len(self.dates) - first
+        return int(self.members(rows)[self.order[first:]].sum())
+
+    def recently_active(self, as_of, rows=None):
+        """Listings of rows reviewed less than RECENT_ACTIVITY_DAYS days before as_of"""
+        return self.count_after(as_of - pd.Timedelta(days=RECENT_ACTIVITY_DAYS), rows)
@@ -0,0 +1,150 @@
+"""
+Derived Columns
+Calculated fields are declared here with the columns they are computed from,
+and added to a frame only when something first reads them (then kept, except
+the ones relative to today's date, which are recomputed on every use).
+Columns no endpoint reads are never computed, and materialized ones can be
+evicted again to free memory; they are recomputed on their next use.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from buckets import BUCKETINGS, bucket_codes
+from metrics import METRICS
+
+
+# Derived column name -> (columns it is computed from, function of the frame)
+DERIVED_COLUMNS = {}
+
+# Derived columns relative to today's date: recomputed on every use instead of kept
+DATE_RELATIVE_COLUMNS = ['listing_age', 'days_since_review', 'recently_active']
+
+# Held while a processor computes derived columns and swaps in the frame holding them
+DERIVE_LOCK = threading.Lock()
+
+
+def derived(name, *dependencies):
+    """Register the decorated function as the definition of derived column name"""
+    def register(function):
+        DERIVED_COLUMNS[name] = (list(dependencies), function)
+        return function
+    return register
+
+
+@derived('price_per_night', 'price_clean')
+def price_per_night(df):
+    return df['price_clean']
+
+
+@derived('total_price', 'price_clean', 'service_fee_clean')
+def total_price(df):
+    """Price plus service fee"""
+    return df['price_clean'] + df['service_fee_clean'].fillna(0)
+
+
+@derived('occupancy_rate', 'availability_365_clean')
+def occupancy_rate(df):
+    """Share of the year booked (based on availability)"""
+    return ((365 - df['availability_365_clean']) / 365 * 100).round(2)
+
+
+def category_column(df, name):
+    """Labels of bucketing name as a categorical column"""
+    return pd.Categorical.from_codes(bucket_codes(df, name), categories=BUCKETINGS[name])
+
+
+@derived('rating_category', 'review_rate_clean')
+def rating_category(df):
+    return category_column(df, 'rating_category')
+
+
+@derived('price_category', 'price_clean')
+def price_category(df):
+    return category_column(df, 'price_category')
+
+
+@derived('review_frequency_category', 'reviews_per_month_clean')
+def review_frequency_category(df):
+    return category_column(df, 'review_frequency_category')
+
+
+@derived('host_activity_level', 'calculated_host_listings_clean')
+def host_activity_level(df):
+    return category_column(df, 'host_activity_level')
+
+
+@derived('listing_age', 'construction_year_clean')
+def listing_age(df):
+    """Years since construction (missing outside 0-100)"""
+    age = datetime.now().year - df['construction_year_clean']
+    return age.where(age.between(0, 100))
+
+
+@derived('has_reviews', 'number_of_reviews_clean')
+def has_reviews(df):
+    return df['number_of_reviews_clean'] > 0
+
+
+@derived('days_since_review', 'last_review_date')
+def days_since_review(df):
+    return (pd.Timestamp.now() - df['last_review_date']).dt.days
+
+
+@derived('recently_active', 'days_since_review')
+def recently_active(df):
+    """Reviewed in the last year"""
+    return df['days_since_review'] < 365
+
+
+def materialize(df, columns):
+    """df with the derived columns among columns (and what they depend on) added if missing
+
+    Frames are shared by every filtered view and read from several threads,
+    so columns are added to a shallow copy and df itself is never written;
+    the caller swaps the copy in (see AirbnbDataProcessor.require).
+    """
+    wanted = [column for column in columns if column in DERIVED_COLUMNS
+              and (column not in df.columns or column in DATE_RELATIVE_COLUMNS)]
+    if not wanted:
+        return df
+    df = df.copy(deep=False)
+    computed = set()
+    for column in wanted:
+        add_column(df, column, computed)
+    return df
+
+
+def add_column(df, name, computed):
+    """Compute name into df after its dependencies (date-relative ones at most once per call)"""
+    if name in computed or (name in df.columns and name not in DATE_RELATIVE_COLUMNS):
+        return
+    dependencies, function = DERIVED_COLUMNS[name]
+    for dependency in dependencies:
+        if dependency in DERIVED_COLUMNS:
+            add_column(df, dependency, computed)
+    start = time.perf_counter()
+    new = name not in df.columns
+    df[name] = function(df)
+    computed.add(name)
+    elapsed = time.perf_counter() - start
+    METRICS.set('airbnb_derived_column_seconds', round(elapsed, 6), column=name)
+    if new:
+        print(f"  derived {name}: {elapsed:.2f}s")
+
+
+def materialized_columns(df):
+    """Derived columns present in df, in registry order"""
+    return [name for name in DERIVED_COLUMNS if name in df.columns]
+
+
+def without_columns(df, columns):
+    """Shallow copy of df without columns (the remaining columns share df's memory)"""
+    df = df.copy(deep=False)
+    for column in columns:
+        if column in df.columns:
+            del df[column]
+    return df
@@ -0,0 +1,156 @@
+"""
+Filter Index for the Airbnb Dataset
+Precomputed row indexes so dashboard filters resolve to a row selection
+without copying or masking the full DataFrame
+"""
+
+import numpy as np
+import pandas as pd
+
+from row_order import new_positions, updated_order
+
+
+# Query parameter -> df_clean column, for equality filters
+CATEGORICAL_FILTERS = {
+    'room_type': 'room_type_clean',
+    'borough': 'neighbourhood_group_clean',
+    'cancellation_policy': 'cancellation_policy_clean',
+    'instant_bookable': 'instant_bookable_clean',
+}
+
+# Column -> (min param, max param, parser), for range filters
+RANGE_FILTERS = {
+    'price_clean': ('price_min', 'price_max', float),
+    'number_of_reviews_clean': ('min_reviews', None, int),
+}
+
+
+class FilterIndex:
+    def __init__(self, df):
+        """Build per-value row arrays and sorted range indexes over df"""
+        self.size = len(df)
+        self.codes = {}
+        self.lookup = {}
+        self.rows = {}
+        for param, column in CATEGORICAL_FILTERS.items():
+            codes, uniques = pd.factorize(df[column])
+            # Stable sort keeps row positions ascending within each value
+            order = np.argsort(codes, kind='stable')
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            start = len(codes) - counts.sum()  # skip missing values (code -1)
+            self.codes[param] = codes
+            self.lookup[param] = {value: i for i, value in enumerate(uniques)}
+            self.rows[param] = np.split(order[start:], np.cumsum(counts)[:-1])
+
+        self.values = {}
+        self.order = {}
+        self.sorted_values = {}
+        for column in RANGE_FILTERS:
+            values = df[column].to_numpy(dtype=float)
+            order = np.argsort(values, kind='stable')
+            valid = int(np.count_nonzero(~np.isnan(values)))  # NaNs sort last
+            self.values[column] = values
+            self.order[column] = order[:valid]
+            self.sorted_values[column] = values[order[:valid]]
+
+    def updated(self, kept, fresh):
+        """Index of the rows where kept is set followed by the rows of fresh, updated from this one"""
+        index = FilterIndex.__new__(FilterIndex)
+        n_kept = int(np.count_nonzero(kept))
+        index.size = n_kept + len(fresh)
+        fresh_rows = n_kept + np.arange(len(fresh))
+        positions = new_positions(kept)
+        index.codes, index.lookup, index.rows = {}, {}, {}
+        for param, column in CATEGORICAL_FILTERS.items():
+            # Values new to the index get the next codes; emptied values keep theirs (with no rows)
+            lookup = dict(self.lookup[param])
+            values = fresh[column].to_numpy(dtype=object)
+            for value in pd.unique(values[pd.notna(values)]):
+                lookup.setdefault(value, len(lookup))
+            fresh_codes = np.array([lookup[value] if pd.notna(value) else -1 for value in values], dtype=np.intp)
+            rows = [positions[old_rows[kept[old_rows]]] for old_rows in self.rows[param]]
+            rows += [np.empty(0, dtype=np.intp)] * (len(lookup) - len(rows))
+            for code in np.unique(fresh_codes[fresh_codes >= 0]):
+                rows[code] = np.concatenate([rows[code], fresh_rows[fresh_codes == code]])
+            index.codes[param] = np.concatenate([self.codes[param][kept], fresh_codes])
+            index.lookup[param] = lookup
+            index.rows[param] = rows
+
+        index.values, index.order, index.sorted_values = {}, {}, {}
+        for column in RANGE_FILTERS:
+            fresh_values = fresh[column].to_numpy(dtype=float)
+            valid = ~np.isnan(fresh_values)
+            index.values[column] = np.concatenate([self.values[column][kept], fresh_values])
+            index.order[column], index.sorted_values[column] = updated_order(
+                self.order[column], self.sorted_values[column], kept, fresh_values[valid], fresh_rows[valid])
+        return index
+
+    @staticmethod
+    def parse(filters):
+        """Turn request filters into (categorical, range) constraints"""
+        categorical = {}
+        for param in CATEGORICAL_FILTERS:
+            if filters.get(param) and filters[param] not in ['all', '', None]:
+                categorical[param] = filters[param]
+
+        ranges = {}
+        for column, (min_param, max_param, parse) in RANGE_FILTERS.items():
+            low, high = -np.inf, np.inf
+            for param in (min_param, max_param):
+                if param and filters.get(param) and filters[param] not in ['', None]:
+                    try:
+                        bound = parse(filters[param])
+                    except (ValueError, TypeError):
+                        continue
+                    if param == min_param:
+                        low = bound
+                    else:
+                        high = bound
+            if low != -np.inf or high != np.inf:
+                ranges[column] = (low, high)
+        return categorical, ranges
+
+    def range_rows(self, column, low, high):
+        """Row positions (unordered) with low <= value <= high"""
+        sorted_values = self.sorted_values[column]
+        start = np.searchsorted(sorted_values, low, side='left')
+        stop = np.searchsorted(sorted_values, high, side='right')
+        return self.order[column][start:stop]
+
+    def select(self, filters):
+        """Ascending row positions matching filters, or None if unfiltered"""
+        categorical, ranges = self.parse(filters)
+        if not categorical and not ranges:
+            return None
+
+        candidates = []
+        for param, value in categorical.items():
+            code = self.lookup[param].get(value)
+            if code is None:
+                return np.empty(0, dtype=np.intp)
+            candidates.append((len(self.rows[param][code]), 'categorical', param, code))
+        for column, (low, high) in ranges.items():
+            if np.isnan(low) or np.isnan(high):
+                return np.empty(0, dtype=np.intp)
+            sorted_values = self.sorted_values[column]
+            count = (np.searchsorted(sorted_values, high, side='right')
+                     - np.searchsorted(sorted_values, low, side='left'))
+            candidates.append((max(count, 0), 'range', column, (low, high)))
+
+        # Start from the most selective index, then check the rest on those rows only
+        candidates.sort(key=lambda candidate: candidate[0])
+        _, kind, key, arg = candidates[0]
+        if kind == 'categorical':
+            rows = self.rows[key][arg]
+        else:
+            rows = np.sort(self.range_rows(key, *arg))
+
+        for _, kind, key, arg in candidates[1:]:
+            if len(rows) == 0:
+                break
+            if kind == 'categorical':
+                rows = rows[self.codes[key][rows] == arg]
+            else:
+                values = self.values[key][rows]
+                rows = rows[(values >= arg[0]) & (values <= arg[1])]
+        return rows
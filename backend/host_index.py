@@ -0,0 +1,132 @@
+"""
+Host Index for Top-Host Queries
+Hosts are factorized once into (host id, host name) groups. A top-N request
+bincounts the selected rows into per-host totals and partially selects the
+N largest, instead of grouping the frame and sorting every host. The
+unfiltered ranking is precomputed.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Per-row measures aggregated per host: name -> (column, aggregation)
+HOST_MEASURES = {
+    'avg_rating': ('review_rate_clean', 'mean'),
+    'avg_price': ('price_clean', 'mean'),
+    'total_reviews': ('number_of_reviews_clean', 'sum'),
+}
+
+
+def rank_order(counts, k):
+    """Positions of the k largest counts, ties broken by position (like a stable sort)"""
+    k = max(min(k, len(counts)), 0)
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(counts):
+        # Everything tied with the k-th largest count is a candidate
+        threshold = np.partition(counts, len(counts) - k)[len(counts) - k]
+        candidates = np.flatnonzero(counts >= threshold)
+    else:
+        candidates = np.arange(len(counts))
+    order = np.lexsort((candidates, -counts[candidates]))
+    return candidates[order[:k]]
+
+
+class HostIndex:
+    def __init__(self, df):
+        """Factorize host groups and precompute the unfiltered ranking"""
+        grouped = df.groupby(['host id', 'host name'], observed=True, sort=True)
+        # Rows with a missing host id or name get -1 (groupby drops them)
+        self.codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.intp)
+        keys = grouped.size().index
+        self.host_ids = keys.get_level_values(0).tolist()
+        self.host_names = keys.get_level_values(1).tolist()
+        self.n_groups = len(keys)
+        self.measures = {
+            name: df[column].to_numpy(dtype=float)
+            for name, (column, _) in HOST_MEASURES.items()
+        }
+        self.totals = self.aggregate(None)
+        self.ranking = rank_order(self.totals['listing_count'], self.n_groups)
+
+    def measure_totals(self, rows):
+        """Per-host listing count, and (sum, non-null count) of each measure, over rows (None = all rows)"""
+        codes = self.codes if rows is None else self.codes[rows]
+        grouped = codes >= 0
+        codes = codes[grouped]
+        count = np.bincount(codes, minlength=self.n_groups)
+        sums = {}
+        for name in HOST_MEASURES:
+            values = self.measures[name] if rows is None else self.measures[name][rows]
+            values = values[grouped]
+            valid = ~np.isnan(values)
+            sums[name] = (np.bincount(codes[valid], weights=values[valid], minlength=self.n_groups),
+                          np.bincount(codes[valid], minlength=self.n_groups))
+        return count, sums
+
+    def aggregate(self, rows):
+        """Per-host listing count and measures over rows (None = all rows)"""
+        count, sums = self.measure_totals(rows)
+        totals = {'listing_count': count}
+        for name, (_, how) in HOST_MEASURES.items():
+            total, n = sums[name]
+            if how == 'mean':
+                total = np.divide(total, n, out=np.full(self.n_groups, np.nan), where=n > 0)
+            totals[name] = total
+        return totals
+
+    def partial(self, rows=None):
+        """Per-host listing count and measure sums/counts over rows, for merging with other partitions"""
+        count, sums = self.measure_totals(rows)
+        present = np.flatnonzero(count)
+        stats = pd.DataFrame({
+            'host_id': [self.host_ids[group] for group in present],
+            'host_name': [self.host_names[group] for group in present],
+            'listing_count': count[present],
+        })
+        for name, (total, n) in sums.items():
+            stats[f'{name}_sum'] = total[present]
+            stats[f'{name}_count'] = n[present]
+        return stats
+
+    def top(self, rows=None, limit=10, offset=0):
+        """({field: list}, number of hosts) for ranks offset..offset+limit by listing count"""
+        if rows is None:
+            totals = self.totals
+            groups = self.ranking[offset:offset + limit]
+            total_hosts = self.n_groups
+        else:
+            totals = self.aggregate(rows)
+            present = np.flatnonzero(totals['listing_count'])
+            groups = present[rank_order(totals['listing_count'][present], offset + limit)[offset:]]
+            total_hosts = len(present)
+        columns = {
+            'rank': list(range(offset + 1, offset + len(groups) + 1)),
+            'host_id': [self.host_ids[group] for group in groups],
+            'host_name': [self.host_names[group] for group in groups],
+            'listing_count': totals['listing_count'][groups].tolist(),
+            **{name: totals[name][groups].astype(float).tolist() for name in HOST_MEASURES},
+        }
+        return columns, total_hosts
+
+
+def merge_top(partials, limit=10, offset=0):
+    """HostIndex.top output from the partials of several partitions (hosts are matched by id and name)"""
+    partials = [partial for partial in partials if len(partial)] or partials[:1]
+    stats = pd.concat(partials).groupby(['host_id', 'host_name'], sort=True).sum()
+    counts = stats['listing_count'].to_numpy()
+    page = stats.iloc[rank_order(counts, offset + limit)[offset:]]
+    columns = {
+        'rank': list(range(offset + 1, offset + len(page) + 1)),
+        'host_id': page.index.get_level_values(0).tolist(),
+        'host_name': page.index.get_level_values(1).tolist(),
+        'listing_count': page['listing_count'].astype(np.int64).tolist(),
+    }
+    for name, (_, how) in HOST_MEASURES.items():
+        total = page[f'{name}_sum'].to_numpy(dtype=float)
+        if how == 'mean':
+            n = page[f'{name}_count'].to_numpy(dtype=float)
+            total = np.divide(total, n, out=np.full(len(page), np.nan), where=n > 0)
+        columns[name] = total.tolist()
+    return columns, len(stats)
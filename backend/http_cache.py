@@ -0,0 +1,79 @@
+"""
+HTTP Caching and Compression
+Data endpoints answer with a weak ETag computed from the backend code, the
+tag of the loaded data (a hash of the source CSVs and any deltas applied),
+the endpoint, the normalized query string and the negotiated format. Every
+worker and every restart serving the same code and data gives the same tag,
+so browsers, a CDN or a reverse proxy can revalidate with If-None-Match and
+get a 304 without the API computing anything. Cache-Control lets them reuse
+a response for HTTP_CACHE_MAX_AGE seconds before revalidating.
+
+Large bodies are compressed with brotli (when installed) or gzip, whichever
+the client prefers in Accept-Encoding.
+"""
+
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses are gzipped instead
+    brotli = None
+
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Mimetypes worth compressing (JSON, the binary column formats and the metrics text)
+COMPRESSIBLE_MIMETYPES = [
+    'application/json', 'application/msgpack', 'application/x-msgpack',
+    'application/vnd.apache.arrow.stream', 'text/plain',
+]
+
+# gzip level and brotli quality: fast settings, since most bodies are compressed per request
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def code_tag():
+    """Hash of the backend's Python sources, so a deploy that changes responses changes every ETag"""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(BACKEND_DIR)):
+        if name.endswith('.py'):
+            with open(os.path.join(BACKEND_DIR, name), 'rb') as f:
+                digest.update(name.encode() + b'\0' + f.read())
+    return digest.hexdigest()[:16]
+
+
+CODE_TAG = code_tag()
+
+
+def normalized_query(args):
+    """Query parameters as sorted (name, value) pairs, so parameter order does not change the ETag"""
+    return sorted((name, value) for name, values in args.lists() for value in values)
+
+
+def make_etag(*parts):
+    """Opaque ETag value (without quotes) for the given parts"""
+    digest = hashlib.sha256(CODE_TAG.encode())
+    for part in parts:
+        digest.update(b'\0' + repr(part).encode())
+    return digest.hexdigest()[:32]
+
+
+def encodings():
+    """Content encodings this process can produce, best first"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def choose_encoding(accept_encodings):
+    """Encoding to compress with for a werkzeug Accept-Encoding header, or None to send the body as is"""
+    return accept_encodings.best_match(encodings())
+
+
+def compress(body, encoding):
+    """body compressed with encoding (one of encodings())"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
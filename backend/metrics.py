@@ -0,0 +1,159 @@
+"""
+Metrics and Profiling
+In-process counters, gauges and latency histograms rendered in the
+Prometheus text format, plus a cProfile helper for one-off request profiles
+"""
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Histogram upper bounds (seconds) for request and stage latencies
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Histogram upper bounds for response sizes (bytes) and row counts
+SIZE_BUCKETS = (1e2, 1e3, 1e4, 1e5, 1e6, 1e7)
+ROW_BUCKETS = (1, 10, 100, 1e3, 1e4, 1e5, 1e6)
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+class Metrics:
+    def __init__(self):
+        """Empty registry; metrics are created on first use"""
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def describe(self, name, kind, help_text):
+        self._types[name] = kind
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter"""
+        key = (name, label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set a gauge"""
+        with self._lock:
+            self._gauges[(name, label_key(labels))] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """Record one observation in a histogram"""
+        key = (name, label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets),
+                                                     'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of the with-block in a latency histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            series = {}
+            for (name, labels), value in self._counters.items():
+                series.setdefault(name, []).append(f"{name}{format_labels(labels)} {value}")
+            for (name, labels), value in self._gauges.items():
+                series.setdefault(name, []).append(f"{name}{format_labels(labels)} {value}")
+            for (name, labels), histogram in self._histograms.items():
+                lines = series.setdefault(name, [])
+                cumulative = 0
+                for bound, count in zip(histogram['buckets'], histogram['counts']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', repr(float(bound)))])} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+
+        output = []
+        for name in sorted(series):
+            if name in self._help:
+                output.append(f"# HELP {name} {self._help[name]}")
+            output.append(f"# TYPE {name} {self._types.get(name, 'untyped')}")
+            output.extend(series[name])
+        return '\n'.join(output) + '\n'
+
+
+# Process-wide registry shared by app.py and the loading pipeline
+METRICS = Metrics()
+METRICS.describe('airbnb_request_duration_seconds', 'histogram', 'Request latency by endpoint and status')
+METRICS.describe('airbnb_stage_duration_seconds', 'histogram', 'Time spent per request stage (filter, aggregate, serialize)')
+METRICS.describe('airbnb_response_bytes', 'histogram', 'Response payload size by endpoint')
+METRICS.describe('airbnb_filtered_rows', 'histogram', 'Rows left after filtering, by endpoint')
+METRICS.describe('airbnb_requests_total', 'counter', 'Requests by endpoint and status')
+METRICS.describe('airbnb_startup_phase_seconds', 'gauge', 'Duration of the last run of each loading phase')
+METRICS.describe('airbnb_derived_column_seconds', 'gauge', 'Time taken to compute each derived column on its first use')
+METRICS.describe('airbnb_dataset_rows', 'gauge', 'Rows in the live dataset')
+METRICS.describe('airbnb_dataset_version', 'gauge', 'Version number of the live dataset')
+METRICS.describe('airbnb_not_modified_total', 'counter', 'Requests answered 304 Not Modified from their ETag')
+METRICS.describe('airbnb_compression_saved_bytes_total', 'counter', 'Response bytes saved by gzip/brotli compression')
+
+
+@contextmanager
+def phase(name):
+    """Time a loading phase, print it and record it as a gauge"""
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    METRICS.set('airbnb_startup_phase_seconds', round(elapsed, 6), phase=name)
+    print(f"  {name}: {elapsed:.2f}s")
+
+
+def profile_report(profiler, limit=30, sort='cumulative'):
+    """Top functions of a finished cProfile run as JSON-friendly rows"""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    stats.sort_stats(sort)
+    rows = []
+    for func in stats.fcn_list[:limit]:
+        calls, primitive_calls, total_time, cumulative_time, _ = stats.stats[func]
+        filename, line, function = func
+        rows.append({
+            'function': f"{filename}:{line}({function})",
+            'calls': calls,
+            'total_ms': round(total_time * 1000, 3),
+            'cumulative_ms': round(cumulative_time * 1000, 3),
+        })
+    return {'total_ms': round(stats.total_tt * 1000, 3), 'sort': sort, 'functions': rows}
+
+
+def start_profiler():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
@@ -0,0 +1,109 @@
+"""
+Mergeable Partial Aggregates
+Endpoint results built from partial aggregates (counts, sums, sketches,
+distinct ids) that add up across row sets, so several dataset partitions can
+be combined without concatenating their rows. A single partition goes
+through the same finishing functions as a merge of many.
+"""
+
+import numpy as np
+
+from sketch import PRICE_QUANTILE_LEVELS, PRICE_SKETCH, price_quantile_fields
+
+
+# Measures with non-null count and sum in summary, data cube and query partials
+PARTIAL_MEASURES = {
+    'price': 'price_clean',
+    'reviews': 'number_of_reviews_clean',
+    'availability': 'availability_365_clean',
+    'rating': 'review_rate_clean',
+    'occupancy': 'occupancy_rate',
+}
+
+def summary_partial(df):
+    """Partial of get_summary_stats over the rows of df (with the prices, since rows are scanned anyway)"""
+    prices = df['price_clean']
+    verified = df['host_verified'] == 'verified'
+    return {
+        'count': int(len(df)),
+        'measures': {
+            # np.float64 sums, so means round like the baseline's Series.mean()
+            name: (df[column].sum(), int(df[column].count()))
+            for name, column in PARTIAL_MEASURES.items()
+        },
+        # Exact quantiles need the values themselves; cube partials carry a sketch instead
+        'prices': prices.dropna().to_numpy(dtype=float),
+        'price_sketch': None,
+        'host_ids': df['host id'].dropna().unique(),
+        'verified_host_ids': df.loc[verified, 'host id'].dropna().unique(),
+    }
+
+
+def near_ties(partial):
+    """Measures of a summary partial whose mean is within rounding error of a .xx5 tie
+
+    Which way such a mean rounds to 2 decimals depends on the order its
+    values were added in, so only a sum over the rows themselves matches.
+    """
+    ties = []
+    for name, (total, count) in partial['measures'].items():
+        scaled = abs(total / count) * 100 if count else 0.0
+        if abs(scaled - np.floor(scaled) - 0.5) <= 1e-12 * max(scaled, 1.0):
+            ties.append(name)
+    return ties
+
+
+def distinct_count(arrays):
+    """Number of distinct values across arrays that are each already distinct"""
+    if len(arrays) == 1:
+        return len(arrays[0])
+    return len(np.unique(np.concatenate(arrays)))
+
+
+def summary_from_partials(partials):
+    """get_summary_stats output from one or more summary partials
+
+    Price quantiles are exact when every partial scanned its rows (like the
+    histogram of get_price_distribution for the same rows) and come from the
+    merged sketches otherwise; price_quantile_error says which.
+    """
+    def total(name):
+        return sum(partial['measures'][name][0] for partial in partials)
+
+    def mean(name):
+        count = sum(partial['measures'][name][1] for partial in partials)
+        return total(name) / count if count else np.nan
+
+    exact = all(partial['prices'] is not None for partial in partials)
+    if exact:
+        prices = np.concatenate([partial['prices'] for partial in partials])
+        quantiles = np.quantile(prices, PRICE_QUANTILE_LEVELS) if len(prices) else np.full(
+            len(PRICE_QUANTILE_LEVELS), np.nan)
+    else:
+        sketch = sum(partial['price_sketch'] if partial['price_sketch'] is not None
+                     else PRICE_SKETCH.counts(partial['prices']) for partial in partials)
+        quantiles = PRICE_SKETCH.quantiles(sketch, PRICE_QUANTILE_LEVELS)
+    return {
+        'total_listings': int(sum(partial['count'] for partial in partials)),
+        'average_price': float(round(mean('price'), 2)),
+        **price_quantile_fields(quantiles, exact),
+        'total_reviews': int(total('reviews')),
+        'average_rating': float(round(mean('rating'), 2)),
+        'average_availability': float(round(mean('availability'), 2)),
+        'average_occupancy_rate': float(round(mean('occupancy'), 2)),
+        'total_hosts': distinct_count([partial['host_ids'] for partial in partials]),
+        'verified_hosts': distinct_count([partial['verified_host_ids'] for partial in partials]),
+    }
+
+
+def split_limit(limit, sizes):
+    """Share limit rows across parts of the given sizes, proportionally (largest remainders first)"""
+    sizes = np.asarray(sizes, dtype=np.int64)
+    total = int(sizes.sum())
+    if total <= limit:
+        return sizes.tolist()
+    shares = sizes * limit / total
+    counts = np.floor(shares).astype(np.int64)
+    remainder = limit - int(counts.sum())
+    counts[np.argsort(counts - shares, kind='stable')[:remainder]] += 1
+    return counts.tolist()
@@ -0,0 +1,27 @@
+"""
+Partition Loading Worker
+Entry point of the processes that load partitions in parallel. It imports
+only the loading pipeline (never app.py), so the pool can use the forkserver
+or spawn start method: workers start from a clean interpreter instead of a
+fork of a server process that may hold locks in other threads.
+"""
+
+from snapshot import ensure_snapshot, load_processor
+
+
+def load_partition(csv_path, use_snapshot, chunksize):
+    """(snapshot path, None, data tag) of one partition, once its snapshot is up to date
+
+    The caller reads the snapshot itself, memory-mapped, rather than getting
+    a pickled copy of the frame. Without a snapshot (disabled or not
+    writable) this returns (None, cleaned frame, data tag) instead.
+    """
+    if use_snapshot:
+        path, key, processor = ensure_snapshot(csv_path, chunksize)
+        if path is not None:
+            return path, None, key
+    else:
+        processor = load_processor(csv_path, use_snapshot=False, chunksize=chunksize)
+    if processor.df_clean is None:
+        raise ValueError(f"Data loading failed for {csv_path}")
+    return None, processor.df_clean, processor.data_tag
@@ -0,0 +1,367 @@
+"""
+Partitioned Datasets
+One deployment can serve several markets: each city is a partition with its
+own AirbnbDataProcessor (and indexes). Partitions are loaded and cleaned in
+parallel worker processes, which write each partition's snapshot; the
+snapshots are then memory-mapped by this process. Queries select partitions with the `city` filter,
+and aggregations over several partitions merge per-partition partial results
+(see partials.py and query.py) instead of concatenating rows. With a single
+partition selected, every call goes straight to that partition's processor.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import time
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+from data_processor import AirbnbDataProcessor, columns_to_records
+from date_index import review_activity_response, review_range
+from derived_columns import DERIVED_COLUMNS
+from filter_index import FilterIndex
+from host_index import merge_top
+from metrics import phase
+from partials import split_limit, summary_from_partials
+from partition_worker import load_partition
+from query import (BOROUGH_QUERY, CONSTRUCTION_YEAR_QUERY, DEFAULT_QUERY_LIMIT, PARTITION_DIMENSION, POLICY_QUERY,
+                   ROOM_TYPE_QUERY, Query, breakdown_records, category_query, merge_partials, neighbourhood_records,
+                   policy_records, price_trend_columns, query_frame, query_page, room_type_records)
+from sketch import PRICE_SKETCH, histogram_response
+from snapshot import load_processor, snapshot_processor
+from spatial_index import CLUSTER_MAX_ZOOM
+
+
+# Partition name used when a source is a bare CSV path
+DEFAULT_CITY = os.getenv('DEFAULT_CITY', 'new-york')
+
+
+def parse_sources(spec, default_city=DEFAULT_CITY):
+    """'city=path,city=path' (or a bare path for default_city) -> {city: path}"""
+    sources = {}
+    for item in str(spec).split(','):
+        item = item.strip()
+        if not item:
+            continue
+        city, separator, path = item.partition('=')
+        if separator:
+            sources[city.strip()] = path.strip()
+        else:
+            sources[default_city] = item
+    if not sources:
+        raise ValueError(f"No dataset partitions in {spec!r}")
+    return sources
+
+
+def format_sources(sources):
+    """Inverse of parse_sources"""
+    return ','.join(f'{city}={path}' for city, path in sources.items())
+
+
+# Seconds a parallel load may take before its worker processes are killed
+LOAD_TIMEOUT = float(os.getenv('LOAD_TIMEOUT', 600))
+
+
+def worker_context():
+    """Multiprocessing context for loading workers: forkserver (with the loader preloaded) or spawn, never fork"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['partition_worker'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def load_partitions(sources, use_snapshot=True, chunksize=0, workers=None, timeout=LOAD_TIMEOUT):
+    """{city: processor} for {city: csv_path}, loading partitions in parallel processes
+
+    Raises TimeoutError (after killing the workers) when the parallel load
+    takes longer than timeout seconds, so a hung load cannot block reloads.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(sources))
+    with phase('load_partitions'):
+        if workers <= 1:
+            frames = {city: load_partition(path, use_snapshot, chunksize) for city, path in sources.items()}
+        else:
+            # Leaving the block terminates the pool, including workers still running after a timeout
+            with worker_context().Pool(workers) as pool:
+                results = {city: pool.apply_async(load_partition, (path, use_snapshot, chunksize))
+                           for city, path in sources.items()}
+                deadline = time.monotonic() + timeout
+                try:
+                    frames = {city: result.get(max(deadline - time.monotonic(), 0))
+                              for city, result in results.items()}
+                except multiprocessing.TimeoutError:
+                    raise TimeoutError(f"Loading {len(sources)} partitions took longer than {timeout:g}s")
+    processors = {}
+    for city, (path, df, tag) in frames.items():
+        if path is None:
+            processors[city] = AirbnbDataProcessor(sources[city])
+            processors[city].df_clean = df
+            processors[city].data_tag = tag
+            continue
+        # Read here, memory-mapped, so every process serving the same snapshot shares its pages
+        try:
+            processors[city] = snapshot_processor(sources[city], path, tag)
+        except Exception as e:
+            print(f"Snapshot unreadable ({e}), rebuilding")
+            processors[city] = load_processor(sources[city], use_snapshot, chunksize)
+    return processors
+
+
+def per_partition(method):
+    """Call the partition's own method when only one partition is selected"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if len(self.partitions) == 1:
+            return getattr(self.only(), method.__name__)(*args, **kwargs)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+class PartitionedProcessor:
+    def __init__(self, partitions):
+        """Processor-like view over {city: AirbnbDataProcessor}"""
+        self.partitions = dict(partitions)
+
+    def only(self):
+        return next(iter(self.partitions.values()))
+
+    def cities(self):
+        return list(self.partitions)
+
+    def select_cities(self, city):
+        """Names of the partitions a `city` filter value selects (all when empty or 'all')"""
+        if city in (None, '', 'all'):
+            return self.cities()
+        names = [name.strip() for name in str(city).split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.partitions]
+        if unknown:
+            raise ValueError(f"Unknown city: {', '.join(unknown)} (available: {', '.join(self.partitions)})")
+        return [name for name in self.partitions if name in names]
+
+    def parse_filters(self, filters):
+        """(categorical, range) constraints of filters, with the selected cities as a categorical"""
+        categorical, ranges = FilterIndex.parse(filters)
+        cities = self.select_cities(filters.get('city'))
+        if cities != self.cities():
+            categorical['city'] = ','.join(cities)
+        return categorical, ranges
+
+    def apply_filters(self, filters):
+        """Partitions selected by the `city` filter, each filtered by the other filters"""
+        cities = self.select_cities(filters.get('city'))
+        others = {param: value for param, value in filters.items() if param != 'city'}
+        return PartitionedProcessor({
+            city: self.partitions[city].apply_filters(others) if others else self.partitions[city]
+            for city in cities
+        })
+
+    def build_indexes(self):
+        return [processor.build_indexes() for processor in self.partitions.values()]
+
+    @property
+    def data_tag(self):
+        """Hash of every partition's name and data tag; changes whenever the data served does"""
+        tags = ','.join(f'{city}={processor.data_tag}' for city, processor in self.partitions.items())
+        return hashlib.sha256(tags.encode()).hexdigest()[:16]
+
+    def row_count(self):
+        return sum(processor.row_count() for processor in self.partitions.values())
+
+    def derived_columns(self):
+        """Derived columns computed in any partition"""
+        computed = set().union(*(processor.derived_columns() for processor in self.partitions.values()))
+        return [column for column in DERIVED_COLUMNS if column in computed]
+    
+    def evict_columns(self, columns=None):
+        """Drop derived columns from every partition"""
+        evicted = set().union(*(processor.evict_columns(columns) for processor in self.partitions.values()))
+        return [column for column in DERIVED_COLUMNS if column in evicted]
+    
+    def with_partition(self, city, processor):
+        """Copy with one partition replaced (or added)"""
+        return PartitionedProcessor({**self.partitions, city: processor})
+
+    def apply_delta(self, delta, city=None):
+        """(new PartitionedProcessor, stats) with a delta applied to one partition"""
+        if city is None:
+            if len(self.partitions) != 1:
+                raise ValueError(f"Pass city to choose the partition (one of: {', '.join(self.partitions)})")
+            city = self.cities()[0]
+        cities = self.select_cities(city)
+        if len(cities) != 1:
+            raise ValueError("A delta applies to exactly one city")
+        city = cities[0]
+        updated, stats = self.partitions[city].apply_delta(delta)
+        stats['city'] = city
+        return self.with_partition(city, updated), stats
+
+    @per_partition
+    def get_summary_stats(self, exact=False):
+        partials = [processor.get_summary_partial(exact) for processor in self.partitions.values()]
+        return summary_from_partials(partials)
+
+    @per_partition
+    def get_price_distribution(self, bins=30, exact=False):
+        # Bin edges span the merged min and max; the partitions then add up counts on those edges
+        partials = {city: processor.get_price_partial(exact) for city, processor in self.partitions.items()}
+        priced = {city: partial for city, partial in partials.items() if partial['count']}
+        if not priced:
+            return histogram_response(*np.histogram(np.empty(0), bins=bins))
+        low = min(partial['min'] for partial in priced.values())
+        high = max(partial['max'] for partial in priced.values())
+        if all(partial['price_sketch'] is not None for partial in priced.values()):
+            sketch = sum(partial['price_sketch'] for partial in priced.values())
+            hist, edges = PRICE_SKETCH.histogram(sketch, bins, low, high)
+        else:
+            hist = sum(self.partitions[city].get_price_counts(bins, low, high) for city in priced)
+            edges = np.histogram_bin_edges(np.empty(0), bins=bins, range=(low, high))
+        return histogram_response(hist, edges)
+
+    def get_query_partial(self, query):
+        """Query partials of the partitions merged by group (the city dimension labels each partition's groups)"""
+        local = Query([name for name in query.dimensions if name != PARTITION_DIMENSION], query.metrics)
+        partials = []
+        for city, processor in self.partitions.items():
+            partial = processor.get_query_partial(local)
+            if PARTITION_DIMENSION in query.dimensions:
+                city_labels = np.full(len(partial['count']), city, dtype=object)
+                partial = {**partial, 'keys': {**partial['keys'], PARTITION_DIMENSION: city_labels}}
+            partials.append(partial)
+        return merge_partials(partials, query)
+
+    def get_query_frame(self, query):
+        return query_frame(self.get_query_partial(query), query)
+
+    def get_query_page(self, query, sort=None, limit=DEFAULT_QUERY_LIMIT, offset=0, orient='records'):
+        return query_page(self.get_query_frame(query), sort, limit, offset, orient)
+
+    @per_partition
+    def get_price_trends_by_construction_year(self):
+        return price_trend_columns(self.get_query_frame(CONSTRUCTION_YEAR_QUERY))
+
+    @per_partition
+    def get_room_type_comparison(self):
+        return room_type_records(self.get_query_frame(ROOM_TYPE_QUERY))
+
+    @per_partition
+    def get_neighbourhood_analysis(self, limit=15):
+        return neighbourhood_records(self.get_query_frame(BOROUGH_QUERY), limit)
+
+    @per_partition
+    def get_cancellation_policy_distribution(self):
+        return policy_records(self.get_query_frame(POLICY_QUERY))
+
+    @per_partition
+    def get_category_breakdown(self, bucketing):
+        return breakdown_records(self.get_query_frame(category_query(bucketing)))
+
+    @per_partition
+    def get_price_by_category(self):
+        return [
+            {'category': row['bucket'], 'count': row['count']}
+            for row in self.get_category_breakdown('price_category')
+        ]
+
+    @per_partition
+    def get_availability_trends(self):
+        return [
+            {'availability_range': row['bucket'], 'count': row['count'], 'avg_price': row['avg_price']}
+            for row in self.get_category_breakdown('availability')
+        ]
+
+    @per_partition
+    def get_top_hosts_page(self, limit=10, offset=0, orient='records'):
+        partials = [processor.get_host_partial() for processor in self.partitions.values()]
+        columns, total_hosts = merge_top(partials, limit, offset)
+        hosts = columns if orient == 'columns' else columns_to_records(columns)
+        return {'hosts': hosts, 'total_hosts': total_hosts, 'limit': limit, 'offset': offset}
+
+    @per_partition
+    def get_review_activity(self, interval='month', start=None, end=None, as_of=None):
+        # Defaults span every partition's reviews, so all partitions count over the same periods
+        as_of = pd.Timestamp(as_of or pd.Timestamp.now()).normalize()
+        spans = [processor.get_review_span() for processor in self.partitions.values()]
+        start, end = review_range(start, end, spans, as_of)
+        partials = [processor.get_review_partial(interval, start, end, as_of) for processor in self.partitions.values()]
+        return review_activity_response(interval, start, end, partials, as_of)
+    
+    def get_top_hosts(self, limit=10, offset=0):
+        return self.get_top_hosts_page(limit, offset)['hosts']
+
+    def map_limits(self, limit):
+        """Share of the map sample each partition contributes (proportional to its rows)"""
+        processors = list(self.partitions.values())
+        return zip(processors, split_limit(limit, [processor.row_count() for processor in processors]))
+
+    @per_partition
+    def get_map_data(self, limit=5000, orient='records'):
+        columns = {}
+        for processor, share in self.map_limits(limit):
+            for field, values in processor.get_map_data(share, 'columns').items():
+                columns.setdefault(field, []).extend(values)
+        if orient == 'columns':
+            return columns
+        return columns_to_records(columns)
+
+    @per_partition
+    def iter_map_data(self, limit=5000, chunk_size=1000):
+        for processor, share in self.map_limits(limit):
+            yield from processor.iter_map_data(share, chunk_size)
+
+    @per_partition
+    def get_map_view(self, bbox, zoom=CLUSTER_MAX_ZOOM, limit=5000):
+        views = [processor.get_map_view(bbox, zoom, limit) for processor in self.partitions.values()]
+        views = [view for view in views if view['total']] or views[:1]
+        if len(views) == 1:
+            return views[0]
+        total = sum(view['total'] for view in views)
+        if all(view['type'] == 'points' for view in views):
+            shares = split_limit(limit, [len(view['points']) for view in views])
+            return {'type': 'points', 'total': total,
+                    'points': [point for view, share in zip(views, shares) for point in view['points'][:share]]}
+        # Some partitions are clustered: show the others' points as one-listing clusters
+        clusters = []
+        for view in views:
+            if view['type'] == 'clusters':
+                clusters.extend(view['clusters'])
+            else:
+                clusters.extend({'lat': point['lat'], 'lng': point['lng'], 'count': 1,
+                                 'avg_price': round(float(point['price']), 2)} for point in view['points'])
+        return {'type': 'clusters', 'total': total, 'clusters': clusters}
+
+    def get_filter_options(self):
+        """Filter options of the selected partitions, plus the cities to choose from"""
+        options = [processor.get_filter_options() for processor in self.partitions.values()]
+        if len(options) == 1:
+            return {**options[0], 'cities': self.cities()}
+        merged = {
+            field: sorted(set().union(*(option[field] for option in options)))
+            for field in ('room_types', 'boroughs', 'cancellation_policies')
+        }
+        merged['price_range'] = {
+            'min': min(option['price_range']['min'] for option in options),
+            'max': max(option['price_range']['max'] for option in options),
+        }
+        merged['cities'] = self.cities()
+        return merged
+
+    @per_partition
+    def memory_report(self):
+        reports = {city: processor.memory_report() for city, processor in self.partitions.items()}
+        columns = {}
+        for report in reports.values():
+            for item in report['columns']:
+                columns.setdefault(item['column'], {'column': item['column'], 'dtype': item['dtype'], 'bytes': 0})
+                columns[item['column']]['bytes'] += item['bytes']
+        return {
+            'rows': sum(report['rows'] for report in reports.values()),
+            'total_bytes': sum(report['total_bytes'] for report in reports.values()),
+            'index_bytes': sum(report['index_bytes'] for report in reports.values()),
+            'columns': sorted(columns.values(), key=lambda item: item['bytes'], reverse=True),
+            'derived_columns': self.derived_columns(),
+            'partitions': {city: {'rows': report['rows'], 'total_bytes': report['total_bytes']}
+                           for city, report in reports.items()},
+        }
@@ -0,0 +1,483 @@
+"""
+Pivot Queries
+Group the selected listings by any combination of dimensions and compute
+metrics (count, sum, mean, min, max, median, percentiles) per group.
+
+Dimensions are integer codes, precomputed per row by QueryIndex. A query
+combines the codes of its dimensions into one mixed-radix key per row and
+compacts the keys into dense group ids. Every sum and count is then a
+bincount over those ids, and medians, percentiles, minima and maxima are
+offsets into the values sorted by group. Purely categorical requests run
+the same kernel over data cube cells (weighted by their counts) instead of
+rows. Partitions return partials that merge by group labels. The grouped
+endpoints (room types, boroughs, policies, categories, ...) are presets.
+"""
+
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from buckets import BUCKETINGS, bucket_codes
+from partials import PARTIAL_MEASURES
+
+
+# Dimension -> cleaned column. The bucketings of buckets.py are dimensions too (in label order).
+COLUMN_DIMENSIONS = {
+    'room_type': 'room_type_clean',
+    'borough': 'neighbourhood_group_clean',
+    'neighbourhood': 'neighbourhood_clean',
+    'cancellation_policy': 'cancellation_policy_clean',
+    'instant_bookable': 'instant_bookable_clean',
+    'host_verified': 'host_verified',
+    'construction_year': 'construction_year_clean',
+}
+
+# Dimension naming the dataset partition of each listing (see partitions.py)
+PARTITION_DIMENSION = 'city'
+
+QUERY_DIMENSIONS = [*COLUMN_DIMENSIONS, *BUCKETINGS, PARTITION_DIMENSION]
+
+# Measures metrics can aggregate (the summary and data cube measures)
+QUERY_MEASURES = PARTIAL_MEASURES
+
+# Aggregations of a measure, besides 'median' and 'pNN' percentiles
+AGGREGATIONS = ['sum', 'mean', 'count', 'min', 'max']
+
+# Guardrails on query size
+MAX_QUERY_DIMENSIONS = 4
+MAX_QUERY_METRICS = 20
+# Groups (non-empty dimension value combinations) one query may produce
+MAX_QUERY_GROUPS = 10000
+# Groups returned per page
+MAX_QUERY_LIMIT = 5000
+DEFAULT_QUERY_LIMIT = 1000
+
+# Key spaces up to this size are compacted with a bincount; larger ones are sorted
+DENSE_KEY_LIMIT = 1 << 20
+
+# Partials over all rows kept per QueryIndex (the grouped endpoints' unfiltered results)
+MAX_TOTALS = 64
+
+
+Metric = namedtuple('Metric', ['name', 'aggregation', 'measure', 'quantile'])
+Query = namedtuple('Query', ['dimensions', 'metrics'])
+
+
+class QueryTooLarge(Exception):
+    """A query would produce more than MAX_QUERY_GROUPS groups"""
+
+
+def parse_metric(spec, name=None):
+    """Metric for 'count' or 'aggregation:measure' (aggregation: sum, mean, count, min, max, median or pNN)"""
+    spec = spec.strip()
+    if spec == 'count':
+        return Metric(name or 'count', 'count', None, None)
+    aggregation, _, measure = spec.partition(':')
+    if measure not in QUERY_MEASURES:
+        raise ValueError(f"Unknown measure in {spec!r} (one of: {', '.join(QUERY_MEASURES)})")
+    quantile = None
+    if aggregation == 'median':
+        quantile = 0.5
+    elif re.fullmatch(r'p\d{1,2}(\.\d+)?', aggregation):
+        quantile = float(aggregation[1:]) / 100
+    elif aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation in {spec!r} (one of: {', '.join(AGGREGATIONS)}, median, pNN)")
+    return Metric(name or f'{aggregation}_{measure}', aggregation, measure, quantile)
+
+
+def parse_query(dimensions, metrics):
+    """Query from comma-separated (or listed) dimension names and metric specs"""
+    if isinstance(dimensions, str):
+        dimensions = [name.strip() for name in dimensions.split(',') if name.strip()]
+    if isinstance(metrics, str):
+        metrics = [spec.strip() for spec in metrics.split(',') if spec.strip()]
+    unknown = [name for name in dimensions if name not in QUERY_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimension: {', '.join(unknown)} (one of: {', '.join(QUERY_DIMENSIONS)})")
+    if len(set(dimensions)) != len(dimensions):
+        raise ValueError("Each dimension may only be used once")
+    if len(dimensions) > MAX_QUERY_DIMENSIONS:
+        raise ValueError(f"At most {MAX_QUERY_DIMENSIONS} dimensions per query")
+    metrics = [parse_metric(spec) for spec in metrics or ['count']]
+    if len(metrics) > MAX_QUERY_METRICS:
+        raise ValueError(f"At most {MAX_QUERY_METRICS} metrics per query")
+    names = [*dimensions, *(metric.name for metric in metrics)]
+    if len(set(names)) != len(names):
+        raise ValueError("Each metric may only be used once")
+    return Query(list(dimensions), metrics)
+
+
+def preset(dimensions, metrics):
+    """Query with named metrics ({output name: metric spec})"""
+    return Query(list(dimensions), [parse_metric(spec, name) for name, spec in metrics.items()])
+
+
+def measure_needs(query):
+    """Measure -> set of what its metrics need: 'sums', 'extremes' (min/max) or 'values' (quantiles)"""
+    needs = {}
+    for metric in query.metrics:
+        if metric.measure is None:
+            continue
+        need = needs.setdefault(metric.measure, {'sums'})
+        if metric.quantile is not None:
+            need.add('values')
+        elif metric.aggregation in ('min', 'max'):
+            need.add('extremes')
+    return needs
+
+
+def group_keys(codes, sizes, n_rows):
+    """(group id per row, rows kept, group count, codes of each group) for the dimension codes of n_rows rows
+
+    Rows missing any code are left out: group ids are given for the kept rows
+    only (kept is a mask over the rows, or None when every row is kept). The
+    codes are combined into one mixed-radix key per row; groups come out in key
+    order, i.e. sorted by the dimensions in turn.
+    """
+    if not sizes:
+        # No dimensions: one group of everything, even when empty
+        return np.zeros(n_rows, dtype=np.int64), None, 1, ()
+    n_keys = int(np.prod(sizes, dtype=object))
+    if n_keys >= 2 ** 62:
+        raise QueryTooLarge("Too many dimension value combinations")
+    keys = codes[0].astype(np.int64)
+    missing = codes[0] < 0
+    for dim_codes, size in zip(codes[1:], sizes[1:]):
+        missing |= dim_codes < 0
+        keys *= size
+        keys += dim_codes
+    kept = None
+    if missing.any():
+        kept = ~missing
+        keys = keys[kept]
+    if n_keys <= DENSE_KEY_LIMIT:
+        present = np.flatnonzero(np.bincount(keys, minlength=n_keys))
+        if len(present) < n_keys:
+            dense = np.full(n_keys, -1, dtype=np.int64)
+            dense[present] = np.arange(len(present))
+            keys = dense[keys]
+    else:
+        present, keys = np.unique(keys, return_inverse=True)
+    if len(present) > MAX_QUERY_GROUPS:
+        raise QueryTooLarge(f"Query has {len(present)} groups (at most {MAX_QUERY_GROUPS}); "
+                            "add filters or use fewer dimensions")
+    return keys, kept, len(present), np.unravel_index(present, sizes)
+
+
+def kept_values(values, kept):
+    """values of the rows group_keys kept"""
+    return values if kept is None else values[kept]
+
+
+def sorted_by_group(groups, values):
+    """(groups, values) ordered by group, then value"""
+    order = np.lexsort((values, groups))
+    return groups[order], values[order]
+
+
+def segment_bounds(sorted_groups, n_groups):
+    """(start, count) of each group's run in sorted_groups"""
+    counts = np.bincount(sorted_groups, minlength=n_groups)
+    return np.cumsum(counts) - counts, counts
+
+
+def measure_partial(groups, values, n_groups, need):
+    """Non-null sum and count of values per group, plus the extremes or the values when needed
+
+    Values are kept as (groups, values) sorted by group, then value, so each
+    group's values are one run and quantiles are offsets into it.
+    """
+    valid = ~np.isnan(values)
+    groups, values = groups[valid], values[valid]
+    partial = {
+        'sum': np.bincount(groups, weights=values, minlength=n_groups),
+        'count': np.bincount(groups, minlength=n_groups),
+    }
+    if need & {'extremes', 'values'}:
+        groups, values = sorted_by_group(groups, values)
+        start, count = segment_bounds(groups, n_groups)
+        partial['min'] = run_values(values, start, count)
+        partial['max'] = run_values(values, start + count - 1, count)
+        if 'values' in need:
+            partial['values'] = (groups, values)
+    return partial
+
+
+def run_values(values, positions, count):
+    """values at positions, NaN for groups whose run is empty (count 0)"""
+    if not len(values):
+        return np.full(len(count), np.nan)
+    return np.where(count > 0, values[np.clip(positions, 0, len(values) - 1)], np.nan)
+
+
+def quantiles(groups, values, n_groups, q):
+    """q-th quantile of each group's values (sorted by group, then value), interpolated like np.quantile"""
+    start, count = segment_bounds(groups, n_groups)
+    position = start + q * np.maximum(count - 1, 0)
+    low = run_values(values, np.floor(position).astype(np.int64), count)
+    high = run_values(values, np.ceil(position).astype(np.int64), count)
+    return low + (high - low) * (position - np.floor(position))
+
+
+def dimension_labels(labels):
+    """Label array of a dimension, with whole-number floats (years) as integers"""
+    labels = np.asarray(labels)
+    if labels.dtype.kind == 'f' and np.all(np.isfinite(labels)) and np.all(labels == np.round(labels)):
+        return labels.astype(np.int64)
+    return labels
+
+
+def dimension_codes(dimension, labels):
+    """(codes, ordered labels) of a dimension's label values, in the dimension's order"""
+    if dimension in BUCKETINGS:
+        categories = np.asarray(BUCKETINGS[dimension], dtype=object)
+        return pd.Categorical(labels, categories=categories).codes, categories
+    codes, uniques = pd.factorize(labels, sort=True)
+    return codes, np.asarray(uniques)
+
+
+class QueryIndex:
+    def __init__(self, df):
+        """Codes of every dimension and the measure values, per row"""
+        self.size = len(df)
+        self.codes = {}
+        self.labels = {}
+        for name, column in COLUMN_DIMENSIONS.items():
+            codes, labels = pd.factorize(df[column], sort=True)
+            self.codes[name] = codes.astype(np.int32)
+            self.labels[name] = dimension_labels(labels)
+        for name, labels in BUCKETINGS.items():
+            self.codes[name] = bucket_codes(df, name)
+            self.labels[name] = np.asarray(labels, dtype=object)
+        self.measures = {name: df[column].to_numpy(dtype=float) for name, column in QUERY_MEASURES.items()}
+        self.totals = {}
+
+    def partial(self, query, rows=None):
+        """Query partial over rows (None = all rows, kept for reuse; partials are never modified)"""
+        if PARTITION_DIMENSION in query.dimensions:
+            raise ValueError(f"'{PARTITION_DIMENSION}' is only available on partitioned datasets")
+        if rows is None:
+            key = (tuple(query.dimensions), tuple(query.metrics))
+            if key not in self.totals:
+                partial = self.aggregate(query, None)
+                if len(self.totals) >= MAX_TOTALS:
+                    return partial
+                self.totals[key] = partial
+            return self.totals[key]
+        return self.aggregate(query, rows)
+
+    def aggregate(self, query, rows):
+        """Group and aggregate the measures of rows (None = all rows)"""
+        n_rows = self.size if rows is None else len(rows)
+        codes = [self.codes[name] if rows is None else self.codes[name][rows] for name in query.dimensions]
+        sizes = [len(self.labels[name]) for name in query.dimensions]
+        groups, kept, n_groups, group_codes = group_keys(codes, sizes, n_rows)
+        partial = {
+            'keys': {name: self.labels[name][dim_codes] for name, dim_codes in zip(query.dimensions, group_codes)},
+            'count': np.bincount(groups, minlength=n_groups),
+            'measures': {},
+        }
+        for measure, need in measure_needs(query).items():
+            values = self.measures[measure] if rows is None else self.measures[measure][rows]
+            partial['measures'][measure] = measure_partial(groups, kept_values(values, kept), n_groups, need)
+        return partial
+
+
+def cube_partial(cube_slice, query):
+    """Query partial from data cube cells (only dimensions of the cube; no quantiles)"""
+    cube = cube_slice.cube
+    mask = cube_slice.mask
+    codes = [cube.cell_codes[name][mask] for name in query.dimensions]
+    sizes = [len(cube.labels[name]) for name in query.dimensions]
+    # Cube cells have a code for every value (missing ones included), so all cells are kept
+    groups, _, n_groups, group_codes = group_keys(codes, sizes, int(mask.sum()))
+    partial = {
+        'keys': {name: dimension_labels(cube.labels[name])[dim_codes]
+                 for name, dim_codes in zip(query.dimensions, group_codes)},
+        'count': np.bincount(groups, weights=cube.count[mask], minlength=n_groups).astype(np.int64),
+        'measures': {},
+    }
+    for measure, need in measure_needs(query).items():
+        stats = cube.stats[measure]
+        merged = {
+            'sum': np.bincount(groups, weights=stats['sum'][mask], minlength=n_groups),
+            'count': np.bincount(groups, weights=stats['count'][mask], minlength=n_groups).astype(np.int64),
+        }
+        if 'extremes' in need:
+            merged['min'] = group_extreme(np.fmin, groups, stats['min'][mask], n_groups)
+            merged['max'] = group_extreme(np.fmax, groups, stats['max'][mask], n_groups)
+        partial['measures'][measure] = merged
+    # Groups without listings or with a missing value are dropped, as on rows
+    keep = partial['count'] > 0 if query.dimensions else np.ones(1, dtype=bool)
+    for labels in partial['keys'].values():
+        keep &= pd.notna(labels)
+    return select_groups(partial, keep)
+
+
+def cube_answers(cube, query):
+    """Whether the data cube holds everything the query needs"""
+    return (all(name in cube.dimensions for name in query.dimensions)
+            and all(metric.quantile is None for metric in query.metrics))
+
+
+def group_extreme(function, groups, values, n_groups):
+    """function (np.fmin or np.fmax) of values per group, NaN where a group has none"""
+    initial = np.inf if function is np.fmin else -np.inf
+    result = np.full(n_groups, initial)
+    function.at(result, groups, values)
+    return np.where(np.isinf(result), np.nan, result)
+
+
+def select_groups(partial, keep):
+    """Partial restricted to the groups where keep is set"""
+    if keep.all():
+        return partial
+    positions = np.flatnonzero(keep)
+    renumber = np.cumsum(keep) - 1
+    measures = {}
+    for measure, stats in partial['measures'].items():
+        measures[measure] = {field: stats[field][positions] for field in stats if field != 'values'}
+        if 'values' in stats:
+            groups, values = stats['values']
+            kept = keep[groups]
+            measures[measure]['values'] = (renumber[groups[kept]], values[kept])
+    return {
+        'keys': {name: labels[positions] for name, labels in partial['keys'].items()},
+        'count': partial['count'][positions],
+        'measures': measures,
+    }
+
+
+def merge_partials(partials, query):
+    """One partial from the partials of several row sets, grouped again by their labels"""
+    partials = [partial for partial in partials if len(partial['count'])] or partials[:1]
+    if len(partials) == 1:
+        return partials[0]
+    sizes = [len(partial['count']) for partial in partials]
+    offsets = np.cumsum(sizes) - sizes
+    codes, labels = [], []
+    for name in query.dimensions:
+        dim_codes, dim_labels = dimension_codes(name, np.concatenate([partial['keys'][name] for partial in partials]))
+        codes.append(dim_codes)
+        labels.append(dimension_labels(dim_labels))
+    # The partials' groups are the rows of this grouping (their labels are never missing)
+    merged, _, n_groups, group_codes = group_keys(codes, [len(dim_labels) for dim_labels in labels], sum(sizes))
+    result = {
+        'keys': {name: dim_labels[dim_codes]
+                 for name, dim_labels, dim_codes in zip(query.dimensions, labels, group_codes)},
+        'count': np.bincount(merged, weights=np.concatenate([partial['count'] for partial in partials]),
+                             minlength=n_groups).astype(np.int64),
+        'measures': {},
+    }
+    for measure, need in measure_needs(query).items():
+        parts = [partial['measures'][measure] for partial in partials]
+        stats = {
+            'sum': np.bincount(merged, weights=np.concatenate([part['sum'] for part in parts]), minlength=n_groups),
+            'count': np.bincount(merged, weights=np.concatenate([part['count'] for part in parts]),
+                                 minlength=n_groups).astype(np.int64),
+        }
+        if need & {'extremes', 'values'}:
+            stats['min'] = group_extreme(np.fmin, merged, np.concatenate([part['min'] for part in parts]), n_groups)
+            stats['max'] = group_extreme(np.fmax, merged, np.concatenate([part['max'] for part in parts]), n_groups)
+        if 'values' in need:
+            stats['values'] = sorted_by_group(
+                np.concatenate([merged[offset + part['values'][0]] for offset, part in zip(offsets, parts)]),
+                np.concatenate([part['values'][1] for part in parts]),
+            )
+        result['measures'][measure] = stats
+    return result
+
+
+def metric_values(partial, metric):
+    """Per-group values of one metric"""
+    if metric.measure is None:
+        return partial['count']
+    stats = partial['measures'][metric.measure]
+    if metric.quantile is not None:
+        return quantiles(*stats['values'], len(partial['count']), metric.quantile)
+    if metric.aggregation == 'mean':
+        count = stats['count']
+        return np.divide(stats['sum'], count, out=np.full(len(count), np.nan), where=count > 0)
+    return stats[metric.aggregation]
+
+
+def query_frame(partial, query):
+    """One row per group: the dimension labels, then the metrics (groups sorted by dimensions)"""
+    columns = {name: partial['keys'][name] for name in query.dimensions}
+    columns.update((metric.name, metric_values(partial, metric)) for metric in query.metrics)
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(partial['count'])))
+
+
+def query_page(frame, sort=None, limit=DEFAULT_QUERY_LIMIT, offset=0, orient='records'):
+    """{'rows': records (or {field: list}), 'total_groups': n} for one page of a query frame
+
+    sort names a field, prefixed with '-' for descending order (missing values last).
+    """
+    if sort:
+        field = sort.lstrip('-')
+        if field not in frame.columns:
+            raise ValueError(f"Cannot sort by {field!r} (one of: {', '.join(frame.columns)})")
+        frame = frame.sort_values(field, ascending=not sort.startswith('-'), kind='stable', na_position='last')
+    page = frame.iloc[offset:offset + limit]
+    columns = {field: [None if pd.isna(value) else value for value in page[field].tolist()] for field in page.columns}
+    rows = columns if orient == 'columns' else [dict(zip(columns, values)) for values in zip(*columns.values())]
+    return {'rows': rows, 'total_groups': int(len(frame))}
+
+
+# The grouped endpoints as queries (see the *_records formatters below)
+ROOM_TYPE_QUERY = preset(['room_type'], {
+    'count': 'count', 'avg_price': 'mean:price', 'total_reviews': 'sum:reviews',
+    'avg_rating': 'mean:rating', 'avg_availability': 'mean:availability',
+})
+BOROUGH_QUERY = preset(['borough'], {
+    'listing_count': 'count', 'avg_price': 'mean:price', 'total_reviews': 'sum:reviews',
+    'avg_availability': 'mean:availability',
+})
+POLICY_QUERY = preset(['cancellation_policy'], {'count': 'count', 'avg_price': 'mean:price'})
+CONSTRUCTION_YEAR_QUERY = preset(['construction_year'], {'price_count': 'count:price', 'avg_price': 'mean:price'})
+
+
+def category_query(bucketing):
+    """Query behind get_category_breakdown"""
+    if bucketing not in BUCKETINGS:
+        raise ValueError(f"Unknown bucketing: {bucketing}")
+    return preset([bucketing], {'count': 'count', 'avg_price': 'mean:price'})
+
+
+def room_type_records(frame):
+    """get_room_type_comparison output"""
+    room_stats = frame.sort_values('count', ascending=False)
+    return room_stats.to_dict('records')
+
+
+def neighbourhood_records(frame, limit=15):
+    """get_neighbourhood_analysis output"""
+    neighbourhood_stats = frame.sort_values('listing_count', ascending=False).head(limit)
+    return neighbourhood_stats.to_dict('records')
+
+
+def policy_records(frame):
+    """get_cancellation_policy_distribution output"""
+    policy_dist = frame.rename(columns={'cancellation_policy': 'policy'}).sort_values('count', ascending=False)
+    return policy_dist.to_dict('records')
+
+
+def price_trend_columns(frame):
+    """get_price_trends_by_construction_year output"""
+    trends = frame[frame['price_count'] >= 3]  # Only years with 3+ listings
+    return {
+        'years': trends['construction_year'].astype(int).tolist(),
+        'avg_prices': trends['avg_price'].round(2).tolist(),
+        'counts': trends['price_count'].astype(np.int64).tolist()
+    }
+
+
+def breakdown_records(frame):
+    """get_category_breakdown output (buckets without listings are left out)"""
+    bucket = frame.columns[0]
+    return [
+        {'bucket': label, 'count': int(count), 'avg_price': float(price)}
+        for label, count, price in zip(frame[bucket], frame['count'], frame['avg_price'])
+    ]
@@ -0,0 +1,61 @@
+"""
+Columnar Response Formats
+Heavy tabular endpoints can answer with their columns ({field: list}) in a
+binary format instead of JSON records, chosen from the request's Accept
+header. Each field name is written once rather than on every row, and no
+per-row dicts are built. JSON stays the default.
+
+Formats (each offered only when its library is installed):
+- application/vnd.apache.arrow.stream: Arrow IPC stream of one record batch (pyarrow)
+- application/msgpack (or application/x-msgpack): MessagePack map of column arrays (msgpack)
+"""
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is optional; Arrow responses are not offered
+    pa = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; MessagePack responses are not offered
+    msgpack = None
+
+
+JSON_MIMETYPE = 'application/json'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+MSGPACK_MIMETYPES = ['application/msgpack', 'application/x-msgpack']
+
+
+def encode_arrow(columns):
+    """Arrow IPC stream bytes of {field: list}"""
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_msgpack(columns):
+    """MessagePack bytes of {field: list}"""
+    return msgpack.packb(columns, use_bin_type=True)
+
+
+def encoders():
+    """Binary mimetype -> encoder, for the installed libraries"""
+    available = {}
+    if msgpack is not None:
+        available.update({mimetype: encode_msgpack for mimetype in MSGPACK_MIMETYPES})
+    if pa is not None:
+        available[ARROW_MIMETYPE] = encode_arrow
+    return available
+
+
+def negotiate(accept):
+    """Mimetype to answer with for a werkzeug Accept header, JSON unless a binary format is preferred"""
+    # JSON is listed first so it wins ties such as '*/*'
+    return accept.best_match([JSON_MIMETYPE, *encoders()], default=JSON_MIMETYPE)
+
+
+def encode_columns(columns, mimetype):
+    """Encode {field: list} as mimetype (one of encoders())"""
+    return encoders()[mimetype](columns)
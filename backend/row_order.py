@@ -0,0 +1,31 @@
+"""
+Sorted Row Orders
+The filter, spatial and date indexes keep row positions sorted by a key
+(price, grid cell, review date). When a delta drops some rows and appends
+new ones, these orders are updated by dropping and renumbering positions and
+merging the new rows in, instead of sorting every row again.
+"""
+
+import numpy as np
+
+
+def new_positions(kept):
+    """Position of each old row in the updated rows (-1 for dropped rows)"""
+    return np.where(kept, np.cumsum(kept) - 1, -1)
+
+
+def updated_order(order, sorted_keys, kept, fresh_keys, fresh_rows):
+    """(order, sorted keys) after dropping the rows where kept is False and adding fresh_rows
+
+    order lists old row positions stably sorted by their keys (sorted_keys).
+    Kept rows are renumbered and fresh_rows (positions after every kept row)
+    merged in by fresh_keys. Ties stay in row order, so the result is what a
+    stable argsort of the updated rows would give.
+    """
+    remaining = kept[order]
+    order = new_positions(kept)[order[remaining]]
+    sorted_keys = sorted_keys[remaining]
+    fresh_order = np.argsort(fresh_keys, kind='stable')
+    fresh_keys, fresh_rows = fresh_keys[fresh_order], np.asarray(fresh_rows, dtype=order.dtype)[fresh_order]
+    at = np.searchsorted(sorted_keys, fresh_keys, side='right')
+    return np.insert(order, at, fresh_rows), np.insert(sorted_keys, at, fresh_keys)
@@ -0,0 +1,108 @@
+"""
+Quantile Sketch for Price Statistics
+Log-bucketed histogram in the style of DDSketch: a value x > 0 falls in
+bucket ceil(log_gamma(x)) with gamma = (1 + a) / (1 - a), and each bucket is
+represented by one value within a relative error a of everything in it.
+Bucket counts merge by addition, so per-cell sketches roll up like any other
+cube measure and their size does not grow with the number of rows.
+
+Error bounds, for a = relative_accuracy:
+- quantiles (median, p25, ...) are within a of the true value (relative)
+- histograms: only listings priced within a of a bin edge can be counted in
+  the neighbouring bin
+- counts, min and max are exact
+Values below min_value are bucketed as min_value; zero and negatives share
+an exact bucket at 0.
+"""
+
+import numpy as np
+
+
+# Default relative accuracy of price quantiles (0.5%)
+SKETCH_RELATIVE_ACCURACY = 0.005
+
+# Price percentiles reported by get_summary_stats, besides the median
+SUMMARY_PERCENTILES = {'price_p25': 0.25, 'price_p75': 0.75, 'price_p90': 0.9, 'price_p99': 0.99}
+PRICE_QUANTILE_LEVELS = [0.5, *SUMMARY_PERCENTILES.values()]
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=SKETCH_RELATIVE_ACCURACY, min_value=0.01, max_value=1e8):
+        """Bucket layout covering min_value..max_value at relative_accuracy"""
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        # Bucket 0 holds zero and negatives; bucket 1 starts at min_value
+        self.offset = int(np.ceil(np.log(min_value) / self.log_gamma)) - 1
+        self.size = int(np.ceil(np.log(max_value) / self.log_gamma)) - self.offset + 1
+        keys = np.arange(self.size)
+        self.values = np.where(keys == 0, 0.0, 2 * self.gamma ** (keys + self.offset) / (self.gamma + 1))
+
+    def buckets(self, values):
+        """Bucket of each value (-1 for NaN)"""
+        values = np.asarray(values, dtype=float)
+        keys = np.full(len(values), -1, dtype=np.intp)
+        positive = values > 0
+        keys[positive] = np.clip(np.ceil(np.log(values[positive]) / self.log_gamma) - self.offset, 1, self.size - 1)
+        keys[values <= 0] = 0
+        return keys
+
+    def counts(self, values):
+        """Sketch (bucket counts) of values, ignoring NaN"""
+        keys = self.buckets(values)
+        return np.bincount(keys[keys >= 0], minlength=self.size)
+
+    def quantiles(self, counts, qs):
+        """Quantiles qs of a sketch, interpolated between ranks like pandas' quantile()"""
+        n = int(counts.sum())
+        if n == 0:
+            return np.full(len(qs), np.nan)
+        cumulative = np.cumsum(counts)
+        ranks = np.asarray(qs, dtype=float) * (n - 1)
+        lower = self.values[np.searchsorted(cumulative, np.floor(ranks), side='right')]
+        upper = self.values[np.searchsorted(cumulative, np.ceil(ranks), side='right')]
+        return lower + (upper - lower) * (ranks - np.floor(ranks))
+
+    def histogram(self, counts, bins, low, high):
+        """(hist, edges) like np.histogram over [low, high] (the exact min and max)
+
+        Each bucket's count is spread evenly over the value range it covers
+        (clipped to [low, high]), so only listings priced within the relative
+        accuracy of a bin edge can be counted in the neighbouring bin.
+        """
+        present = np.flatnonzero(counts)
+        if len(present) == 0:
+            return np.histogram(np.empty(0), bins=bins)
+        edges = np.histogram_bin_edges(np.empty(0), bins=bins, range=(low, high))
+        keys = present + self.offset
+        lower = np.where(present == 0, 0.0, self.gamma ** (keys - 1))
+        upper = np.where(present == 0, 0.0, self.gamma ** keys)
+        lower, upper = np.clip(lower, low, high), np.clip(upper, low, high)
+        # Mass of each bucket below each edge, assuming values spread evenly in the bucket
+        width = upper - lower
+        below = np.clip((edges[:, None] - lower) / np.where(width > 0, width, 1), 0, 1)
+        below[:, width == 0] = edges[:, None] > lower[width == 0]
+        cumulative = np.rint(below @ counts[present].astype(float))
+        cumulative[0], cumulative[-1] = 0, counts.sum()
+        return np.diff(cumulative), edges
+
+# Sketch layout shared by the data cube and the row path
+PRICE_SKETCH = QuantileSketch()
+
+
+def price_quantile_fields(values, exact):
+    """Summary fields from [median, *SUMMARY_PERCENTILES] values"""
+    fields = {'median_price': float(values[0] if exact else round(values[0], 2))}
+    for name, value in zip(SUMMARY_PERCENTILES, values[1:]):
+        fields[name] = float(round(value, 2))
+    fields['price_quantile_error'] = 0.0 if exact else PRICE_SKETCH.relative_accuracy
+    return fields
+
+
+def histogram_response(hist, edges):
+    """Histogram in the shape returned by get_price_distribution"""
+    return {
+        'bins': [f"${int(edges[i])}-${int(edges[i+1])}" for i in range(len(edges)-1)],
+        'counts': np.asarray(hist).astype(np.int64).tolist(),
+        'bin_edges': edges.tolist()
+    }
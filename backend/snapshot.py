@@ -0,0 +1,248 @@
+"""
+Preprocessed Snapshot Cache
+Stores the finished df_clean next to the source CSV so startups can skip
+parsing and cleaning. Snapshots are keyed on a hash of the CSV contents plus
+SNAPSHOT_VERSION, so a changed CSV (or pipeline) triggers a rebuild.
+
+Usage:
+    python snapshot.py build [csv_path]    # prebuild at deploy time
+    python snapshot.py info [csv_path]
+    python snapshot.py memory [csv_path]  # df_clean memory by column
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from data_processor import AirbnbDataProcessor
+from metrics import phase
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional; fall back to pickle snapshots
+    pa = feather = None
+
+
+# Bump whenever clean_data / compact change their output or the file layout changes (derived columns are not stored)
+SNAPSHOT_VERSION = 4
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(__file__), 'data', 'Airbnb_Open_Data.csv')
+INDEX_COLUMN = '__index__'
+
+
+def source_hash(csv_path):
+    """Hash the CSV contents together with the snapshot version"""
+    digest = hashlib.sha256(f"v{SNAPSHOT_VERSION}:".encode())
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def snapshot_dir(csv_path):
+    """Directory holding snapshots (SNAPSHOT_DIR env var overrides)"""
+    return os.getenv('SNAPSHOT_DIR') or os.path.join(os.path.dirname(os.path.abspath(csv_path)), '.snapshots')
+
+
+def snapshot_prefix(csv_path):
+    """Start of the snapshot file names of csv_path: its name plus a hash of its absolute path
+
+    The hash keeps CSVs with the same name in different directories (e.g.
+    every city's listings.csv) apart in a shared SNAPSHOT_DIR.
+    """
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    path_hash = hashlib.sha256(os.path.abspath(csv_path).encode()).hexdigest()[:8]
+    return f"{stem}-{path_hash}-"
+
+
+def snapshot_path(csv_path, key=None):
+    """Path of the snapshot file for the current CSV contents"""
+    key = key or source_hash(csv_path)
+    ext = 'feather' if feather is not None else 'pkl'
+    return os.path.join(snapshot_dir(csv_path), f"{snapshot_prefix(csv_path)}{key}.{ext}")
+
+
+def arrow_table(df):
+    """df (with its index as a column) as one Arrow record batch that reads back without copies
+
+    Missing floats and dates are stored as NaN/NaT values instead of nulls,
+    since a column with nulls has to be copied to fill them in on load.
+    """
+    df = df.rename_axis(INDEX_COLUMN).reset_index()
+    table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if column.null_count and (pa.types.is_floating(field.type) or pa.types.is_timestamp(field.type)):
+            values = pa.py_buffer(np.ascontiguousarray(df[field.name].to_numpy()))
+            table = table.set_column(i, field, pa.Array.from_buffers(field.type, len(df), [None, values]))
+    return table
+
+
+def write_snapshot(df, path):
+    """Write df_clean to a columnar file (atomically)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    if feather is not None:
+        # Uncompressed and in a single chunk, so columns can be memory-mapped on load
+        table = arrow_table(df)
+        feather.write_feather(table, tmp_path, compression='uncompressed', chunksize=max(len(table), 1))
+    else:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_snapshot(path):
+    """Read a snapshot written by write_snapshot
+
+    Numeric, date and category-code columns are views of the memory-mapped
+    file rather than copies, so processes reading the same snapshot share
+    those pages through the page cache. Only strings (and categories with
+    missing values) are copied.
+    """
+    if path.endswith('.feather'):
+        table = feather.read_table(path, memory_map=True)
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+        # Moving the index column over (set_index would copy every column)
+        df.index = pd.Index(df.pop(INDEX_COLUMN).to_numpy())
+        return df
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def remove_stale_snapshots(csv_path, keep):
+    """Delete older snapshots of the same CSV (not those of other CSVs with the same name)"""
+    directory = snapshot_dir(csv_path)
+    prefix = snapshot_prefix(csv_path)
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(prefix) and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def build_processor(csv_path, chunksize=0):
+    """Run the full CSV pipeline (chunked when chunksize > 0)"""
+    processor = AirbnbDataProcessor(csv_path)
+    if chunksize:
+        print(f"Loading data in chunks of {chunksize}...")
+        with phase('load_streaming'):
+            processor.load_streaming(chunksize=chunksize)
+    else:
+        print("Loading data...")
+        with phase('load_data'):
+            processor.load_data()
+        print("Cleaning data...")
+        with phase('clean_data'):
+            processor.clean_data()
+    print("Compacting data...")
+    with phase('compact'):
+        processor.compact()
+    return processor
+
+
+def build_snapshot(csv_path, chunksize=0):
+    """Rebuild the snapshot for csv_path and return (processor, path)"""
+    processor = build_processor(csv_path, chunksize)
+    path = write_snapshot(processor.df_clean, snapshot_path(csv_path))
+    remove_stale_snapshots(csv_path, keep=path)
+    return processor, path
+
+
+def snapshot_processor(csv_path, path, key):
+    """Processor for csv_path with df_clean read from the snapshot at path, tagged key"""
+    print(f"Loading snapshot {os.path.basename(path)}...")
+    processor = AirbnbDataProcessor(csv_path)
+    with phase('read_snapshot'):
+        processor.df_clean = read_snapshot(path)
+        processor.update_review_recency()
+    processor.data_tag = key
+    return processor
+
+
+def save_snapshot(processor, csv_path, path):
+    """Write the snapshot of a freshly built processor; the path written, or None if it could not be"""
+    try:
+        path = write_snapshot(processor.df_clean, path)
+        remove_stale_snapshots(csv_path, keep=path)
+        return path
+    except OSError as e:
+        # Read-only filesystems (e.g. serverless) just skip the snapshot
+        print(f"Could not write snapshot: {e}")
+        return None
+
+
+def ensure_snapshot(csv_path, chunksize=0):
+    """Bring the snapshot of csv_path up to date without reading it
+
+    Returns (path, key, None), or (None, key, processor) with the built
+    processor when the snapshot cannot be written.
+    """
+    key = source_hash(csv_path)
+    path = snapshot_path(csv_path, key)
+    if os.path.exists(path):
+        return path, key, None
+    processor = build_processor(csv_path, chunksize)
+    processor.data_tag = key
+    path = save_snapshot(processor, csv_path, path)
+    return (path, key, None) if path is not None else (None, key, processor)
+
+
+def load_processor(csv_path, use_snapshot=True, chunksize=0):
+    """Get a ready processor, from the snapshot when it is up to date (tagged with the CSV's hash)"""
+    key = source_hash(csv_path)
+    if not use_snapshot:
+        processor = build_processor(csv_path, chunksize)
+        processor.data_tag = key
+        return processor
+
+    path = snapshot_path(csv_path, key)
+    if os.path.exists(path):
+        try:
+            return snapshot_processor(csv_path, path, key)
+        except Exception as e:
+            print(f"Snapshot unreadable ({e}), rebuilding")
+
+    processor = build_processor(csv_path, chunksize)
+    processor.data_tag = key
+    save_snapshot(processor, csv_path, path)
+    return processor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage preprocessed dataset snapshots")
+    parser.add_argument('command', choices=['build', 'info', 'memory'])
+    parser.add_argument('csv_path', nargs='?', default=DEFAULT_CSV_PATH)
+    parser.add_argument('--chunksize', type=int, default=0, help="stream the CSV in chunks of this many rows")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        processor, path = build_snapshot(args.csv_path, args.chunksize)
+        print(f"Snapshot written: {path} ({len(processor.df_clean)} listings)")
+    elif args.command == 'memory':
+        report = load_processor(args.csv_path, chunksize=args.chunksize).memory_report()
+        print(f"{report['rows']} rows, {report['total_bytes'] / 1024 ** 2:.1f} MB")
+        for item in report['columns']:
+            print(f"  {item['column']:<35} {item['dtype']:<15} {item['bytes'] / 1024 ** 2:8.2f} MB")
+    else:
+        path = snapshot_path(args.csv_path)
+        status = 'up to date' if os.path.exists(path) else 'missing'
+        print(f"{path}: {status}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+Spatial Index for the Airbnb Dataset
+Grid index over lat_clean/long_clean so map queries only touch listings in
+the viewport, plus per-zoom cluster tables for low zoom levels
+"""
+
+import numpy as np
+
+from row_order import updated_order
+
+
+# Below this zoom level, crowded viewports are returned as clusters
+CLUSTER_MAX_ZOOM = 15
+
+# Grid level used to index individual listings (~150m cells)
+ROW_GRID_LEVEL = 16
+
+
+def cell_degrees(level):
+    """Grid cell size in degrees; roughly a quarter map tile at zoom == level"""
+    return 360.0 / 2 ** (level + 2)
+
+
+def parse_bbox(value):
+    """Parse 'west,south,east,north' (Leaflet's toBBoxString order)"""
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError("bbox must be 'west,south,east,north'")
+    if south > north or west > east:
+        raise ValueError("bbox must be 'west,south,east,north'")
+    return west, south, east, north
+
+
+class Grid:
+    def __init__(self, level):
+        """Equal-angle lat/lng grid at a zoom-like level"""
+        self.level = level
+        self.cell = cell_degrees(level)
+        self.width = 2 ** (level + 2)
+        self.height = 2 ** (level + 1)
+
+    def keys(self, lat, lng):
+        """Cell key (row-major) of each point"""
+        gy = np.floor((np.asarray(lat) + 90) / self.cell).astype(np.int64)
+        gx = np.floor((np.asarray(lng) + 180) / self.cell).astype(np.int64)
+        return np.clip(gy, 0, self.height - 1) * self.width + np.clip(gx, 0, self.width - 1)
+
+    def bounds(self, bbox):
+        """(first row, last row, first column, last column) of the cells intersecting bbox"""
+        west, south, east, north = bbox
+        gy0, gy1 = (min(max(int(np.floor((v + 90) / self.cell)), 0), self.height - 1) for v in (south, north))
+        gx0, gx1 = (min(max(int(np.floor((v + 180) / self.cell)), 0), self.width - 1) for v in (west, east))
+        return gy0, gy1, gx0, gx1
+
+    def span(self, keys, bbox):
+        """Positions in the sorted keys array of every cell intersecting bbox"""
+        gy0, gy1, gx0, gx1 = self.bounds(bbox)
+        # One binary search per grid row in view
+        rows = np.arange(gy0, gy1 + 1, dtype=np.int64) * self.width
+        starts = np.searchsorted(keys, rows + gx0, side='left')
+        stops = np.searchsorted(keys, rows + gx1, side='right')
+        lengths = stops - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.intp)
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return offsets + np.arange(total)
+
+
+def aggregate_cells(grid, rows, lat, lng, price):
+    """Sorted cell keys with count, coordinate sums and price sum of rows"""
+    keys = grid.keys(lat[rows], lng[rows])
+    order = np.argsort(keys, kind='stable')
+    keys, first, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    ordered = rows[order]
+    if len(keys) == 0:
+        empty = np.empty(0)
+        return keys, counts, empty, empty, empty
+    return (keys, counts,
+            np.add.reduceat(lat[ordered], first),
+            np.add.reduceat(lng[ordered], first),
+            np.add.reduceat(price[ordered], first))
+
+
+def combine_cells(parts, signs):
+    """Cell aggregates of several row sets added up by key (sign -1 subtracts a set), empty cells dropped"""
+    keys, inverse = np.unique(np.concatenate([part[0] for part in parts]), return_inverse=True)
+    sums = [np.bincount(inverse, weights=np.concatenate([sign * part[i] for part, sign in zip(parts, signs)]),
+                        minlength=len(keys))
+            for i in range(1, 5)]
+    count = np.rint(sums[0]).astype(np.int64)
+    present = count > 0
+    return (keys[present], count[present], *(column[present] for column in sums[1:]))
+
+
+def cluster_records(count, lat_sum, lng_sum, price_sum):
+    """Cluster centroids with counts and average price"""
+    return [
+        {'lat': float(lat), 'lng': float(lng), 'count': int(n), 'avg_price': round(float(price), 2)}
+        for lat, lng, n, price in zip(lat_sum / count, lng_sum / count, count, price_sum / count)
+    ]
+
+
+class SpatialIndex:
+    def __init__(self, df):
+        """Index listings by grid cell and pre-aggregate clusters per zoom level"""
+        self.size = len(df)
+        self.lat = df['lat_clean'].to_numpy(dtype=float)
+        self.lng = df['long_clean'].to_numpy(dtype=float)
+        self.price = df['price_clean'].to_numpy(dtype=float)
+        all_rows = np.arange(self.size)
+
+        self.grid = Grid(ROW_GRID_LEVEL)
+        keys = self.grid.keys(self.lat, self.lng)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+        self.levels = []
+        for zoom in range(CLUSTER_MAX_ZOOM):
+            grid = Grid(zoom)
+            self.levels.append((grid, aggregate_cells(grid, all_rows, self.lat, self.lng, self.price)))
+
+    def updated(self, kept, fresh):
+        """Index of the rows where kept is set followed by the rows of fresh, updated from this one
+
+        Clusters of each zoom level subtract the dropped rows and add the new
+        ones per cell instead of aggregating every row again.
+        """
+        index = SpatialIndex.__new__(SpatialIndex)
+        n_kept = int(np.count_nonzero(kept))
+        index.size = n_kept + len(fresh)
+        index.lat = np.concatenate([self.lat[kept], fresh['lat_clean'].to_numpy(dtype=float)])
+        index.lng = np.concatenate([self.lng[kept], fresh['long_clean'].to_numpy(dtype=float)])
+        index.price = np.concatenate([self.price[kept], fresh['price_clean'].to_numpy(dtype=float)])
+        fresh_rows = n_kept + np.arange(len(fresh))
+
+        index.grid = self.grid
+        fresh_keys = self.grid.keys(index.lat[fresh_rows], index.lng[fresh_rows])
+        index.order, index.keys = updated_order(self.order, self.keys, kept, fresh_keys, fresh_rows)
+
+        dropped = np.flatnonzero(~kept)
+        index.levels = []
+        for grid, cells in self.levels:
+            removed = aggregate_cells(grid, dropped, self.lat, self.lng, self.price)
+            added = aggregate_cells(grid, fresh_rows, index.lat, index.lng, index.price)
+            index.levels.append((grid, combine_cells([cells, removed, added], [1, -1, 1])))
+        return index
+
+    def query(self, bbox):
+        """Ascending row positions inside bbox"""
+        west, south, east, north = bbox
+        rows = self.order[self.grid.span(self.keys, bbox)]
+        lat, lng = self.lat[rows], self.lng[rows]
+        inside = (lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)
+        return np.sort(rows[inside])
+
+    def edge_rows(self, grid, bbox):
+        """Ascending positions of the rows inside bbox that fall in cells of grid on the edge of bbox"""
+        west, south, east, north = bbox
+        gy0, gy1, gx0, gx1 = grid.bounds(bbox)
+        # Strips of bbox around the cells wholly inside it (padded; rows are then kept by their cell)
+        pad = grid.cell * 1e-6
+        inner_south, inner_north = (gy0 + 1) * grid.cell - 90 + pad, gy1 * grid.cell - 90 - pad
+        inner_west, inner_east = (gx0 + 1) * grid.cell - 180 + pad, gx1 * grid.cell - 180 - pad
+        strips = [(west, south, east, min(north, inner_south)), (west, max(south, inner_north), east, north),
+                  (west, south, min(east, inner_west), north), (max(west, inner_east), south, east, north)]
+        rows = np.unique(np.concatenate([self.query(strip) for strip in strips
+                                         if strip[1] <= strip[3] and strip[0] <= strip[2]]
+                                        or [np.empty(0, dtype=np.intp)]))
+        gy, gx = np.divmod(grid.keys(self.lat[rows], self.lng[rows]), grid.width)
+        return rows[(gy == gy0) | (gy == gy1) | (gx == gx0) | (gx == gx1)]
+
+    def clusters(self, bbox, zoom):
+        """Clusters of the listings inside bbox at zoom (< CLUSTER_MAX_ZOOM)
+
+        Cells wholly inside bbox come from the pre-aggregated tables; cells on
+        its edge are aggregated from their rows inside bbox, so listings out of
+        view are not counted.
+        """
+        grid, (keys, count, lat_sum, lng_sum, price_sum) = self.levels[min(max(int(zoom), 0), CLUSTER_MAX_ZOOM - 1)]
+        cells = grid.span(keys, bbox)
+        gy0, gy1, gx0, gx1 = grid.bounds(bbox)
+        gy, gx = np.divmod(keys[cells], grid.width)
+        inner = cells[(gy > gy0) & (gy < gy1) & (gx > gx0) & (gx < gx1)]
+        edge = aggregate_cells(grid, self.edge_rows(grid, bbox), self.lat, self.lng, self.price)
+        merged = [np.concatenate(parts) for parts in zip(
+            (keys[inner], count[inner], lat_sum[inner], lng_sum[inner], price_sum[inner]), edge)]
+        order = np.argsort(merged[0], kind='stable')
+        return cluster_records(*(column[order] for column in merged[1:]))
+
+    def cluster_rows(self, rows, zoom):
+        """Aggregate an arbitrary set of rows into clusters at zoom"""
+        grid = Grid(min(max(int(zoom), 0), CLUSTER_MAX_ZOOM - 1))
+        _, count, lat_sum, lng_sum, price_sum = aggregate_cells(grid, rows, self.lat, self.lng, self.price)
+        return cluster_records(count, lat_sum, lng_sum, price_sum)
@@ -0,0 +1,34 @@
+"""Summaries rolled up from the data cube match summaries scanned from rows"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from data_processor import AirbnbDataProcessor
+from synthetic_data import generate_chunk
+
+
+# Fields taken from the same totals either way (price quantiles come from sketches on the cube)
+EXACT_FIELDS = ['total_listings', 'average_price', 'total_reviews', 'average_rating', 'average_availability',
+                'average_occupancy_rate', 'total_hosts', 'verified_hosts']
+
+
+@pytest.fixture(scope='module')
+def processor():
+    result = AirbnbDataProcessor('unused.csv')
+    result.df_clean = result.clean_frame(generate_chunk(0, 5000, 5000, 3))
+    result.build_indexes()
+    return result
+
+
+def test_cube_matches_rows_for_every_categorical_filter(processor):
+    lookup = processor.filter_index.lookup
+    options = {param: [None, *lookup[param]] for param in lookup}
+    for values in itertools.product(*options.values()):
+        filters = {param: value for param, value in zip(options, values) if value is not None}
+        view = processor.apply_filters(filters) if filters else processor
+        assert view.cube_slice() is not None
+        cube, rows = view.get_summary_stats(), view.get_summary_stats(exact=True)
+        np.testing.assert_equal({field: cube[field] for field in EXACT_FIELDS},
+                                {field: rows[field] for field in EXACT_FIELDS}, err_msg=str(filters))
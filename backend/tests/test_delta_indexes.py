@@ -0,0 +1,52 @@
+"""Indexes updated by apply_delta match indexes built from scratch"""
+
+import numpy as np
+import pytest
+
+from data_processor import AirbnbDataProcessor
+from date_index import DateIndex
+from filter_index import FilterIndex
+from spatial_index import SpatialIndex
+from synthetic_data import generate_chunk
+
+
+@pytest.fixture(scope='module')
+def updated():
+    raw = generate_chunk(0, 5000, 5000, 1)
+    processor = AirbnbDataProcessor('synthetic.csv')
+    processor.df_clean = processor.clean_frame(raw.copy())
+    processor.create_calculated_fields()
+    processor.build_indexes()
+    delta = generate_chunk(0, 1000, 1000, 7)
+    delta['id'] = np.r_[raw['id'].to_numpy()[:500], np.arange(10 ** 8, 10 ** 8 + 500)]
+    delta['action'] = np.where(np.arange(1000) % 5 == 0, 'delete', 'upsert')
+    return processor.apply_delta(delta)[0]
+
+
+def test_filter_index(updated):
+    index, fresh = updated.filter_index, FilterIndex(updated.df_clean)
+    for param in fresh.lookup:
+        expected = {value: list(fresh.rows[param][code]) for value, code in fresh.lookup[param].items()}
+        actual = {value: sorted(index.rows[param][code]) for value, code in index.lookup[param].items()
+                  if len(index.rows[param][code])}
+        assert actual == {value: rows for value, rows in expected.items() if rows}
+    for column in fresh.order:
+        np.testing.assert_array_equal(index.order[column], fresh.order[column])
+        np.testing.assert_array_equal(index.sorted_values[column], fresh.sorted_values[column])
+
+
+def test_spatial_index(updated):
+    index, fresh = updated.spatial_index, SpatialIndex(updated.df_clean)
+    np.testing.assert_array_equal(index.order, fresh.order)
+    for (_, cells), (_, expected) in zip(index.levels, fresh.levels):
+        np.testing.assert_array_equal(cells[0], expected[0])
+        np.testing.assert_array_equal(cells[1], expected[1])
+        for column, expected_column in zip(cells[2:], expected[2:]):
+            np.testing.assert_allclose(column, expected_column)
+
+
+def test_date_index(updated):
+    index, fresh = updated.date_index, DateIndex(updated.df_clean)
+    np.testing.assert_array_equal(index.order, fresh.order)
+    np.testing.assert_array_equal(index.priced_prefix, fresh.priced_prefix)
+    np.testing.assert_allclose(index.price_prefix, fresh.price_prefix)
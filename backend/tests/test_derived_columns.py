@@ -0,0 +1,41 @@
+"""Derived columns are computed on copies that are swapped in, never written to a frame being read"""
+
+import numpy as np
+
+from data_processor import AirbnbDataProcessor
+from synthetic_data import generate_chunk
+
+
+def processor():
+    result = AirbnbDataProcessor('unused.csv')
+    result.df_clean = result.clean_frame(generate_chunk(0, 500, 500))
+    return result
+
+
+def test_require_leaves_the_held_frame_unchanged():
+    parent = processor()
+    held = parent.df_clean
+    df = parent.require('total_price', 'occupancy_rate')
+    assert 'total_price' in df.columns and 'occupancy_rate' in df.columns
+    assert 'total_price' not in held.columns
+    assert parent.df_clean is df
+
+
+def test_view_derives_on_the_parent_frame():
+    parent = processor()
+    view = parent.apply_filters({'price_min': '100'})
+    held = parent.df_clean
+    df = view.require('total_price')
+    assert 'total_price' in parent.derived_columns()
+    assert 'total_price' not in held.columns
+    expected = parent.df_clean['total_price'].take(view.selection).to_numpy()
+    np.testing.assert_array_equal(df['total_price'].to_numpy(), expected)
+
+
+def test_evicted_columns_are_recomputed():
+    parent = processor()
+    parent.require('total_price')
+    assert parent.evict_columns() == ['total_price']
+    assert parent.derived_columns() == []
+    assert 'total_price' in parent.apply_filters({'price_min': '100'}).require('total_price').columns
+    assert parent.derived_columns() == ['total_price']
@@ -0,0 +1,18 @@
+"""rank_order picks the k largest counts like a stable descending sort"""
+
+import numpy as np
+import pytest
+
+from host_index import rank_order
+
+
+@pytest.mark.parametrize('k', [0, 1, 3, 5, 6, 100])
+def test_rank_order_matches_stable_sort(k):
+    counts = np.array([3, 7, 7, 1, 3, 9])
+    expected = np.argsort(-counts, kind='stable')[:k]
+    np.testing.assert_array_equal(rank_order(counts, k), expected)
+
+
+@pytest.mark.parametrize('k', [-1, -10])
+def test_rank_order_negative_k_is_empty(k):
+    assert len(rank_order(np.array([3, 7, 1]), k)) == 0
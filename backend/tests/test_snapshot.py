@@ -0,0 +1,81 @@
+"""Snapshots round-trip df_clean, load numeric columns from the memory-mapped file (also for partitions
+loaded in parallel) and never collide"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from partitions import load_partitions
+from snapshot import load_processor, read_snapshot, remove_stale_snapshots, snapshot_path, write_snapshot
+from synthetic_data import generate_chunk
+
+
+def cleaned_frame():
+    return pd.DataFrame({
+        'price_clean': [120.0, 80.5, 999.0, 45.0],
+        'service_fee_clean': np.array([10.0, np.nan, 30.0, np.nan], dtype=np.float32),
+        'last_review_date': pd.to_datetime(['2019-05-21', None, '2021-12-31', '2015-01-01']),
+        'room_type_clean': pd.Categorical(['Private room', 'Entire home/apt', 'Private room', 'Shared room']),
+        'id': np.array([1, 2, 3, 4], dtype=np.int32),
+    }, index=[7, 3, 11, 0])
+
+
+def mapped(array, path):
+    """Whether array's data lies in a memory mapping of path"""
+    address = array.__array_interface__['data'][0]
+    with open('/proc/self/maps') as f:
+        for line in f:
+            if line.rstrip().endswith(path):
+                low, high = (int(value, 16) for value in line.split()[0].split('-'))
+                if low <= address < high:
+                    return True
+    return False
+
+
+def test_round_trip(tmp_path):
+    df = cleaned_frame()
+    back = read_snapshot(write_snapshot(df, str(tmp_path / 'listings-key.feather')))
+    pd.testing.assert_frame_equal(back, df)
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/maps'), reason="needs /proc/self/maps")
+def test_columns_are_not_copied(tmp_path):
+    path = write_snapshot(cleaned_frame(), str(tmp_path / 'listings-key.feather'))
+    df = read_snapshot(path)
+    for column in ['price_clean', 'service_fee_clean', 'last_review_date', 'id']:
+        assert mapped(df[column].to_numpy(), path), column
+    assert mapped(df['room_type_clean'].cat.codes.to_numpy(), path)
+    assert mapped(df.index.to_numpy(), path)
+
+
+def test_same_named_csvs_keep_their_own_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setenv('SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    paths = []
+    for city in ['boston', 'austin']:
+        (tmp_path / city).mkdir()
+        csv_path = str(tmp_path / city / 'listings.csv')
+        with open(csv_path, 'w') as f:
+            f.write(f"id,city\n1,{city}\n")
+        paths.append(snapshot_path(csv_path))
+        write_snapshot(cleaned_frame(), paths[-1])
+        remove_stale_snapshots(csv_path, keep=paths[-1])
+    assert paths[0] != paths[1]
+    assert all(os.path.exists(path) for path in paths)
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/maps'), reason="needs /proc/self/maps")
+def test_parallel_partitions_are_memory_mapped(tmp_path):
+    sources = {}
+    for seed, city in enumerate(['boston', 'austin']):
+        (tmp_path / city).mkdir()
+        sources[city] = str(tmp_path / city / 'listings.csv')
+        generate_chunk(0, 500, 500, seed).to_csv(sources[city], index=False)
+    processors = load_partitions(sources, use_snapshot=True, workers=2)
+    for city, csv_path in sources.items():
+        df = processors[city].df_clean
+        assert mapped(df['price_clean'].to_numpy(), snapshot_path(csv_path)), city
+        pd.testing.assert_frame_equal(df, load_processor(csv_path).df_clean)
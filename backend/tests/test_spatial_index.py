@@ -0,0 +1,38 @@
+"""Viewport clusters only count the listings inside the viewport"""
+
+import numpy as np
+import pytest
+
+from data_processor import AirbnbDataProcessor
+from spatial_index import CLUSTER_MAX_ZOOM, SpatialIndex
+from synthetic_data import generate_chunk
+
+
+@pytest.fixture(scope='module')
+def index():
+    df = AirbnbDataProcessor('unused.csv').clean_frame(generate_chunk(0, 20000, 20000, 5))
+    return SpatialIndex(df)
+
+
+BBOXES = [
+    (-74.05, 40.65, -73.90, 40.80),
+    (-73.99, 40.70, -73.95, 40.76),
+    (-74.30, 40.45, -73.65, 40.95),
+    (-73.9801, 40.7502, -73.9799, 40.7504),
+    (10.0, 10.0, 11.0, 11.0),
+]
+
+
+@pytest.mark.parametrize('bbox', BBOXES)
+@pytest.mark.parametrize('zoom', range(0, CLUSTER_MAX_ZOOM, 2))
+def test_clusters_match_rows_in_view(index, bbox, zoom):
+    expected = index.cluster_rows(index.query(bbox), zoom)
+    clusters = index.clusters(bbox, zoom)
+    assert [cluster['count'] for cluster in clusters] == [cluster['count'] for cluster in expected]
+    for field in ['lat', 'lng', 'avg_price']:
+        np.testing.assert_allclose([cluster[field] for cluster in clusters], [cluster[field] for cluster in expected])
+
+
+def test_clusters_total_is_listings_in_view(index):
+    bbox = BBOXES[1]
+    assert sum(cluster['count'] for cluster in index.clusters(bbox, 8)) == len(index.query(bbox))
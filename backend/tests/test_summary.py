@@ -0,0 +1,55 @@
+"""Summary price quantiles come from the same source as the price histogram of the same rows,
+and means round like the original Series.mean() based get_summary_stats"""
+
+import numpy as np
+import pytest
+
+from data_processor import AirbnbDataProcessor
+from partitions import PartitionedProcessor
+from synthetic_data import generate_chunk
+
+
+def processor(seed=0):
+    result = AirbnbDataProcessor('unused.csv')
+    result.df_clean = result.clean_frame(generate_chunk(0, 2000, 2000, seed))
+    result.build_indexes()
+    return result
+
+
+@pytest.mark.parametrize('filters', [{'price_min': '200', 'price_max': '800'}, {'min_reviews': '10'}])
+def test_scanned_rows_give_exact_quantiles(filters):
+    view = processor().apply_filters(filters)
+    prices = view.df_clean['price_clean']
+    summary = view.get_summary_stats()
+    assert summary['price_quantile_error'] == 0.0
+    assert summary['median_price'] == float(prices.median())
+    histogram = view.get_price_distribution(20)
+    assert histogram['counts'] == np.histogram(prices, bins=20)[0].tolist()
+
+
+def test_cube_answers_give_sketch_quantiles():
+    view = processor().apply_filters({'borough': 'Brooklyn'})
+    summary = view.get_summary_stats()
+    assert summary['price_quantile_error'] > 0
+    assert summary['median_price'] == pytest.approx(view.df_clean['price_clean'].median(),
+                                                    rel=summary['price_quantile_error'])
+    assert view.get_summary_stats(exact=True)['price_quantile_error'] == 0.0
+
+
+def test_partitions_merge_exact_quantiles():
+    cities = PartitionedProcessor({'a': processor(0), 'b': processor(1)})
+    view = cities.apply_filters({'price_min': '100'})
+    prices = np.concatenate([part.df_clean['price_clean'].to_numpy() for part in view.partitions.values()])
+    summary = view.get_summary_stats()
+    assert summary['price_quantile_error'] == 0.0
+    assert summary['median_price'] == float(np.median(prices))
+
+
+def test_scanned_means_round_like_series_mean():
+    # 113 / 40 = 2.825: numpy rounds the np.float64 mean to 2.82, Python's round on a float gives 2.83
+    df = AirbnbDataProcessor('unused.csv').clean_frame(generate_chunk(0, 40, 40, 0))
+    df['review_rate_clean'] = [3.0] * 33 + [2.0] * 7
+    result = AirbnbDataProcessor('unused.csv')
+    result.df_clean = df
+    summary = result.get_summary_stats(exact=True)
+    assert summary['average_rating'] == float(round(df['review_rate_clean'].mean(), 2)) == 2.82
@@ -0,0 +1,102 @@
+"""Vectorized cleaning matches the legacy per-row apply versions; streaming loads match classic ones"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processor import AirbnbDataProcessor
+from derived_columns import category_column, days_since_review, listing_age, total_price
+from legacy_apply import (LEGACY_CATEGORIES, clean_price, legacy_category, legacy_days_since_review,
+                          legacy_listing_age)
+from synthetic_data import generate_chunk
+
+
+PRICE_STRINGS = ['$1,234', '$1,105 ', ' $50 ', '$0', '966', '1,000.50', '$12.5', '1e3', '',
+                 'abc', '$', 'N/A', '$1,2,3', '--5', np.nan, None, '$1,234']
+
+PRICE_CASES = {
+    'strings': pd.Series(PRICE_STRINGS, dtype=object),
+    'mixed': pd.Series([1234, 56.5, '$1,234', np.nan, 'free', 7], dtype=object),
+    'float': pd.Series([1.0, np.nan, 250.75, 0.0, -3.0]),
+    'int': pd.Series([1, 250, 0, 9999]),
+    'all-missing': pd.Series([np.nan, None], dtype=object),
+    'empty': pd.Series([], dtype=object),
+}
+
+
+@pytest.fixture
+def processor():
+    return AirbnbDataProcessor('unused.csv')
+
+
+@pytest.mark.parametrize('case', PRICE_CASES)
+def test_clean_price_series_matches_apply(processor, case):
+    prices = PRICE_CASES[case]
+    expected = prices.apply(clean_price).astype(float)
+    pd.testing.assert_series_equal(processor.clean_price_series(prices), expected)
+
+
+def test_clean_price_series_keeps_index(processor):
+    prices = pd.Series(['$1,234', 'abc', np.nan], index=[10, 3, 7], dtype=object)
+    cleaned = processor.clean_price_series(prices)
+    assert list(cleaned.index) == [10, 3, 7]
+    assert cleaned[10] == 1234.0
+    assert np.isnan(cleaned[3]) and np.isnan(cleaned[7])
+
+
+def test_service_fee_and_total_price_match_apply(processor):
+    fees = pd.Series(['$10', np.nan, '$1,001', 'n/a', ' $0 '], dtype=object)
+    prices = pd.Series(['$100', '$1,234', '$5', '$60', 'oops'], dtype=object)
+    df = pd.DataFrame({'price_clean': processor.clean_price_series(prices),
+                       'service_fee_clean': processor.clean_price_series(fees)})
+    expected = prices.apply(clean_price) + fees.apply(clean_price).fillna(0)
+    pd.testing.assert_series_equal(total_price(df), expected, check_names=False)
+
+
+def category_frame():
+    """Cleaned columns covering every bucket boundary, NaN and out-of-range values"""
+    values = [np.nan, -1.0, 0.0, 0.49, 0.5, 1.0, 1.49, 1.5, 2.0, 3.0, 3.99, 4.0, 4.49, 4.5, 5.0,
+              10.0, 11.0, 99.99, 100.0, 199.99, 200.0, 499.99, 500.0, 1234.0]
+    return pd.DataFrame({column: values for column, _ in LEGACY_CATEGORIES.values()})
+
+
+@pytest.mark.parametrize('name', LEGACY_CATEGORIES)
+def test_category_columns_match_apply(name):
+    df = category_frame()
+    vectorized = pd.Series(category_column(df, name), index=df.index).astype(str)
+    pd.testing.assert_series_equal(vectorized, legacy_category(df, name).astype(str), check_names=False)
+
+
+def test_listing_age_matches_apply():
+    year = pd.Timestamp.now().year
+    df = pd.DataFrame({'construction_year_clean': [year - 5, year, year + 1, year - 100, year - 101,
+                                                   np.nan, 1985.0]})
+    pd.testing.assert_series_equal(listing_age(df), legacy_listing_age(df), check_names=False)
+
+
+def test_days_since_review_matches_apply():
+    df = pd.DataFrame({'last_review_date': pd.to_datetime(
+        ['2019-05-21', None, '2021-12-31', 'not a date', '2015-01-01'], errors='coerce')})
+    expected = legacy_days_since_review(df, pd.Timestamp.now()).astype(float)
+    pd.testing.assert_series_equal(days_since_review(df).astype(float), expected, check_names=False)
+
+
+@pytest.mark.parametrize('blank_ids', [False, True])
+@pytest.mark.parametrize('chunksize', [700, 5000])
+def test_streaming_load_matches_classic(tmp_path, chunksize, blank_ids):
+    csv_path = str(tmp_path / 'listings.csv')
+    raw = generate_chunk(0, 3000, 3000)
+    if blank_ids:
+        # Blank ids in one chunk only; read_csv then infers floats for the whole column
+        raw.loc[10:15, 'id'] = np.nan
+        raw.loc[20:25, 'host id'] = np.nan
+    raw.to_csv(csv_path, index=False)
+    classic = AirbnbDataProcessor(csv_path)
+    classic.load_data()
+    classic.clean_data()
+    classic.compact()
+    streaming = AirbnbDataProcessor(csv_path)
+    streaming.load_streaming(chunksize=chunksize)
+    streaming.compact()
+    assert classic.df_clean['id'].isna().any() == blank_ids
+    pd.testing.assert_frame_equal(streaming.df_clean, classic.df_clean)